@@ -0,0 +1,33 @@
+"""Add file owner indexes
+
+Revision ID: 5c1e9a7d2b34
+Revises: ff31a6e15363
+Create Date: 2026-10-18 10:12:41.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7d2b34'
+down_revision: Union[str, None] = 'ff31a6e15363'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_file_owner_id_id", "file", ["owner_id", "id"])
+
+    op.create_index(
+        "ix_file_owner_id_name",
+        "file",
+        ["owner_id", "name"],
+        postgresql_ops={"name": "varchar_pattern_ops"},
+    )
+
+def downgrade() -> None:
+    op.drop_index("ix_file_owner_id_name", table_name="file")
+    op.drop_index("ix_file_owner_id_id", table_name="file")
@@ -0,0 +1,49 @@
+"""Add blob table
+
+Revision ID: 7e2b9d4c1a63
+Revises: d81b6f0c4e27
+Create Date: 2026-10-18 17:02:15.874301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2b9d4c1a63'
+down_revision: Union[str, None] = 'd81b6f0c4e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blob",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("digest", sa.String(), nullable=False),
+        sa.Column("access_key", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("digest"),
+    )
+
+    op.add_column("file", sa.Column("blob_id", sa.Integer(), nullable=True))
+    op.create_foreign_key("fk_file_blob_id", "file", "blob", ["blob_id"], ["id"])
+    op.create_index("ix_file_blob_id", "file", ["blob_id"])
+
+    # Files with the same content now share an access key
+    op.drop_constraint(constraint_name="ix_file_access_key", table_name="file", type_="unique")
+    op.create_index("ix_file_access_key", "file", ["access_key"])
+
+def downgrade() -> None:
+    op.drop_index("ix_file_access_key", table_name="file")
+    op.create_unique_constraint("ix_file_access_key", "file", ["access_key"])
+
+    op.drop_index("ix_file_blob_id", table_name="file")
+    op.drop_constraint(constraint_name="fk_file_blob_id", table_name="file", type_="foreignkey")
+    op.drop_column("file", "blob_id")
+    op.drop_table("blob")
@@ -0,0 +1,28 @@
+"""Add user token version
+
+Revision ID: a3f7c2e91d48
+Revises: 5c1e9a7d2b34
+Create Date: 2026-10-18 11:03:17.552904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f7c2e91d48'
+down_revision: Union[str, None] = '5c1e9a7d2b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+def downgrade() -> None:
+    op.drop_column("user", "token_version")
@@ -0,0 +1,47 @@
+"""Add user storage usage
+
+Revision ID: d81b6f0c4e27
+Revises: a3f7c2e91d48
+Create Date: 2026-10-18 14:26:41.203518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81b6f0c4e27'
+down_revision: Union[str, None] = 'a3f7c2e91d48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column("file_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "user",
+        sa.Column("storage_used", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+    op.execute(
+        """
+        UPDATE "user" SET
+            file_count = usage.file_count,
+            storage_used = usage.storage_used
+        FROM (
+            SELECT owner_id, count(*) AS file_count, coalesce(sum(size), 0) AS storage_used
+            FROM file
+            GROUP BY owner_id
+        ) AS usage
+        WHERE usage.owner_id = "user".id
+        """
+    )
+
+def downgrade() -> None:
+    op.drop_column("user", "storage_used")
+    op.drop_column("user", "file_count")
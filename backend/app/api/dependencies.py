@@ -1,16 +1,19 @@
-from collections.abc import Generator
+import time
+from collections.abc import AsyncGenerator, Callable, Generator
+from contextlib import AbstractContextManager
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core import security
 from app.core.config import settings
-from app.crud.user import user_crud
-from app.database.core import engine
+from app.crud.user import async_user_crud, user_crud
+from app.database.core import AsyncSessionLocal, SessionLocal, engine
 from app.models.user import User
 from app.schemas.security import TokenPayload
 
@@ -25,34 +28,141 @@ def get_database_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
+async def get_async_database_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Start an async session with the database.
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+def get_session_factory() -> Callable[[], AbstractContextManager[Session]]:
+    """
+    Get a factory of database sessions for work that outlives the request,
+    such as background tasks, which run once the request's session is closed.
+    """
+    return SessionLocal
+
 SessionDep = Annotated[Session, Depends(get_database_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_database_session)]
+SessionFactoryDep = Annotated[
+    Callable[[], AbstractContextManager[Session]], Depends(get_session_factory)
+]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
-def get_current_user(
-    session: SessionDep, token: TokenDep
-) -> User:
+def decode_token(token: str) -> TokenPayload:
     """
-    Get's the current user after validating the user's credientails.
+    Validate the access token and return it's payload.
     """
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
-        token_data = TokenPayload(**payload)
+        return TokenPayload(**payload)
     except(JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials"
         )
 
-    user = user_crud.read_user(session=session, id=token_data.sub) # type: ignore
-
+def validate_token_user(user: User | None, token_data: TokenPayload) -> User:
+    """
+    Reject tokens of deleted users and tokens issued before a revocation.
+    """
     if not user:
         raise HTTPException(
             status_code=404,
             detail="User not found"
         )
 
+    if (user.token_version or 0) != token_data.ver:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials"
+        )
+
     return user
 
+def cache_principal(token: str, user: User, token_data: TokenPayload) -> User:
+    """
+    Remember a detached copy of the user's identity for the token, for no
+    longer than the token itself is valid.
+    """
+    principal = User(id=user.id, email=user.email, token_version=user.token_version)
+
+    ttl = settings.AUTH_CACHE_TTL_SECONDS
+    if token_data.exp:
+        ttl = min(ttl, token_data.exp - time.time())
+
+    security.principal_cache.set(token, principal, ttl=ttl)
+
+    return principal
+
+def get_current_user(
+    session: SessionDep, token: TokenDep
+) -> User:
+    """
+    Get's the current user after validating the user's credientails.
+    """
+    token_data = decode_token(token)
+
+    user = user_crud.read_user(session=session, id=token_data.sub) # type: ignore
+
+    return validate_token_user(user, token_data)
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+
+def get_current_principal(
+    session: SessionDep, token: TokenDep
+) -> User:
+    """
+    Get's the identity of the current user for routes that only need it's id.
+    With STATELESS_AUTH a token verified recently by this process is trusted
+    without decoding it or reading the user again.
+    """
+    if not settings.STATELESS_AUTH:
+        return get_current_user(session, token)
+
+    principal = security.principal_cache.get(token)
+    if principal:
+        return principal
+
+    token_data = decode_token(token)
+    user = user_crud.read_user(session=session, id=token_data.sub) # type: ignore
+
+    return cache_principal(token, validate_token_user(user, token_data), token_data)
+
+CurrentPrincipal = Annotated[User, Depends(get_current_principal)]
+
+async def get_current_user_async(
+    session: AsyncSessionDep, token: TokenDep
+) -> User:
+    """
+    Get's the current user through the async session and cache.
+    """
+    token_data = decode_token(token)
+
+    user = await async_user_crud.read_user(session=session, id=token_data.sub) # type: ignore
+
+    return validate_token_user(user, token_data)
+
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
+
+async def get_current_principal_async(
+    session: AsyncSessionDep, token: TokenDep
+) -> User:
+    """
+    get_current_principal through the async session and cache.
+    """
+    if not settings.STATELESS_AUTH:
+        return await get_current_user_async(session, token)
+
+    principal = security.principal_cache.get(token)
+    if principal:
+        return principal
+
+    token_data = decode_token(token)
+    user = await async_user_crud.read_user(session=session, id=token_data.sub) # type: ignore
+
+    return cache_principal(token, validate_token_user(user, token_data), token_data)
+
+AsyncCurrentPrincipal = Annotated[User, Depends(get_current_principal_async)]
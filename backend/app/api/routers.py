@@ -1,9 +1,17 @@
 from fastapi import APIRouter
 
-from app.api.routes import file, login, user
+from app.api.routes import async_file, file, login, storage, upload, user
+from app.core.config import settings
 
 api_router = APIRouter()
 
 api_router.include_router(login.router, tags=["login"])
-api_router.include_router(file.router, prefix="/files", tags=["files"])
+
+if settings.ASYNC_MODE:
+    api_router.include_router(async_file.router, prefix="/files", tags=["files"])
+else:
+    api_router.include_router(file.router, prefix="/files", tags=["files"])
+
 api_router.include_router(user.router, prefix="/users", tags=["users"])
+api_router.include_router(storage.router, prefix="/storage", tags=["storage"])
+api_router.include_router(upload.router, prefix="/uploads", tags=["uploads"])
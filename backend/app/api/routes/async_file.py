@@ -0,0 +1,251 @@
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.crud.file import async_file_crud
+from app.core.config import settings
+from app.api.dependencies import AsyncCurrentPrincipal, AsyncSessionDep
+from app.api.routes.file import archive_response, check_batch_size, content_response, foreign_keys
+from app.schemas.file import FileCreate, FilesCreate, FileUpdate, FilePublic, FilesPublic
+from app.schemas.security import Message
+from app.schemas.utils import decode_cursor, encode_cursor, to_pydantic
+
+router = APIRouter()
+
+async def check_access_keys(session: AsyncSession, keys: list[str], owner_id: int) -> None:
+    """
+    check_access_keys through the async session.
+    """
+    foreign = foreign_keys(keys, owner_id)
+    if foreign and len(
+        await async_file_crud.read_owned_keys(session=session, keys=foreign, owner_id=owner_id)
+    ) != len(foreign):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to use this access key"
+        )
+
+@router.post("/", response_model=FilePublic)
+async def create_file(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, file_in: FileCreate
+) -> Any:
+    """
+    Create a new file database object with name owned by the current user.
+    """
+    await check_access_keys(session, [file_in.access_key], current_user.id)
+
+    file = await async_file_crud.create_file(session=session, file_in=file_in, owner_id=current_user.id)
+
+    return to_pydantic(file, FilePublic)
+
+@router.post("/batch", response_model=FilesPublic)
+async def create_files(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, files_in: FilesCreate
+) -> Any:
+    """
+    Create many file database objects owned by the current user in one
+    transaction.
+    """
+    check_batch_size(len(files_in.data))
+    await check_access_keys(session, [file_in.access_key for file_in in files_in.data], current_user.id)
+
+    files = await async_file_crud.create_files(
+        session=session, files_in=files_in.data, owner_id=current_user.id
+    )
+    result = [to_pydantic(file, FilePublic) for file in files]
+
+    return FilesPublic(data=result, count=len(result))
+
+@router.get("/batch", response_model=FilesPublic)
+async def read_files_by_ids(
+    session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, ids: Annotated[list[int], Query()]
+) -> Any:
+    """
+    Get many of the current user's files by their ids. Ids that do not exist,
+    or are not the user's, are left out.
+    """
+    check_batch_size(len(ids))
+
+    files = await async_file_crud.read_files(session=session, ids=ids, model=FilePublic)
+    result = [file for file in files if file.owner_id == current_user.id]
+
+    return FilesPublic(data=result, count=len(result))
+
+@router.delete("/batch", response_model=Message)
+async def delete_files(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, ids: Annotated[list[int], Query()]
+) -> Any:
+    """
+    Delete many files by their ids in one transaction.
+    """
+    check_batch_size(len(ids))
+
+    files = await async_file_crud.read_files(session=session, ids=ids)
+    if len(files) != len(set(ids)):
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if any(file.owner_id != current_user.id for file in files):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to delete this file"
+        )
+
+    return await async_file_crud.delete_files(session=session, file_ids=ids)
+
+@router.get("/archive", response_class=StreamingResponse)
+async def read_files_archive(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, ids: Annotated[list[int], Query()]
+) -> Any:
+    """
+    Download many files as one ZIP archive. Files are read from storage
+    concurrently and the archive is sent as it is written.
+    """
+    check_batch_size(len(ids))
+
+    files = await async_file_crud.read_files(session=session, ids=ids, model=FilePublic)
+    if len(files) != len(set(ids)):
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if any(file.owner_id != current_user.id for file in files):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to download this file"
+        )
+
+    return archive_response(files)
+
+@router.get("/{file_id}", response_model=FilePublic)
+async def read_file(session: AsyncSessionDep, file_id: int) -> Any:
+    """
+    Get an file by id.
+    """
+    file = await async_file_crud.read_file(session=session, id=file_id, model=FilePublic)
+
+    if not file:
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    return file
+
+@router.get("/{file_id}/content", response_class=Response)
+async def read_file_content(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentPrincipal,
+    file_id: int,
+    range_header: Annotated[str | None, Header(alias="Range")] = None,
+    if_range: Annotated[str | None, Header()] = None,
+) -> Any:
+    """
+    Download the contents of a file. A Range header asks for part of it, for
+    instance to resume a download, and is honoured while If-Range matches.
+    """
+    file = await async_file_crud.read_file(session=session, id=file_id)
+    if not file:
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if (file.owner_id != current_user.id):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to download this file"
+        )
+
+    return await run_in_threadpool(content_response, file, range_header, if_range)
+
+@router.get("/", response_model=FilesPublic)
+async def read_files(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentPrincipal,
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=settings.FILE_PAGE_LIMIT)] = 25,
+    cursor: str | None = None,
+) -> Any:
+    """
+    Get a list of files with the current_user's id. Pass the next_cursor of the
+    previous page as cursor to page by keyset, otherwise skip is used.
+    """
+    after_id = None
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid cursor"
+            )
+
+    count = await async_file_crud.read_file_count_by_owner_id(session=session, user_id=current_user.id)
+    result = await async_file_crud.read_all_files_by_owner_id(
+        session=session,
+        user_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        after_id=after_id,
+        model=FilePublic,
+    )
+
+    next_cursor = encode_cursor(result[-1].id) if result and len(result) == limit else None
+
+    return FilesPublic(data=result, count=count, next_cursor=next_cursor)
+
+@router.put("/{file_id}", response_model=FilePublic)
+async def update_file(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, file_id: int, file_in: FileUpdate
+) -> Any:
+    """
+    Update a file by it's id.
+    """
+    file = await async_file_crud.read_file(session=session, id=file_id)
+    if not file:
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if (file.owner_id != current_user.id):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to update this file"
+        )
+
+    if file_in.access_key is not None:
+        await check_access_keys(session, [file_in.access_key], current_user.id)
+
+    update_file = await async_file_crud.update_file(session=session, file_id=file.id, file_in=file_in)
+
+    return to_pydantic(update_file, FilePublic)
+
+@router.delete("/{file_id}", response_model=Message)
+async def delete_file(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentPrincipal, file_id: int
+) -> Any:
+    """
+    Delete a file by it's id.
+    """
+    file = await async_file_crud.read_file(session=session, id=file_id)
+    if not file:
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if (file.owner_id != current_user.id):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to delete this file"
+        )
+
+    return await async_file_crud.delete_file(session=session, file_id=file_id)
@@ -1,37 +1,184 @@
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session
 
-from app.crud.file import file_crud
-from app.api.dependencies import CurrentUser, SessionDep
-from app.schemas.file import FileCreate, FileUpdate, FilePublic, FilesPublic
+from app.crud.file import file_crud, resolve_unique_names, split_name
+from app.models.file import File
+from app.core.config import settings
+from app.api.dependencies import CurrentPrincipal, SessionDep
+from app.schemas.file import FileCreate, FilesCreate, FileUpdate, FilePublic, FilesPublic
 from app.schemas.security import Message
-from app.schemas.utils import to_pydantic
+from app.schemas.utils import decode_cursor, encode_cursor, to_pydantic
+from app.storage.archive import ArchiveEntry, iter_zip
+from app.storage.core import is_owner_key
+from app.storage.engine import storage_engine
+from app.storage.streaming import object_response
 
 router = APIRouter()
 
+def check_batch_size(size: int) -> None:
+    if size > settings.FILE_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.FILE_BATCH_LIMIT} files can be handled in one batch"
+        )
+
+def foreign_keys(keys: list[str], owner_id: int) -> list[str]:
+    return [key for key in dict.fromkeys(keys) if not is_owner_key(key, owner_id)]
+
+def check_access_keys(session: Session, keys: list[str], owner_id: int) -> None:
+    """
+    Only let a file point at an object the user uploaded, under a key issued
+    to them, or at one their files already point at. Otherwise anyone who
+    learns a key could register it and download another user's content.
+    """
+    foreign = foreign_keys(keys, owner_id)
+    if foreign and len(file_crud.read_owned_keys(session=session, keys=foreign, owner_id=owner_id)) != len(foreign):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to use this access key"
+        )
+
+def content_response(
+    file: File, range_header: str | None, if_range: str | None
+) -> Response:
+    """
+    Stream the contents of the file from storage.
+    """
+    engine = storage_engine()
+
+    stat = engine.stat(file.access_key)
+    if not stat:
+        raise HTTPException(
+            status_code=404,
+            detail="File content not found"
+        )
+
+    return object_response(engine, file.access_key, stat, file.name, range_header, if_range) # type: ignore
+
+def archive_response(files: list[FilePublic]) -> StreamingResponse:
+    """
+    Stream a ZIP archive of the files, built as their contents are read.
+    Files sharing a name are given base_N names, as on upload, since
+    extractors would otherwise overwrite one with the other.
+    """
+    names = resolve_unique_names(
+        [file.name for file in files], {file.name: (0, None, *split_name(file.name)) for file in files}
+    )
+    entries = [
+        ArchiveEntry(name, file.access_key, file.updated_at or file.created_at)
+        for name, file in zip(names, files)
+    ]
+
+    return StreamingResponse(
+        iter_zip(storage_engine(), entries),
+        media_type="application/zip",
+        headers={"content-disposition": 'attachment; filename="files.zip"'},
+    )
+
 @router.post("/", response_model=FilePublic)
 def create_file(
-    *, session: SessionDep, current_user: CurrentUser, file_in: FileCreate
+    *, session: SessionDep, current_user: CurrentPrincipal, file_in: FileCreate
 ) -> Any:
     """
     Create a new file database object with name owned by the current user.
     """
-    file = file_crud.read_file_by_name(session=session, name=file_in.name, owner_id=current_user.id)
-
-    if file:
-        file_in.name = file_crud.generate_unique_name(session=session, name=file_in.name, owner_id=current_user.id)
+    check_access_keys(session, [file_in.access_key], current_user.id)
 
     file = file_crud.create_file(session=session, file_in=file_in, owner_id=current_user.id)
 
     return to_pydantic(file, FilePublic)
 
+@router.post("/batch", response_model=FilesPublic)
+def create_files(
+    *, session: SessionDep, current_user: CurrentPrincipal, files_in: FilesCreate
+) -> Any:
+    """
+    Create many file database objects owned by the current user in one
+    transaction.
+    """
+    check_batch_size(len(files_in.data))
+    check_access_keys(session, [file_in.access_key for file_in in files_in.data], current_user.id)
+
+    files = file_crud.create_files(
+        session=session, files_in=files_in.data, owner_id=current_user.id
+    )
+    result = [to_pydantic(file, FilePublic) for file in files]
+
+    return FilesPublic(data=result, count=len(result))
+
+@router.get("/batch", response_model=FilesPublic)
+def read_files_by_ids(
+    session: SessionDep, current_user: CurrentPrincipal, ids: Annotated[list[int], Query()]
+) -> Any:
+    """
+    Get many of the current user's files by their ids. Ids that do not exist,
+    or are not the user's, are left out.
+    """
+    check_batch_size(len(ids))
+
+    files = file_crud.read_files(session=session, ids=ids, model=FilePublic)
+    result = [file for file in files if file.owner_id == current_user.id]
+
+    return FilesPublic(data=result, count=len(result))
+
+@router.delete("/batch", response_model=Message)
+def delete_files(
+    *, session: SessionDep, current_user: CurrentPrincipal, ids: Annotated[list[int], Query()]
+) -> Any:
+    """
+    Delete many files by their ids in one transaction.
+    """
+    check_batch_size(len(ids))
+
+    files = file_crud.read_files(session=session, ids=ids)
+    if len(files) != len(set(ids)):
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if any(file.owner_id != current_user.id for file in files):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to delete this file"
+        )
+
+    return file_crud.delete_files(session=session, file_ids=ids)
+
+@router.get("/archive", response_class=StreamingResponse)
+def read_files_archive(
+    *, session: SessionDep, current_user: CurrentPrincipal, ids: Annotated[list[int], Query()]
+) -> Any:
+    """
+    Download many files as one ZIP archive. Files are read from storage
+    concurrently and the archive is sent as it is written.
+    """
+    check_batch_size(len(ids))
+
+    files = file_crud.read_files(session=session, ids=ids, model=FilePublic)
+    if len(files) != len(set(ids)):
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if any(file.owner_id != current_user.id for file in files):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to download this file"
+        )
+
+    return archive_response(files)
+
 @router.get("/{file_id}", response_model=FilePublic)
 def read_file(session: SessionDep, file_id: int) -> Any:
     """
     Get an file by id.
     """
-    file = file_crud.read_file(session=session, id=file_id)
+    file = file_crud.read_file(session=session, id=file_id, model=FilePublic)
 
     if not file:
         raise HTTPException(
@@ -39,25 +186,74 @@ def read_file(session: SessionDep, file_id: int) -> Any:
             detail="File not found"
         )
 
-    return to_pydantic(file, FilePublic)
+    return file
+
+@router.get("/{file_id}/content", response_class=Response)
+def read_file_content(
+    session: SessionDep,
+    current_user: CurrentPrincipal,
+    file_id: int,
+    range_header: Annotated[str | None, Header(alias="Range")] = None,
+    if_range: Annotated[str | None, Header()] = None,
+) -> Any:
+    """
+    Download the contents of a file. A Range header asks for part of it, for
+    instance to resume a download, and is honoured while If-Range matches.
+    """
+    file = file_crud.read_file(session=session, id=file_id)
+    if not file:
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if (file.owner_id != current_user.id):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to download this file"
+        )
+
+    return content_response(file, range_header, if_range)
 
 @router.get("/", response_model=FilesPublic)
 def read_files(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 25
+    session: SessionDep,
+    current_user: CurrentPrincipal,
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=settings.FILE_PAGE_LIMIT)] = 25,
+    cursor: str | None = None,
 ) -> Any:
     """
-    Get a list of files with the current_user's id.
+    Get a list of files with the current_user's id. Pass the next_cursor of the
+    previous page as cursor to page by keyset, otherwise skip is used.
     """
+    after_id = None
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid cursor"
+            )
+
     count = file_crud.read_file_count_by_owner_id(session=session, user_id=current_user.id)
-    all_files = file_crud.read_all_files_by_owner_id(session=session, user_id=current_user.id, skip=skip, limit=limit)
+    result = file_crud.read_all_files_by_owner_id(
+        session=session,
+        user_id=current_user.id,
+        skip=skip,
+        limit=limit,
+        after_id=after_id,
+        model=FilePublic,
+    )
 
-    result = [to_pydantic(file, FilePublic) for file in all_files]
+    next_cursor = encode_cursor(result[-1].id) if result and len(result) == limit else None
 
-    return FilesPublic(data=result, count=count)
+    return FilesPublic(data=result, count=count, next_cursor=next_cursor)
 
 @router.put("/{file_id}", response_model=FilePublic)
 def update_file(
-    *, session: SessionDep, current_user: CurrentUser, file_id: int, file_in: FileUpdate
+    *, session: SessionDep, current_user: CurrentPrincipal, file_id: int, file_in: FileUpdate
 ) -> Any:
     """
     Update a file by it's id.
@@ -75,13 +271,16 @@ def update_file(
             detail="User does not have permission to update this file"
         )
 
+    if file_in.access_key is not None:
+        check_access_keys(session, [file_in.access_key], current_user.id)
+
     update_file = file_crud.update_file(session=session, file_id=file.id, file_in=file_in)
 
     return to_pydantic(update_file, FilePublic)
 
 @router.delete("/{file_id}", response_model=Message)
 def delete_file(
-    *, session: SessionDep, current_user: CurrentUser, file_id: int
+    *, session: SessionDep, current_user: CurrentPrincipal, file_id: int
 ) -> Any:
     """
     Delete a file by it's id.
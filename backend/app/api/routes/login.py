@@ -8,7 +8,7 @@ from app.api.dependencies import SessionDep, CurrentUser
 from app.core import security
 from app.core.config import settings
 from app.crud.user import user_crud
-from app.schemas.security import Token
+from app.schemas.security import Message, Token
 from app.schemas.user import UserPublic
 
 router = APIRouter()
@@ -34,7 +34,7 @@ def login_access_token(
 
     return Token(
         access_token=security.create_access_token(
-            user.id, expires_delta=access_token_expires
+            user.id, expires_delta=access_token_expires, version=user.token_version or 0
         )
     )
 
@@ -44,3 +44,10 @@ def test_token(current_user: CurrentUser) -> Any:
     Test access token
     """
     return current_user
+
+@router.post("/login/revoke-tokens", response_model=Message)
+def revoke_tokens(session: SessionDep, current_user: CurrentUser) -> Any:
+    """
+    Sign out every session by invalidating all of the user's access tokens.
+    """
+    return user_crud.revoke_tokens(session=session, user_id=current_user.id)
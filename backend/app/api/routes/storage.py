@@ -0,0 +1,150 @@
+from typing import Any
+
+from botocore.exceptions import ClientError
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.dependencies import CurrentPrincipal, SessionDep
+from app.crud.file import file_crud
+from app.schemas.security import Message
+from app.schemas.storage import (
+    MultipartPartsCreate,
+    MultipartUpload,
+    MultipartUploadComplete,
+    MultipartUploadCreate,
+    PresignedDownload,
+    PresignedPart,
+    PresignedUpload,
+    UploadCreate,
+)
+from app.storage.core import MultipartUploadError, generate_key, is_owner_key, storage
+from app.storage.engine import storage_engine
+
+def check_presign_backend() -> None:
+    """
+    Presigned URLs point at S3, so with another storage backend the objects
+    they upload would never reach the engine file contents are read from.
+    """
+    if storage_engine().name != "s3":
+        raise HTTPException(
+            status_code=400,
+            detail="Presigned URLs are only available with the s3 storage backend"
+        )
+
+router = APIRouter(dependencies=[Depends(check_presign_backend)])
+
+def check_key_owner(key: str, owner_id: int) -> None:
+    if not is_owner_key(key, owner_id):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to upload this file"
+        )
+
+@router.post("/uploads", response_model=PresignedUpload)
+def create_upload(current_user: CurrentPrincipal, upload_in: UploadCreate) -> Any:
+    """
+    Get a new access key and a presigned URL to PUT the file's contents to.
+    """
+    key = generate_key(current_user.id, upload_in.name)
+    url = storage.presign_upload(key, upload_in.content_type)
+
+    return PresignedUpload(access_key=key, url=url, expires_in=storage.expires_in)
+
+@router.post("/multipart", response_model=MultipartUpload)
+def create_multipart_upload(
+    current_user: CurrentPrincipal, upload_in: MultipartUploadCreate
+) -> Any:
+    """
+    Start a multipart upload and presign a URL for each of it's parts, which
+    can then be PUT in parallel.
+    """
+    key = generate_key(current_user.id, upload_in.name)
+    upload_id = storage.create_multipart_upload(key, upload_in.content_type)
+    parts = storage.presign_parts(key, upload_id, range(1, upload_in.part_count + 1))
+
+    return MultipartUpload(
+        access_key=key,
+        upload_id=upload_id,
+        parts=[PresignedPart(part_number=number, url=url) for number, url in parts],
+        expires_in=storage.expires_in,
+    )
+
+@router.post("/multipart/{upload_id}/parts", response_model=list[PresignedPart])
+def create_multipart_parts(
+    current_user: CurrentPrincipal, upload_id: str, parts_in: MultipartPartsCreate
+) -> Any:
+    """
+    Presign the parts again, such as when their URLs expired before the upload
+    finished.
+    """
+    check_key_owner(parts_in.access_key, current_user.id)
+
+    parts = storage.presign_parts(parts_in.access_key, upload_id, parts_in.part_numbers)
+
+    return [PresignedPart(part_number=number, url=url) for number, url in parts]
+
+@router.post("/multipart/{upload_id}/complete", response_model=Message)
+def complete_multipart_upload(
+    current_user: CurrentPrincipal, upload_id: str, upload_in: MultipartUploadComplete
+) -> Any:
+    """
+    Assemble the uploaded parts into the file, using the ETag returned by each
+    part's PUT.
+    """
+    check_key_owner(upload_in.access_key, current_user.id)
+
+    try:
+        storage.complete_multipart_upload(
+            upload_in.access_key,
+            upload_id,
+            [(part.part_number, part.etag) for part in upload_in.parts],
+        )
+    except MultipartUploadError:
+        raise HTTPException(
+            status_code=400,
+            detail="Multipart upload could not be completed"
+        )
+
+    return Message(message="Upload completed successfully")
+
+@router.delete("/multipart/{upload_id}", response_model=Message)
+def abort_multipart_upload(
+    current_user: CurrentPrincipal, upload_id: str, access_key: str
+) -> Any:
+    """
+    Abort a multipart upload and discard the parts uploaded so far.
+    """
+    check_key_owner(access_key, current_user.id)
+
+    try:
+        storage.abort_multipart_upload(access_key, upload_id)
+    except ClientError:
+        raise HTTPException(
+            status_code=404,
+            detail="Upload not found"
+        )
+
+    return Message(message="Upload aborted successfully")
+
+@router.get("/download/{file_id}", response_model=PresignedDownload)
+def create_download(
+    session: SessionDep, current_user: CurrentPrincipal, file_id: int
+) -> Any:
+    """
+    Get a presigned URL to GET the file's contents from.
+    """
+    file = file_crud.read_file(session=session, id=file_id)
+    if not file:
+        raise HTTPException(
+            status_code=404,
+            detail="File not found"
+        )
+
+    if (file.owner_id != current_user.id):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to download this file"
+        )
+
+    url = storage.presign_download(file.access_key, file.name)
+
+    return PresignedDownload(url=url, expires_in=storage.expires_in)
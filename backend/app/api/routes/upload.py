@@ -0,0 +1,176 @@
+import base64
+import hashlib
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Body, Header, HTTPException
+
+from app.api.dependencies import CurrentPrincipal, SessionDep
+from app.core.config import settings
+from app.crud.file import file_crud
+from app.crud.upload import upload_crud
+from app.schemas.file import FilePublic
+from app.schemas.security import Message
+from app.schemas.upload import (
+    DigestUploadCreate,
+    ResumableUpload,
+    ResumableUploadCreate,
+    UploadSession,
+)
+from app.schemas.utils import to_pydantic
+from app.storage.core import MultipartUploadError
+
+router = APIRouter()
+
+CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha256")
+
+def verify_checksum(header: str | None, body: bytes) -> None:
+    """
+    Check the chunk against it's Upload-Checksum header, which holds the
+    algorithm and the base64 digest as in tus, e.g. "sha256 n4bQgYhMfWWa...".
+    """
+    algorithm, _, digest = (header or "").partition(" ")
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Upload-Checksum must use one of {', '.join(CHECKSUM_ALGORITHMS)}"
+        )
+
+    expected = base64.b64encode(hashlib.new(algorithm, body).digest()).decode()
+    if digest != expected:
+        raise HTTPException(
+            status_code=400,
+            detail="Chunk checksum mismatch"
+        )
+
+def read_owned_upload(upload_id: str, owner_id: int) -> UploadSession:
+    upload = upload_crud.read_upload(upload_id=upload_id)
+    if not upload:
+        raise HTTPException(
+            status_code=404,
+            detail="Upload not found"
+        )
+
+    if (upload.owner_id != owner_id):
+        raise HTTPException(
+            status_code=400,
+            detail="User does not have permission to access this upload"
+        )
+
+    return upload
+
+@router.post("/", response_model=ResumableUpload)
+def create_upload(
+    *, session: SessionDep, current_user: CurrentPrincipal, upload_in: ResumableUploadCreate
+) -> Any:
+    """
+    Start a resumable upload. The file is then sent in chunk_size chunks, in
+    any order and in parallel, and completed once every chunk is received.
+    """
+    max_size = settings.RESUMABLE_UPLOAD_CHUNK_SIZE * settings.S3_MULTIPART_MAX_PARTS
+    if upload_in.size > max_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Uploads can be at most {max_size} bytes"
+        )
+
+    if settings.USER_STORAGE_QUOTA is not None:
+        usage = file_crud.read_usage_by_owner_id(session=session, user_id=current_user.id)
+        if usage.storage_used + upload_in.size > settings.USER_STORAGE_QUOTA:
+            raise HTTPException(
+                status_code=403,
+                detail="Storage quota exceeded"
+            )
+
+    return upload_crud.create_upload(upload_in=upload_in, owner_id=current_user.id)
+
+@router.post("/by-digest", response_model=FilePublic)
+def create_file_by_digest(
+    *, session: SessionDep, current_user: CurrentPrincipal, upload_in: DigestUploadCreate
+) -> Any:
+    """
+    Create a file with content the current user already stores without
+    uploading it again. The digest is the sha256 of the chunk size and the hex
+    sha256 of each chunk, one per line, with the chunk_size of upload
+    sessions. A 404 means the content has to be uploaded.
+    """
+    file = upload_crud.create_file_by_digest(
+        session=session, upload_in=upload_in, owner_id=current_user.id
+    )
+    if not file:
+        raise HTTPException(
+            status_code=404,
+            detail="No stored file matches this digest"
+        )
+
+    return to_pydantic(file, FilePublic)
+
+@router.get("/{upload_id}", response_model=ResumableUpload)
+def read_upload(current_user: CurrentPrincipal, upload_id: str) -> Any:
+    """
+    Get the progress of an upload, to resume it after a dropped connection.
+    """
+    return read_owned_upload(upload_id, current_user.id)
+
+@router.put("/{upload_id}/chunks/{index}", response_model=ResumableUpload)
+def upload_chunk(
+    current_user: CurrentPrincipal,
+    upload_id: str,
+    index: int,
+    body: Annotated[bytes, Body(media_type="application/octet-stream")],
+    upload_checksum: Annotated[str | None, Header()] = None,
+) -> Any:
+    """
+    Send the chunk at index, which starts at byte index * chunk_size, as an
+    application/octet-stream body. The Upload-Checksum header is required.
+    """
+    upload = read_owned_upload(upload_id, current_user.id)
+
+    if not 0 <= index < upload.chunk_count:
+        raise HTTPException(
+            status_code=400,
+            detail="Chunk index is out of range"
+        )
+
+    if len(body) != upload.chunk_length(index):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Chunk {index} must be {upload.chunk_length(index)} bytes"
+        )
+
+    verify_checksum(upload_checksum, body)
+
+    return upload_crud.write_chunk(upload=upload, index=index, body=body)
+
+@router.post("/{upload_id}/complete", response_model=FilePublic)
+def complete_upload(
+    *, session: SessionDep, current_user: CurrentPrincipal, upload_id: str
+) -> Any:
+    """
+    Assemble the received chunks and create the file.
+    """
+    upload = read_owned_upload(upload_id, current_user.id)
+
+    if len(upload.etags) != upload.chunk_count:
+        raise HTTPException(
+            status_code=400,
+            detail="Upload is missing chunks"
+        )
+
+    try:
+        file = upload_crud.complete_upload(session=session, upload=upload)
+    except MultipartUploadError:
+        raise HTTPException(
+            status_code=400,
+            detail="Upload could not be completed"
+        )
+
+    return to_pydantic(file, FilePublic)
+
+@router.delete("/{upload_id}", response_model=Message)
+def abort_upload(current_user: CurrentPrincipal, upload_id: str) -> Any:
+    """
+    Abort an upload and discard the chunks received so far.
+    """
+    upload = read_owned_upload(upload_id, current_user.id)
+
+    return upload_crud.abort_upload(upload=upload)
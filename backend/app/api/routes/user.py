@@ -1,11 +1,16 @@
+import logging
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+from fastapi.responses import JSONResponse
+from tenacity import before_sleep_log, retry, stop_after_attempt, wait_exponential
 
-from app.api.dependencies import CurrentUser, SessionDep
+from app.api.dependencies import CurrentPrincipal, CurrentUser, SessionDep, SessionFactoryDep
 from app.core.config import settings
-from app.core.security import verify_password
+from app.core.security import password_hasher
+from app.crud.file import file_crud
 from app.crud.user import user_crud
+from app.schemas.file import StorageUsage
 from app.schemas.security import Message
 from app.schemas.user import (
     UpdatePassword,
@@ -17,6 +22,29 @@ from app.schemas.utils import to_pydantic
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+@retry(
+    stop=stop_after_attempt(settings.USER_DELETE_ATTEMPTS),
+    wait=wait_exponential(multiplier=0.5, max=30),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+def delete_user_with_retries(session_factory: SessionFactoryDep, user_id: int) -> None:
+    with session_factory() as session:
+        user_crud.delete_user(session=session, user_id=user_id)
+
+def delete_user_in_background(session_factory: SessionFactoryDep, user_id: int) -> None:
+    """
+    Delete the user after the response is sent, in a session of it's own as
+    the request's is closed by then. The user's tokens are already revoked,
+    so a failed deletion is retried, and logged once it is given up on.
+    """
+    try:
+        delete_user_with_retries(session_factory, user_id)
+    except Exception:
+        logger.exception(f"Deleting user {user_id} failed, their tokens are revoked but the account remains")
+
 @router.post("/register", response_model=UserPublic)
 def register_user(session: SessionDep, user_in: UserCreate) -> Any:
     """
@@ -47,6 +75,13 @@ def read_user_me(current_user: CurrentUser) -> Any:
     """
     return to_pydantic(current_user, UserPublic)
 
+@router.get("/me/usage", response_model=StorageUsage)
+def read_user_me_usage(session: SessionDep, current_user: CurrentPrincipal) -> Any:
+    """
+    Get the current user's file count, storage usage and quota.
+    """
+    return file_crud.read_usage_by_owner_id(session=session, user_id=current_user.id)
+
 @router.patch("/me", response_model=UserPublic)
 def update_user_me(
     *, session: SessionDep, user_in: UserUpdate, current_user: CurrentUser
@@ -72,7 +107,7 @@ def update_password_me(
     """
     Update the current users password
     """
-    if not verify_password(body.current_password, current_user.hashed_password):
+    if not password_hasher.verify(body.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=400,
             detail="Incorrect password"
@@ -86,11 +121,33 @@ def update_password_me(
 
     return user_crud.update_user_password(session=session, user_id=current_user.id, password=body.new_password)
 
-@router.delete("/me", response_model=Message)
+@router.delete(
+    "/me",
+    response_model=Message,
+    responses={status.HTTP_202_ACCEPTED: {"model": Message}},
+)
 def delete_user_me(
-    *, session: SessionDep, current_user: CurrentUser
+    *,
+    session: SessionDep,
+    session_factory: SessionFactoryDep,
+    current_user: CurrentUser,
+    background_tasks: BackgroundTasks,
 ) -> Any:
     """
-    Delete own user.
+    Delete own user. Accounts with more than USER_DELETE_BACKGROUND_FILES files
+    have their tokens revoked and are deleted after the response is sent.
     """
+    threshold = settings.USER_DELETE_BACKGROUND_FILES
+    if threshold is not None:
+        usage = file_crud.read_usage_by_owner_id(session=session, user_id=current_user.id)
+
+        if usage.file_count > threshold:
+            user_crud.revoke_tokens(session=session, user_id=current_user.id)
+            background_tasks.add_task(delete_user_in_background, session_factory, current_user.id)
+
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content=Message(message="User deletion scheduled").model_dump(),
+            )
+
     return user_crud.delete_user(session=session, user_id=current_user.id)
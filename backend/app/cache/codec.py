@@ -0,0 +1,98 @@
+import json
+from typing import Any, Type, TypeVar
+
+import orjson
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+try:
+    import msgpack
+except ImportError: # pragma: no cover
+    msgpack = None
+
+T = TypeVar("T", bound=BaseModel)
+
+# Bumped whenever the layout of cached objects changes. Entries written by an
+# older deploy, or with another codec, do not carry the current header and are
+# read as misses instead of being decoded.
+CACHE_SCHEMA_VERSION = 1
+
+class CacheCodec():
+    """
+    Encode cached objects to bytes prefixed with a version and codec header.
+    """
+    name = ""
+
+    def __init__(self) -> None:
+        self.header = f"v{CACHE_SCHEMA_VERSION}:{self.name}:".encode()
+
+    def dumps(self, obj: dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, body: bytes) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def loads_model(self, body: bytes, model: Type[T]) -> T:
+        return model.model_validate(self.loads(body))
+
+    def encode(self, obj: dict[str, Any]) -> bytes:
+        return self.header + self.dumps(obj)
+
+    def decode(self, payload: bytes | None, model: Type[T] | None = None) -> Any:
+        """
+        Decode a cached payload, straight into model when one is given. Returns
+        None for a missing or stale payload.
+        """
+        if payload is None or not payload.startswith(self.header):
+            return None
+
+        body = payload[len(self.header):]
+        if model:
+            return self.loads_model(body, model)
+        return self.loads(body)
+
+class JSONCodec(CacheCodec):
+    name = "json"
+
+    def dumps(self, obj: dict[str, Any]) -> bytes:
+        return json.dumps(obj).encode()
+
+    def loads(self, body: bytes) -> dict[str, Any]:
+        return json.loads(body)
+
+    def loads_model(self, body: bytes, model: Type[T]) -> T:
+        return model.model_validate_json(body)
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def dumps(self, obj: dict[str, Any]) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, body: bytes) -> dict[str, Any]:
+        return orjson.loads(body)
+
+class MsgpackCodec(CacheCodec):
+    name = "msgpack"
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise RuntimeError("CACHE_CODEC is msgpack but the msgpack package is not installed")
+        super().__init__()
+
+    def dumps(self, obj: dict[str, Any]) -> bytes:
+        return msgpack.packb(obj) # type: ignore
+
+    def loads(self, body: bytes) -> dict[str, Any]:
+        return msgpack.unpackb(body) # type: ignore
+
+CODECS: dict[str, Type[CacheCodec]] = {
+    codec.name: codec for codec in (JSONCodec, OrjsonCodec, MsgpackCodec)
+}
+
+def get_codec(name: str | None = None) -> CacheCodec:
+    name = name or settings.CACHE_CODEC
+    if name not in CODECS:
+        raise ValueError(f"Unknown cache codec {name}")
+    return CODECS[name]()
@@ -1,18 +1,182 @@
+import asyncio
 import logging
-from typing import Any, List
-import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Type, TypeVar
 
 import redis
+import redis.asyncio
+from pydantic import BaseModel
+from redis.client import NEVER_DECODE
 from redis.typing import KeyT
 
+from app.cache.codec import get_codec
+from app.cache.local import AsyncSingleFlight, LocalCache, SingleFlight
 from app.core.config import settings
+from app.core.security import principal_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T", bound=BaseModel)
+
+# Cached payloads are binary, so they are read without the connection's
+# response decoding.
+RAW = {NEVER_DECODE: True}
+
+def invalidate_local(local: LocalCache, key: str) -> None:
+    """
+    Drop an invalidated key from the in-process tier. A principal key drops
+    the verified tokens of it's user instead, see revoke_principals.
+    """
+    kind, _, user_id = key.partition(":")
+    if kind == "principal":
+        principal_cache.delete_where(lambda principal: principal.id == int(user_id))
+    else:
+        local.delete(key)
+
+# Lua scripts run atomically on the server, so the owner/email lookup and the
+# deletes that depend on it cannot interleave with a concurrent write. The
+# invalidation channel is the second argument. The file's owner is passed as
+# the third when the caller knows it, since the file hash may have expired
+# while the owner's index has not; an empty one falls back to the hash.
+DELETE_FILE_SCRIPT = """
+local owner_id = ARGV[3]
+if owner_id == "" then
+    owner_id = redis.call("HGET", KEYS[1], "owner_id")
+end
+if owner_id then
+    redis.call("ZREM", "owner_id:" .. owner_id, ARGV[1])
+end
+redis.call("PUBLISH", ARGV[2], KEYS[1])
+return redis.call("DEL", KEYS[1])
+"""
+
+DELETE_USER_SCRIPT = """
+local email = redis.call("HGET", KEYS[1], "email")
+if email then
+    redis.call("DEL", "email:" .. email)
+end
+redis.call("DEL", "usage:" .. ARGV[2])
+redis.call("PUBLISH", ARGV[1], KEYS[1])
+return redis.call("DEL", KEYS[1])
+"""
+
+# Usage counters are only adjusted while they are cached, and only loaded from
+# the database when they are not, so a change is never counted twice. Every
+# change bumps the counters' version, cached or not, and a load is only
+# written while the version is the one read before the database was, so a
+# change committed in between is not lost.
+INCREMENT_USAGE_SCRIPT = """
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[3])
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    redis.call("HINCRBY", KEYS[1], "file_count", ARGV[1])
+    redis.call("HINCRBY", KEYS[1], "storage_used", ARGV[2])
+end
+"""
+
+# Keys removed by one UNLINK when sweeping a deleted user's files
+UNLINK_CHUNK = 1000
+
+WRITE_USAGE_SCRIPT = """
+local version = tonumber(redis.call("GET", KEYS[2]) or "0")
+if redis.call("EXISTS", KEYS[1]) == 0 and version == tonumber(ARGV[4]) then
+    redis.call("HSET", KEYS[1], "file_count", ARGV[1], "storage_used", ARGV[2])
+    redis.call("EXPIRE", KEYS[1], ARGV[3])
+end
+"""
+
+# Only the loader that took a refill lock may release it, in case the lock
+# timed out and was taken by another loader in the meantime.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# Storage deletes whose retry is due move back onto the queue atomically, so a
+# key is never both waiting to be retried and queued.
+PROMOTE_STORAGE_DELETES_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+if #due > 0 then
+    redis.call("ZREM", KEYS[1], unpack(due))
+    redis.call("RPUSH", KEYS[2], unpack(due))
+end
+return #due
+"""
+
+class Tombstone():
+    """
+    Returned by cache reads for keys known to be missing from the database.
+    It is falsy, so callers that only check for a hit fall back as before.
+    """
+    def __bool__(self) -> bool:
+        return False
+
+TOMBSTONE = Tombstone()
+
+def cache_miss(model: Type[T] | None) -> Any:
+    return None if model else {}
+
+def refresh_early(ttl: int) -> bool:
+    """
+    Probabilistic early expiration (XFetch). A hit on a key with ttl
+    milliseconds left is reported as a miss with a probability that rises
+    sharply near expiry, so one caller reloads a hot key before it expires
+    for everyone.
+    """
+    if ttl < 0:
+        return False
+
+    delta = settings.CACHE_REFRESH_DELTA.total_seconds() * 1000
+    return -delta * settings.CACHE_REFRESH_BETA * math.log(1 - random.random()) >= ttl
+
+class TieredCacheMetrics():
+    """
+    Hit and miss counters for the in-process (l1) and redis (l2) tiers, and
+    for lookups answered by a tombstone (negative).
+    """
+    def __init__(self) -> None:
+        self.counters: Counter[str] = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, tier: str, hit: bool) -> None:
+        with self.lock:
+            self.counters[f"{tier}_{'hits' if hit else 'misses'}"] += 1
+
+    def snapshot(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                name: self.counters[name]
+                for name in (
+                    "l1_hits", "l1_misses", "l2_hits", "l2_misses",
+                    "negative_hits", "negative_misses",
+                )
+            }
+
 class RedisInstance():
     connection = None
 
+    def __init__(self) -> None:
+        self.local = LocalCache(
+            maxsize=settings.LOCAL_CACHE_SIZE,
+            ttl=settings.LOCAL_CACHE_TTL_SECONDS,
+        )
+        self.metrics = TieredCacheMetrics()
+        self.codec = get_codec()
+        self.flights = SingleFlight()
+        self.tombstone_local_ttl = min(
+            settings.LOCAL_CACHE_TTL_SECONDS, settings.CACHE_NEGATIVE_TTL.total_seconds()
+        )
+        self.invalidation_thread = None
+
     def connect(self) -> None:
         try:
             self.connection = redis.Redis(
@@ -23,23 +187,131 @@ class RedisInstance():
                 decode_responses=True,
             )
 
+            self.delete_file_script = self.connection.register_script(DELETE_FILE_SCRIPT)
+            self.delete_user_script = self.connection.register_script(DELETE_USER_SCRIPT)
+            self.release_lock_script = self.connection.register_script(RELEASE_LOCK_SCRIPT)
+            self.increment_usage_script = self.connection.register_script(INCREMENT_USAGE_SCRIPT)
+            self.write_usage_script = self.connection.register_script(WRITE_USAGE_SCRIPT)
+            self.promote_storage_deletes_script = self.connection.register_script(
+                PROMOTE_STORAGE_DELETES_SCRIPT
+            )
+
             if self.connection.ping():
                 logger.info("Redis connection is ready")
 
+            pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{
+                settings.REDIS_INVALIDATION_CHANNEL:
+                    lambda message: invalidate_local(self.local, message["data"])
+            })
+            self.invalidation_thread = pubsub.run_in_thread(
+                sleep_time=0.25,
+                daemon=True,
+                exception_handler=self.handle_invalidation_error,
+            )
+
         except Exception as e:
             logger.error(e)
             raise e
 
+    def handle_invalidation_error(self, e: BaseException, pubsub, thread) -> None:
+        """
+        Invalidations may have been missed while the subscription was down, so
+        the in-process tier is dropped before retrying.
+        """
+        logger.warning(f"Cache invalidation subscriber failed: {e}")
+        self.local.clear()
+        principal_cache.clear()
+        time.sleep(1)
+
     def disconnect(self) -> None:
+        if self.invalidation_thread:
+            self.invalidation_thread.stop()
+            self.invalidation_thread.join()
+            self.invalidation_thread = None
+
         if self.connection:
             self.connection.close()
             logger.info("Redis connection has been closed")
 
+        self.local.clear()
+
     def flushall(self) -> None:
+        self.local.clear()
+
         if self.connection:
             result = self.connection.flushall()
             logger.info(f"FLUSHALL ({result})")
 
+    def read_through_local(self, key: str, model: Type[T] | None = None) -> Any:
+        """
+        Read the data field of a cached hash, trying the in-process tier first.
+        Returns a dict, or {} on a miss, unless model is given, in which case
+        the entry is decoded straight into model and a miss is None. A redis
+        entry close to expiry may be reported as a miss, see refresh_early.
+        Keys with a tombstone return TOMBSTONE.
+        """
+        entry = self.local.get(key)
+        if entry is TOMBSTONE:
+            self.metrics.record("l1", True)
+            self.metrics.record("negative", True)
+            return TOMBSTONE
+
+        entry = entry or {}
+        obj = entry.get(model)
+        self.metrics.record("l1", obj is not None)
+
+        if obj is None:
+            pipe = self.connection.pipeline(transaction=False) # type: ignore
+            pipe.execute_command("HGET", key, "data", **RAW)
+            pipe.pttl(key)
+            pipe.exists(f"missing:{key}")
+            payload, ttl, missing = pipe.execute()
+
+            if payload is None and missing:
+                self.metrics.record("l2", True)
+                self.metrics.record("negative", True)
+                self.local.set(key, TOMBSTONE, ttl=self.tombstone_local_ttl)
+                return TOMBSTONE
+
+            obj = None if refresh_early(ttl) else self.codec.decode(payload, model)
+            self.metrics.record("l2", obj is not None)
+            if obj is None:
+                self.metrics.record("negative", False)
+                return cache_miss(model)
+
+            self.local.set(key, {**entry, model: obj})
+
+        return obj.model_copy() if model else dict(obj)
+
+    @contextmanager
+    def single_flight(self, key: str) -> Iterator[bool]:
+        """
+        Let one caller at a time, across threads and workers, refill key.
+        Yields True to the caller that should load it, and False to callers
+        that waited for another loader and should read the cache again first.
+        """
+        with self.flights.acquire(key) as waited:
+            if waited or not self.connection:
+                yield not waited
+                return
+
+            lock, token = f"lock:{key}", uuid.uuid4().hex
+            timeout = settings.CACHE_LOCK_TIMEOUT
+
+            if self.connection.set(lock, token, nx=True, px=timeout):
+                try:
+                    yield True
+                finally:
+                    self.release_lock_script(keys=[lock], args=[token])
+                return
+
+            deadline = time.monotonic() + timeout.total_seconds()
+            while self.connection.exists(lock) and time.monotonic() < deadline:
+                time.sleep(0.025)
+
+            yield False
+
     def exists(self, *names: KeyT):
         if self.connection:
             return self.connection.exists(*names)
@@ -47,105 +319,787 @@ class RedisInstance():
     def write_file_to_cache(
         self, file_id: int, owner_id: int, obj_data: dict[str, Any]
     ) -> None:
+        self.write_files_to_cache([(file_id, owner_id, obj_data)])
+
+    def write_files_to_cache(
+        self, files: Iterable[tuple[int, int, dict[str, Any]]]
+    ) -> None:
+        """
+        Write (file_id, owner_id, obj_data) entries in a single MULTI/EXEC
+        round trip.
+        """
         if self.connection:
-            self.connection.hset(f"file:{file_id}", mapping={
-                "owner_id": owner_id,
-                "data": json.dumps(obj_data)
-            })
+            pipe = self.connection.pipeline(transaction=True)
+            file_ids = []
 
-            self.connection.sadd(f"owner_id:{owner_id}", file_id)
+            for file_id, owner_id, obj_data in files:
+                pipe.hset(f"file:{file_id}", mapping={
+                    "owner_id": owner_id,
+                    "data": self.codec.encode(obj_data)
+                })
 
-            self.connection.expire(
-                f"file:{file_id}",
-                time=settings.REDIS_CACHE_EXPIRY
-            )
+                # The owner index is scored by id so pages come back in the same
+                # order as the database listing.
+                pipe.zadd(f"owner_id:{owner_id}", {str(file_id): file_id})
+                pipe.delete(f"missing:file:{file_id}")
 
-            self.connection.expire(
-                f"owner_id:{owner_id}",
-                time=settings.REDIS_CACHE_EXPIRY
-            )
+                pipe.expire(
+                    f"file:{file_id}",
+                    time=settings.REDIS_CACHE_EXPIRY
+                )
+
+                pipe.expire(
+                    f"owner_id:{owner_id}",
+                    time=settings.REDIS_CACHE_EXPIRY
+                )
+
+                pipe.publish(settings.REDIS_INVALIDATION_CHANNEL, f"file:{file_id}")
+                file_ids.append(file_id)
+
+            if not file_ids:
+                return
+
+            pipe.execute()
+            for file_id in file_ids:
+                self.local.delete(f"file:{file_id}")
         else:
             print("no connection")
 
-    def read_file_by_id_from_cache(self, file_id: int) ->  dict[str, Any]:
+    def read_file_by_id_from_cache(
+        self, file_id: int, model: Type[T] | None = None
+    ) -> Any:
         if self.connection:
-            file_data = self.connection.hgetall(f"file:{file_id}")
-            
-            if file_data:
-                return json.loads(file_data["data"]) # type: ignore
-
-            return file_data # type: ignore
-        return {}
+            return self.read_through_local(f"file:{file_id}", model)
+        return cache_miss(model)
 
     def read_files_by_owner_id_from_cache(
-        self, owner_id: int
-    ) -> List[dict[str, Any]]:
+        self,
+        owner_id: int,
+        skip: int = 0,
+        limit: int | None = None,
+        after_id: int | None = None,
+        model: Type[T] | None = None,
+    ) -> List[Any]:
+        """
+        Read a page of the owner's cached files ordered by id. When after_id is
+        given the page starts after that id and skip is ignored. A page with
+        any expired or stale file hash is returned empty so the caller falls
+        back to the database.
+        """
         files = []
 
-        if self.connection:
-            file_ids = self.connection.smembers(f"owner_id:{owner_id}")
-            files = [self.read_file_by_id_from_cache(file_id) for file_id in file_ids] # type: ignore
+        # ZRANGE would read to the end of the index for an empty page
+        if self.connection and (limit is None or limit > 0):
+            if after_id is not None:
+                file_ids = self.connection.zrangebyscore(
+                    f"owner_id:{owner_id}", f"({after_id}", "+inf", start=0, num=limit
+                )
+            else:
+                end = -1 if limit is None else skip + limit - 1
+                file_ids = self.connection.zrange(f"owner_id:{owner_id}", skip, end)
+
+            files = self.read_files_by_ids_from_cache(file_ids, model) # type: ignore
+
+            if len(files) != len(file_ids): # type: ignore
+                return []
 
         return files
 
+    def read_files_by_ids_from_cache(
+        self, file_ids: Iterable[int | str], model: Type[T] | None = None
+    ) -> List[Any]:
+        """
+        Read many cached files in a single pipelined round trip. Ids that are
+        no longer cached, or were cached in an older format, are skipped.
+        """
+        if not self.connection:
+            return []
+
+        pipe = self.connection.pipeline(transaction=False)
+        for file_id in file_ids:
+            pipe.execute_command("HGET", f"file:{file_id}", "data", **RAW)
+
+        files = (self.codec.decode(payload, model) for payload in pipe.execute())
+        return [file for file in files if file is not None]
+
     def read_file_count_by_owner_id_from_cache(self, owner_id: int) -> int:
         if self.connection:
-            return self.connection.scard(f"owner_id:{owner_id}") # type: ignore
+            return self.connection.zcard(f"owner_id:{owner_id}") # type: ignore
         return 0
 
-    def delete_file_from_cache(self, file_id: int) -> None:
+    def read_usage_from_cache(self, owner_id: int) -> tuple[dict[str, int], int]:
+        """
+        Read the owner's cached usage counters, or {} on a miss, and the
+        version of the counters to pass to write_usage_to_cache.
+        """
         if self.connection:
-            owner_id = self.connection.hget(f"file:{file_id}", "owner_id")
-            self.connection.srem(f"owner_id:{owner_id}", str(file_id))
+            pipe = self.connection.pipeline(transaction=False)
+            pipe.hmget(f"usage:{owner_id}", ["file_count", "storage_used"])
+            pipe.get(f"usage_version:{owner_id}")
+            (file_count, storage_used), version = pipe.execute()
 
-            if self.connection.scard(f"owner_id:{owner_id}") == 0:
-                self.connection.delete(f"owner_id:{owner_id}")
+            if file_count is not None and storage_used is not None:
+                return {"file_count": int(file_count), "storage_used": int(storage_used)}, int(version or 0)
+            return {}, int(version or 0)
+        return {}, 0
 
-            self.connection.delete(f"file:{file_id}")
+    def write_usage_to_cache(
+        self, owner_id: int, file_count: int, storage_used: int, version: int
+    ) -> None:
+        """
+        Cache the owner's usage counters loaded from the database, unless a
+        cached copy already exists and is being kept up to date, or the
+        counters changed since version was read.
+        """
+        if self.connection:
+            self.write_usage_script(
+                keys=[f"usage:{owner_id}", f"usage_version:{owner_id}"],
+                args=[file_count, storage_used, int(settings.REDIS_CACHE_EXPIRY.total_seconds()), version],
+            )
+
+    def increment_usage_in_cache(
+        self, owner_id: int, file_count: int, storage_used: int
+    ) -> None:
+        if self.connection:
+            self.increment_usage_script(
+                keys=[f"usage:{owner_id}", f"usage_version:{owner_id}"],
+                args=[file_count, storage_used, int(settings.REDIS_CACHE_EXPIRY.total_seconds())],
+            )
+
+    def write_tombstone_to_cache(self, key: str) -> None:
+        """
+        Remember for CACHE_NEGATIVE_TTL that key, such as file:1 or
+        email:user@example.com, does not exist in the database. Writing the
+        object to the cache clears its tombstone.
+        """
+        if self.connection:
+            self.connection.set(f"missing:{key}", 1, ex=settings.CACHE_NEGATIVE_TTL)
+
+    def delete_file_from_cache(self, file_id: int, owner_id: int | None = None) -> None:
+        """
+        Drop the file and remove it from it's owner's index. Pass owner_id
+        when it is known, otherwise it is read from the cached file.
+        """
+        if self.connection:
+            self.delete_file_script(
+                keys=[f"file:{file_id}"],
+                args=[file_id, settings.REDIS_INVALIDATION_CHANNEL, owner_id or ""],
+            )
+            self.local.delete(f"file:{file_id}")
+
+    def delete_files_from_cache(
+        self, file_ids: Iterable[int], owner_ids: Iterable[int] | None = None
+    ) -> None:
+        """
+        Run the delete script for many files in a single pipelined round trip.
+        owner_ids, when given, holds the owner of each file in file_ids.
+        """
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=False)
+            file_ids = list(file_ids)
+            owners = list(owner_ids) if owner_ids is not None else [""] * len(file_ids)
+
+            for file_id, owner_id in zip(file_ids, owners):
+                self.delete_file_script(
+                    keys=[f"file:{file_id}"],
+                    args=[file_id, settings.REDIS_INVALIDATION_CHANNEL, owner_id],
+                    client=pipe,
+                )
+
+            if file_ids:
+                pipe.execute()
+
+            for file_id in file_ids:
+                self.local.delete(f"file:{file_id}")
 
     def write_user_to_cache(
         self, user_id: int, email: str, obj_data: dict[str, Any]
     ) -> None:
         if self.connection:
-            self.connection.hset(f"user:{user_id}", mapping={
+            pipe = self.connection.pipeline(transaction=True)
+
+            pipe.hset(f"user:{user_id}", mapping={
                 "email": email,
-                "data": json.dumps(obj_data)
+                "data": self.codec.encode(obj_data)
             })
 
-            self.connection.sadd(f"email:{email}", user_id)
+            pipe.sadd(f"email:{email}", user_id)
+            pipe.delete(f"missing:user:{user_id}", f"missing:email:{email}")
 
-            self.connection.expire(
+            pipe.expire(
                 f"user:{user_id}",
                 time=settings.REDIS_CACHE_EXPIRY
             )
 
-            self.connection.expire(
+            pipe.expire(
                 f"email:{email}",
                 time=settings.REDIS_CACHE_EXPIRY
             )
 
-    def read_user_by_id_from_cache(self, user_id: int) -> dict[str, Any]:
-        if self.connection:
-            user_data = self.connection.hgetall(f"user:{user_id}")
+            pipe.publish(settings.REDIS_INVALIDATION_CHANNEL, f"user:{user_id}")
 
-            if user_data:
-                return json.loads(user_data["data"]) # type: ignore
+            pipe.execute()
+            self.local.delete(f"user:{user_id}")
 
-            return user_data # type: ignore
-        return {}
+    def read_user_by_id_from_cache(
+        self, user_id: int, model: Type[T] | None = None
+    ) -> Any:
+        if self.connection:
+            return self.read_through_local(f"user:{user_id}", model)
+        return cache_miss(model)
 
-    def read_user_by_email_from_cache(self, email: str) -> dict[str, Any]:
+    def read_user_by_email_from_cache(
+        self, email: str, model: Type[T] | None = None
+    ) -> Any:
         if self.connection:
-            users = self.connection.smembers(f"email:{email}")
+            pipe = self.connection.pipeline(transaction=False)
+            pipe.smembers(f"email:{email}")
+            pipe.exists(f"missing:email:{email}")
+            users, missing = pipe.execute()
 
-            for user in users: # type: ignore
-                return self.read_user_by_id_from_cache(int(user))
-        return {}
+            for user in users:
+                return self.read_user_by_id_from_cache(int(user), model)
+
+            self.metrics.record("negative", bool(missing))
+            if missing:
+                return TOMBSTONE
+        return cache_miss(model)
+
+    def revoke_principals(self, user_id: int) -> None:
+        """
+        Forget the tokens of the user verified by any worker, after their
+        tokens are revoked or the user is deleted.
+        """
+        if self.connection:
+            self.connection.publish(settings.REDIS_INVALIDATION_CHANNEL, f"principal:{user_id}")
+        invalidate_local(self.local, f"principal:{user_id}")
 
     def delete_user_from_cache(self, user_id: int) -> None:
         if self.connection:
-            email = self.connection.hget(f"user:{user_id}", "email")
-            self.connection.delete(f"email:{email}", f"user:{user_id}")
+            self.delete_user_script(
+                keys=[f"user:{user_id}"],
+                args=[settings.REDIS_INVALIDATION_CHANNEL, user_id],
+            )
+            self.local.delete(f"user:{user_id}")
+
+    def delete_owner_from_cache(self, user_id: int, file_ids: Iterable[int]) -> None:
+        """
+        Sweep the keys of a deleted user in a single pipelined round trip. The
+        files and owner index are unlinked in bulk rather than one script call
+        per file, since the owner goes with them.
+        """
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=False)
+            keys = [f"file:{file_id}" for file_id in file_ids]
+
+            for i in range(0, len(keys), UNLINK_CHUNK):
+                pipe.unlink(*keys[i:i + UNLINK_CHUNK])
+            pipe.unlink(f"owner_id:{user_id}")
+
+            for key in keys:
+                pipe.publish(settings.REDIS_INVALIDATION_CHANNEL, key)
+
+            self.delete_user_script(
+                keys=[f"user:{user_id}"],
+                args=[settings.REDIS_INVALIDATION_CHANNEL, user_id],
+                client=pipe,
+            )
+            pipe.execute()
+
+            for key in keys:
+                self.local.delete(key)
+            self.local.delete(f"user:{user_id}")
+
+    def write_upload_to_cache(self, upload_id: str, obj_data: dict[str, Any]) -> None:
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=True)
+
+            pipe.hset(f"upload:{upload_id}", mapping=obj_data)
+            pipe.expire(f"upload:{upload_id}", settings.RESUMABLE_UPLOAD_EXPIRY)
+
+            pipe.execute()
+
+    def read_upload_from_cache(
+        self, upload_id: str
+    ) -> tuple[dict[str, str], dict[int, str], dict[int, str]]:
+        """
+        Return the upload session along with the ETag and sha256 digest of
+        each chunk received so far, keyed by chunk index.
+        """
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=False)
+
+            pipe.hgetall(f"upload:{upload_id}")
+            pipe.hgetall(f"upload:{upload_id}:etags")
+            pipe.hgetall(f"upload:{upload_id}:digests")
+
+            upload, etags, digests = pipe.execute()
+
+            return (
+                upload,
+                {int(index): etag for index, etag in etags.items()},
+                {int(index): digest for index, digest in digests.items()},
+            )
+        return {}, {}, {}
+
+    def write_upload_chunk_to_cache(
+        self, upload_id: str, index: int, etag: str, digest: str
+    ) -> None:
+        """
+        Record a received chunk and keep the session alive for another
+        RESUMABLE_UPLOAD_EXPIRY.
+        """
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=True)
+            keys = [f"upload:{upload_id}", f"upload:{upload_id}:etags", f"upload:{upload_id}:digests"]
+
+            pipe.hset(keys[1], str(index), etag)
+            pipe.hset(keys[2], str(index), digest)
+            for key in keys:
+                pipe.expire(key, settings.RESUMABLE_UPLOAD_EXPIRY)
+
+            pipe.execute()
+
+    def delete_upload_from_cache(self, upload_id: str) -> None:
+        if self.connection:
+            self.connection.delete(
+                f"upload:{upload_id}", f"upload:{upload_id}:etags", f"upload:{upload_id}:digests"
+            )
+
+    def enqueue_storage_deletes(self, backend: str, keys: list[str]) -> None:
+        """
+        Queue storage objects for the purge worker to delete from backend.
+        """
+        if self.connection and keys:
+            self.connection.rpush(f"storage:delete:{backend}", *keys)
+
+    def pop_storage_deletes(self, backend: str, count: int) -> list[str]:
+        if self.connection:
+            return self.connection.lpop(f"storage:delete:{backend}", count) or []
+        return []
+
+    def promote_storage_deletes(self, backend: str, count: int) -> int:
+        """
+        Queue again up to count keys whose retry is due.
+        """
+        if self.connection:
+            return self.promote_storage_deletes_script(
+                keys=[f"storage:delete:{backend}:retry", f"storage:delete:{backend}"],
+                args=[time.time(), count],
+            )
+        return 0
+
+    def retry_storage_deletes(self, backend: str, keys: list[str]) -> list[str]:
+        """
+        Schedule another attempt at each key after an exponential, jittered
+        backoff. Keys that have had STORAGE_DELETE_MAX_ATTEMPTS attempts are
+        given up on and returned.
+        """
+        if not self.connection or not keys:
+            return []
+
+        attempts_key = f"storage:delete:{backend}:attempts"
+
+        pipe = self.connection.pipeline(transaction=False)
+        for key in keys:
+            pipe.hincrby(attempts_key, key, 1)
+        attempts = pipe.execute()
+
+        now = time.time()
+        retries, dropped = {}, []
+        for key, attempt in zip(keys, attempts):
+            if attempt >= settings.STORAGE_DELETE_MAX_ATTEMPTS:
+                dropped.append(key)
+                continue
+
+            delay = min(
+                settings.STORAGE_DELETE_RETRY_DELAY.total_seconds() * 2 ** (attempt - 1),
+                settings.STORAGE_DELETE_RETRY_MAX_DELAY.total_seconds(),
+            )
+            retries[key] = now + delay * random.uniform(0.5, 1)
+
+        pipe = self.connection.pipeline(transaction=True)
+        if retries:
+            pipe.zadd(f"storage:delete:{backend}:retry", retries)
+        if dropped:
+            pipe.hdel(attempts_key, *dropped)
+        pipe.execute()
+
+        return dropped
+
+    def delete_storage_delete_attempts(self, backend: str, keys: list[str]) -> None:
+        if self.connection and keys:
+            self.connection.hdel(f"storage:delete:{backend}:attempts", *keys)
+
+class AsyncRedisInstance():
+    """
+    The redis.asyncio counterpart of RedisInstance, used by the async CRUD
+    classes. It shares the key layout and scripts of the sync instance.
+    """
+    connection = None
+
+    def __init__(self) -> None:
+        self.local = LocalCache(
+            maxsize=settings.LOCAL_CACHE_SIZE,
+            ttl=settings.LOCAL_CACHE_TTL_SECONDS,
+        )
+        self.metrics = TieredCacheMetrics()
+        self.codec = get_codec()
+        self.flights = AsyncSingleFlight()
+        self.tombstone_local_ttl = min(
+            settings.LOCAL_CACHE_TTL_SECONDS, settings.CACHE_NEGATIVE_TTL.total_seconds()
+        )
+        self.invalidation_task = None
+
+    async def connect(self) -> None:
+        try:
+            self.connection = redis.asyncio.Redis(
+                host=settings.REDIS_SERVER,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                password=settings.REDIS_PASSWORD,
+                decode_responses=True,
+            )
+
+            self.delete_file_script = self.connection.register_script(DELETE_FILE_SCRIPT)
+            self.delete_user_script = self.connection.register_script(DELETE_USER_SCRIPT)
+            self.release_lock_script = self.connection.register_script(RELEASE_LOCK_SCRIPT)
+            self.increment_usage_script = self.connection.register_script(INCREMENT_USAGE_SCRIPT)
+            self.write_usage_script = self.connection.register_script(WRITE_USAGE_SCRIPT)
+
+            if await self.connection.ping():
+                logger.info("Async redis connection is ready")
+
+            pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(settings.REDIS_INVALIDATION_CHANNEL)
+            self.invalidation_task = asyncio.create_task(self.listen_for_invalidations(pubsub))
+
+        except Exception as e:
+            logger.error(e)
+            raise e
+
+    async def listen_for_invalidations(self, pubsub) -> None:
+        try:
+            while True:
+                try:
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            invalidate_local(self.local, message["data"])
+                except redis.exceptions.ConnectionError as e:
+                    logger.warning(f"Cache invalidation subscriber failed: {e}")
+                    self.local.clear()
+                    principal_cache.clear()
+                    await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+    async def disconnect(self) -> None:
+        if self.invalidation_task:
+            self.invalidation_task.cancel()
+            await asyncio.gather(self.invalidation_task, return_exceptions=True)
+            self.invalidation_task = None
+
+        if self.connection:
+            await self.connection.aclose()
+            logger.info("Async redis connection has been closed")
+
+        self.local.clear()
+
+    async def flushall(self) -> None:
+        self.local.clear()
+
+        if self.connection:
+            await self.connection.flushall()
+
+    async def read_through_local(self, key: str, model: Type[T] | None = None) -> Any:
+        entry = self.local.get(key)
+        if entry is TOMBSTONE:
+            self.metrics.record("l1", True)
+            self.metrics.record("negative", True)
+            return TOMBSTONE
+
+        entry = entry or {}
+        obj = entry.get(model)
+        self.metrics.record("l1", obj is not None)
+
+        if obj is None:
+            pipe = self.connection.pipeline(transaction=False) # type: ignore
+            pipe.execute_command("HGET", key, "data", **RAW)
+            pipe.pttl(key)
+            pipe.exists(f"missing:{key}")
+            payload, ttl, missing = await pipe.execute()
+
+            if payload is None and missing:
+                self.metrics.record("l2", True)
+                self.metrics.record("negative", True)
+                self.local.set(key, TOMBSTONE, ttl=self.tombstone_local_ttl)
+                return TOMBSTONE
+
+            obj = None if refresh_early(ttl) else self.codec.decode(payload, model)
+            self.metrics.record("l2", obj is not None)
+            if obj is None:
+                self.metrics.record("negative", False)
+                return cache_miss(model)
+
+            self.local.set(key, {**entry, model: obj})
+
+        return obj.model_copy() if model else dict(obj)
+
+    @asynccontextmanager
+    async def single_flight(self, key: str) -> AsyncIterator[bool]:
+        async with self.flights.acquire(key) as waited:
+            if waited or not self.connection:
+                yield not waited
+                return
+
+            lock, token = f"lock:{key}", uuid.uuid4().hex
+            timeout = settings.CACHE_LOCK_TIMEOUT
+
+            if await self.connection.set(lock, token, nx=True, px=timeout):
+                try:
+                    yield True
+                finally:
+                    await self.release_lock_script(keys=[lock], args=[token])
+                return
+
+            deadline = time.monotonic() + timeout.total_seconds()
+            while await self.connection.exists(lock) and time.monotonic() < deadline:
+                await asyncio.sleep(0.025)
+
+            yield False
+
+    async def exists(self, *names: KeyT):
+        if self.connection:
+            return await self.connection.exists(*names)
+
+    async def write_file_to_cache(
+        self, file_id: int, owner_id: int, obj_data: dict[str, Any]
+    ) -> None:
+        await self.write_files_to_cache([(file_id, owner_id, obj_data)])
+
+    async def write_files_to_cache(
+        self, files: Iterable[tuple[int, int, dict[str, Any]]]
+    ) -> None:
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=True)
+            file_ids = []
+
+            for file_id, owner_id, obj_data in files:
+                pipe.hset(f"file:{file_id}", mapping={
+                    "owner_id": owner_id,
+                    "data": self.codec.encode(obj_data)
+                })
+                pipe.zadd(f"owner_id:{owner_id}", {str(file_id): file_id})
+                pipe.delete(f"missing:file:{file_id}")
+                pipe.expire(f"file:{file_id}", time=settings.REDIS_CACHE_EXPIRY)
+                pipe.expire(f"owner_id:{owner_id}", time=settings.REDIS_CACHE_EXPIRY)
+                pipe.publish(settings.REDIS_INVALIDATION_CHANNEL, f"file:{file_id}")
+                file_ids.append(file_id)
+
+            if not file_ids:
+                return
+
+            await pipe.execute()
+            for file_id in file_ids:
+                self.local.delete(f"file:{file_id}")
+
+    async def read_file_by_id_from_cache(
+        self, file_id: int, model: Type[T] | None = None
+    ) -> Any:
+        if self.connection:
+            return await self.read_through_local(f"file:{file_id}", model)
+        return cache_miss(model)
+
+    async def read_files_by_owner_id_from_cache(
+        self,
+        owner_id: int,
+        skip: int = 0,
+        limit: int | None = None,
+        after_id: int | None = None,
+        model: Type[T] | None = None,
+    ) -> List[Any]:
+        files = []
+
+        if self.connection and (limit is None or limit > 0):
+            if after_id is not None:
+                file_ids = await self.connection.zrangebyscore(
+                    f"owner_id:{owner_id}", f"({after_id}", "+inf", start=0, num=limit
+                )
+            else:
+                end = -1 if limit is None else skip + limit - 1
+                file_ids = await self.connection.zrange(f"owner_id:{owner_id}", skip, end)
+
+            files = await self.read_files_by_ids_from_cache(file_ids, model)
+
+            if len(files) != len(file_ids):
+                return []
+
+        return files
+
+    async def read_files_by_ids_from_cache(
+        self, file_ids: Iterable[int | str], model: Type[T] | None = None
+    ) -> List[Any]:
+        if not self.connection:
+            return []
+
+        pipe = self.connection.pipeline(transaction=False)
+        for file_id in file_ids:
+            pipe.execute_command("HGET", f"file:{file_id}", "data", **RAW)
+
+        files = (self.codec.decode(payload, model) for payload in await pipe.execute())
+        return [file for file in files if file is not None]
+
+    async def read_file_count_by_owner_id_from_cache(self, owner_id: int) -> int:
+        if self.connection:
+            return await self.connection.zcard(f"owner_id:{owner_id}")
+        return 0
+
+    async def read_usage_from_cache(self, owner_id: int) -> tuple[dict[str, int], int]:
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=False)
+            pipe.hmget(f"usage:{owner_id}", ["file_count", "storage_used"])
+            pipe.get(f"usage_version:{owner_id}")
+            (file_count, storage_used), version = await pipe.execute()
+
+            if file_count is not None and storage_used is not None:
+                return {"file_count": int(file_count), "storage_used": int(storage_used)}, int(version or 0)
+            return {}, int(version or 0)
+        return {}, 0
+
+    async def write_usage_to_cache(
+        self, owner_id: int, file_count: int, storage_used: int, version: int
+    ) -> None:
+        if self.connection:
+            await self.write_usage_script(
+                keys=[f"usage:{owner_id}", f"usage_version:{owner_id}"],
+                args=[file_count, storage_used, int(settings.REDIS_CACHE_EXPIRY.total_seconds()), version],
+            )
+
+    async def increment_usage_in_cache(
+        self, owner_id: int, file_count: int, storage_used: int
+    ) -> None:
+        if self.connection:
+            await self.increment_usage_script(
+                keys=[f"usage:{owner_id}", f"usage_version:{owner_id}"],
+                args=[file_count, storage_used, int(settings.REDIS_CACHE_EXPIRY.total_seconds())],
+            )
+
+    async def write_tombstone_to_cache(self, key: str) -> None:
+        if self.connection:
+            await self.connection.set(f"missing:{key}", 1, ex=settings.CACHE_NEGATIVE_TTL)
+
+    async def delete_file_from_cache(self, file_id: int, owner_id: int | None = None) -> None:
+        if self.connection:
+            await self.delete_file_script(
+                keys=[f"file:{file_id}"],
+                args=[file_id, settings.REDIS_INVALIDATION_CHANNEL, owner_id or ""],
+            )
+            self.local.delete(f"file:{file_id}")
+
+    async def delete_files_from_cache(
+        self, file_ids: Iterable[int], owner_ids: Iterable[int] | None = None
+    ) -> None:
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=False)
+            file_ids = list(file_ids)
+            owners = list(owner_ids) if owner_ids is not None else [""] * len(file_ids)
+
+            for file_id, owner_id in zip(file_ids, owners):
+                await self.delete_file_script(
+                    keys=[f"file:{file_id}"],
+                    args=[file_id, settings.REDIS_INVALIDATION_CHANNEL, owner_id],
+                    client=pipe,
+                )
+
+            if file_ids:
+                await pipe.execute()
+
+            for file_id in file_ids:
+                self.local.delete(f"file:{file_id}")
+
+    async def write_user_to_cache(
+        self, user_id: int, email: str, obj_data: dict[str, Any]
+    ) -> None:
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=True)
+
+            pipe.hset(f"user:{user_id}", mapping={
+                "email": email,
+                "data": self.codec.encode(obj_data)
+            })
+            pipe.sadd(f"email:{email}", user_id)
+            pipe.delete(f"missing:user:{user_id}", f"missing:email:{email}")
+            pipe.expire(f"user:{user_id}", time=settings.REDIS_CACHE_EXPIRY)
+            pipe.expire(f"email:{email}", time=settings.REDIS_CACHE_EXPIRY)
+            pipe.publish(settings.REDIS_INVALIDATION_CHANNEL, f"user:{user_id}")
+
+            await pipe.execute()
+            self.local.delete(f"user:{user_id}")
+
+    async def read_user_by_id_from_cache(
+        self, user_id: int, model: Type[T] | None = None
+    ) -> Any:
+        if self.connection:
+            return await self.read_through_local(f"user:{user_id}", model)
+        return cache_miss(model)
+
+    async def read_user_by_email_from_cache(
+        self, email: str, model: Type[T] | None = None
+    ) -> Any:
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=False)
+            pipe.smembers(f"email:{email}")
+            pipe.exists(f"missing:email:{email}")
+            users, missing = await pipe.execute()
+
+            for user in users:
+                return await self.read_user_by_id_from_cache(int(user), model)
+
+            self.metrics.record("negative", bool(missing))
+            if missing:
+                return TOMBSTONE
+        return cache_miss(model)
+
+    async def revoke_principals(self, user_id: int) -> None:
+        if self.connection:
+            await self.connection.publish(settings.REDIS_INVALIDATION_CHANNEL, f"principal:{user_id}")
+        invalidate_local(self.local, f"principal:{user_id}")
+
+    async def delete_user_from_cache(self, user_id: int) -> None:
+        if self.connection:
+            await self.delete_user_script(
+                keys=[f"user:{user_id}"],
+                args=[settings.REDIS_INVALIDATION_CHANNEL, user_id],
+            )
+            self.local.delete(f"user:{user_id}")
+
+    async def delete_owner_from_cache(self, user_id: int, file_ids: Iterable[int]) -> None:
+        if self.connection:
+            pipe = self.connection.pipeline(transaction=False)
+            keys = [f"file:{file_id}" for file_id in file_ids]
+
+            for i in range(0, len(keys), UNLINK_CHUNK):
+                pipe.unlink(*keys[i:i + UNLINK_CHUNK])
+            pipe.unlink(f"owner_id:{user_id}")
+
+            for key in keys:
+                pipe.publish(settings.REDIS_INVALIDATION_CHANNEL, key)
+
+            await self.delete_user_script(
+                keys=[f"user:{user_id}"],
+                args=[settings.REDIS_INVALIDATION_CHANNEL, user_id],
+                client=pipe,
+            )
+            await pipe.execute()
+
+            for key in keys:
+                self.local.delete(key)
+            self.local.delete(f"user:{user_id}")
+
+    async def enqueue_storage_deletes(self, backend: str, keys: list[str]) -> None:
+        if self.connection and keys:
+            await self.connection.rpush(f"storage:delete:{backend}", *keys)
 
 
 redis_db = RedisInstance()
+async_redis_db = AsyncRedisInstance()
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Hashable, Iterator
+
+class LocalCache():
+    """
+    A thread safe, size bounded, in-process LRU cache whose entries expire
+    after ttl seconds.
+    """
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Any], bool]) -> None:
+        with self.lock:
+            for key in [key for key, (_, value) in self.entries.items() if predicate(value)]:
+                del self.entries[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class SingleFlight():
+    """
+    Per key locks for threads, dropped once no caller holds or waits for them.
+    """
+    def __init__(self) -> None:
+        self.flights: dict[Hashable, list] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, key: Hashable) -> Iterator[bool]:
+        """
+        Hold the lock for key, yielding whether another caller held it first.
+        """
+        with self.lock:
+            flight = self.flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+
+        waited = not flight[0].acquire(blocking=False)
+        if waited:
+            flight[0].acquire()
+
+        try:
+            yield waited
+        finally:
+            flight[0].release()
+
+            with self.lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self.flights[key]
+
+class AsyncSingleFlight():
+    """
+    SingleFlight for tasks on one event loop.
+    """
+    def __init__(self) -> None:
+        self.flights: dict[Hashable, list] = {}
+
+    @asynccontextmanager
+    async def acquire(self, key: Hashable) -> AsyncIterator[bool]:
+        flight = self.flights.setdefault(key, [asyncio.Lock(), 0])
+        flight[1] += 1
+
+        try:
+            waited = flight[0].locked()
+            async with flight[0]:
+                yield waited
+        finally:
+            flight[1] -= 1
+            if not flight[1]:
+                del self.flights[key]
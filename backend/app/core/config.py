@@ -42,8 +42,38 @@ class Settings(BaseSettings):
 
     USERS_OPEN_REGISTRATION: bool = True
 
+    # Bytes of file storage allowed per user, unlimited when unset
+    USER_STORAGE_QUOTA: int | None = None
+
+    # Most files accepted by one call of the batch file routes
+    FILE_BATCH_LIMIT: int = 1000
+
+    # Most files returned by one page of the file listing
+    FILE_PAGE_LIMIT: int = 1000
+
+    # Accounts with more files than this are deleted by a background task
+    # after the response is sent, deletion is always inline when unset
+    USER_DELETE_BACKGROUND_FILES: int | None = None
+    # Attempts at a background deletion before it is logged and given up on
+    USER_DELETE_ATTEMPTS: int = 5
+
+    # Serve the file routes with async handlers over AsyncSession and
+    # redis.asyncio instead of sync handlers in the thread pool
+    ASYNC_MODE: bool = False
+
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7 # 7 days
 
+    # Trust recently verified tokens on the file routes without reading the
+    # user; revocations are broadcast to every worker over the redis
+    # invalidation channel
+    STATELESS_AUTH: bool = False
+    AUTH_CACHE_SIZE: int = 4096
+    AUTH_CACHE_TTL_SECONDS: int = 60
+
+    # Password hashing pool; requests beyond workers + queue limit get a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+
     # Database Config
     POSTGRES_SERVER: str
     POSTGRES_PORT: int = 5432
@@ -65,6 +95,7 @@ class Settings(BaseSettings):
 
     # Testing Database Config
     SQLALCHEMY_TESTING_DATABASE_URI: str = "sqlite://"
+    SQLALCHEMY_TESTING_ASYNC_DATABASE_URI: str = "sqlite+aiosqlite://"
     TEST_USER_EMAIL: str = "user@email.com"
     TEST_USER_PASSWORD: str = "password"
 
@@ -76,5 +107,83 @@ class Settings(BaseSettings):
 
     REDIS_CACHE_EXPIRY: timedelta = timedelta(seconds=3600)
 
+    # A missed key is refilled by one loader while other callers wait up to
+    # CACHE_LOCK_TIMEOUT for it. Hot keys are refreshed shortly before they
+    # expire (XFetch), CACHE_REFRESH_DELTA being the expected reload time
+    CACHE_LOCK_TIMEOUT: timedelta = timedelta(seconds=5)
+    CACHE_REFRESH_DELTA: timedelta = timedelta(milliseconds=50)
+    CACHE_REFRESH_BETA: float = 1.0
+
+    # Lookups of ids and emails that do not exist are remembered this long
+    CACHE_NEGATIVE_TTL: timedelta = timedelta(seconds=30)
+
+    # Encoding of cached objects, msgpack needs the optional msgpack package
+    CACHE_CODEC: Literal["json", "orjson", "msgpack"] = "orjson"
+
+    # In-process cache in front of redis for single file and user reads;
+    # writes are broadcast on the channel so other workers drop their copy
+    LOCAL_CACHE_SIZE: int = 10_000
+    LOCAL_CACHE_TTL_SECONDS: int = 30
+    REDIS_INVALIDATION_CHANNEL: str = "cache-invalidation"
+
+    # Request, cache and database metrics served at /metrics for prometheus
+    METRICS_ENABLED: bool = True
+
+    # Debug headers reporting each request's database queries and redis round
+    # trips, as Server-Timing and X-DB-Queries / X-Redis-Round-Trips. Needs
+    # METRICS_ENABLED
+    REQUEST_ROUND_TRIP_HEADERS: bool = False
+
+    # Storage Config
+    # File contents are kept in S3, or on a single node in files sharded under
+    # STORAGE_LOCAL_PATH, and streamed in chunks of STORAGE_STREAM_CHUNK_SIZE
+    STORAGE_BACKEND: Literal["s3", "local"] = "s3"
+    STORAGE_LOCAL_PATH: str = "/var/lib/fileshare/storage"
+    STORAGE_STREAM_CHUNK_SIZE: int = 256 * 1024
+
+    # ZIP downloads read this many files ahead concurrently, each buffering at
+    # most ARCHIVE_PREFETCH_CHUNKS chunks, so memory does not grow with the
+    # size of the archive
+    ARCHIVE_PREFETCH_FILES: int = 4
+    ARCHIVE_PREFETCH_CHUNKS: int = 4
+
+    # Objects of deleted files are queued in redis and purged by the worker
+    # (python -m app.storage.purge) in batches of STORAGE_DELETE_BATCH_SIZE.
+    # Failed deletes are retried after a backoff doubling from
+    # STORAGE_DELETE_RETRY_DELAY, up to STORAGE_DELETE_MAX_ATTEMPTS attempts
+    STORAGE_DELETE_BATCH_SIZE: int = 1000
+    STORAGE_DELETE_POLL_INTERVAL: timedelta = timedelta(seconds=1)
+    STORAGE_DELETE_RETRY_DELAY: timedelta = timedelta(seconds=5)
+    STORAGE_DELETE_RETRY_MAX_DELAY: timedelta = timedelta(minutes=10)
+    STORAGE_DELETE_MAX_ATTEMPTS: int = 8
+
+    # Every STORAGE_ORPHAN_SWEEP_INTERVAL the worker deletes objects no file
+    # refers to, once they are older than STORAGE_ORPHAN_GRACE, the time
+    # allowed between a presigned upload and creating it's file. Unset
+    # disables the sweep
+    STORAGE_ORPHAN_SWEEP_INTERVAL: timedelta | None = timedelta(hours=1)
+    STORAGE_ORPHAN_GRACE: timedelta = timedelta(days=1)
+
+    S3_FILE_BUCKET_NAME: str = "fileshare-file-bucket"
+    S3_REGION: str = "ca-central-1"
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+
+    # The server talks to S3_ENDPOINT_URL while presigned URLs are signed for
+    # S3_PUBLIC_ENDPOINT_URL, the address browsers reach storage on. Both
+    # default to AWS itself
+    S3_ENDPOINT_URL: str | None = None
+    S3_PUBLIC_ENDPOINT_URL: str | None = None
+    S3_PRESIGNED_URL_EXPIRY: timedelta = timedelta(hours=1)
+
+    # S3 allows at most 10,000 parts per multipart upload
+    S3_MULTIPART_MAX_PARTS: int = 10_000
+
+    # Resumable uploads are sent in chunks of this size, the last one may be
+    # shorter. S3 needs parts of at least 5 MiB. Sessions are dropped once
+    # idle for RESUMABLE_UPLOAD_EXPIRY
+    RESUMABLE_UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024
+    RESUMABLE_UPLOAD_EXPIRY: timedelta = timedelta(hours=24)
+
 
 settings = Settings() # type: ignore
@@ -0,0 +1,320 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator
+
+import redis.asyncio.connection
+import redis.connection
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+registry = CollectorRegistry()
+
+# Redis round trips and most queries take well under a millisecond, so the
+# buckets start lower than the prometheus_client defaults
+FAST_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1.0)
+
+http_requests = Counter(
+    "http_requests", "HTTP requests handled", ["method", "route", "status"], registry=registry
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request", ["method", "route"], registry=registry
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ["method", "route"], registry=registry
+)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per HTTP request",
+    ["method", "route"],
+    buckets=FAST_BUCKETS,
+    registry=registry,
+)
+http_request_db_queries = Counter(
+    "http_request_db_queries", "Database queries run by HTTP requests", ["method", "route"], registry=registry
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Time to run a database query", ["operation"], buckets=FAST_BUCKETS, registry=registry
+)
+cache_operation_duration = Histogram(
+    "cache_operation_duration_seconds",
+    "Time of a cache method call, including it's redis round trips",
+    ["instance", "method"],
+    buckets=FAST_BUCKETS,
+    registry=registry,
+)
+cache_operation_errors = Counter(
+    "cache_operation_errors", "Cache method calls that raised", ["instance", "method"], registry=registry
+)
+
+OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+LOOKUP_RESULTS = {"hits": "hit", "misses": "miss"}
+
+class RequestMetrics():
+    """
+    Totals for the request being handled, read by the middleware once the
+    response is sent.
+    """
+    __slots__ = ("db_queries", "db_seconds", "redis_round_trips")
+
+    def __init__(self) -> None:
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.redis_round_trips = 0
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_queries} queries", '
+            f'redis;desc="{self.redis_round_trips} round trips"'
+        )
+
+current_request: ContextVar[RequestMetrics | None] = ContextVar("current_request", default=None)
+
+@contextmanager
+def track_round_trips() -> Iterator[RequestMetrics]:
+    """
+    Count the database queries and redis round trips made inside the block,
+    as is done for each request, so tests can hold code to a budget:
+
+        with track_round_trips() as trips:
+            file_crud.read_files(session=session, ids=ids)
+        assert trips.db_queries <= 1
+    """
+    request = RequestMetrics()
+    token = current_request.set(request)
+    try:
+        yield request
+    finally:
+        current_request.reset(token)
+
+def route_name(scope: Scope) -> str:
+    """
+    Return the path template of the route matching the request, so requests
+    for /files/1 and /files/2 share their series.
+    """
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+
+    return partial or "unmatched"
+
+class MetricsMiddleware():
+    """
+    Count HTTP requests and time them, along with the database queries they
+    run, per route.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.series: dict[tuple[str, str], tuple[Any, Any, Any, Any]] = {}
+        self.counters: dict[tuple[str, str, int], Any] = {}
+
+    def route_series(self, method: str, route: str) -> tuple[Any, Any, Any, Any]:
+        """
+        Return the duration, in flight, query count and query time series of
+        the route, looked up once and kept, since resolving labels is a good
+        part of the cost of an observation.
+        """
+        key = (method, route)
+        if key not in self.series:
+            self.series[key] = (
+                http_request_duration.labels(method, route),
+                http_requests_in_flight.labels(method, route),
+                http_request_db_queries.labels(method, route),
+                http_request_db_duration.labels(method, route),
+            )
+        return self.series[key]
+
+    def requests_counter(self, method: str, route: str, status: int) -> Any:
+        key = (method, route, status)
+        if key not in self.counters:
+            self.counters[key] = http_requests.labels(method, route, status)
+        return self.counters[key]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], route_name(scope)
+        status = 500
+
+        with track_round_trips() as request:
+            async def send_with_status(message: Message) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+
+                    if settings.REQUEST_ROUND_TRIP_HEADERS:
+                        headers = MutableHeaders(scope=message)
+                        headers.append("server-timing", request.server_timing())
+                        headers.append("x-db-queries", str(request.db_queries))
+                        headers.append("x-redis-round-trips", str(request.redis_round_trips))
+                await send(message)
+
+            duration, in_flight, db_queries, db_duration = self.route_series(method, route)
+            in_flight.inc()
+            started_at = time.perf_counter()
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                duration.observe(time.perf_counter() - started_at)
+                in_flight.dec()
+                self.requests_counter(method, route, status).inc()
+                db_queries.inc(request.db_queries)
+                db_duration.observe(request.db_seconds)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+
+    operation = statement.lstrip()[:6].upper()
+    db_query_duration.labels(operation if operation in OPERATIONS else "OTHER").observe(elapsed)
+
+    request = current_request.get()
+    if request is not None:
+        request.db_queries += 1
+        request.db_seconds += elapsed
+
+def instrument_engines() -> None:
+    """
+    Time every query of every engine, the async engines' included.
+    """
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+
+def count_round_trip(send_packed_command: Callable) -> Callable:
+    @functools.wraps(send_packed_command)
+    def wrapper(*args, **kwargs):
+        request = current_request.get()
+        if request is not None:
+            request.redis_round_trips += 1
+        return send_packed_command(*args, **kwargs)
+
+    wrapper.instrumented = True # type: ignore
+    return wrapper
+
+def count_async_round_trip(send_packed_command: Callable) -> Callable:
+    @functools.wraps(send_packed_command)
+    async def wrapper(*args, **kwargs):
+        request = current_request.get()
+        if request is not None:
+            request.redis_round_trips += 1
+        return await send_packed_command(*args, **kwargs)
+
+    wrapper.instrumented = True # type: ignore
+    return wrapper
+
+def instrument_redis_connections() -> None:
+    """
+    Count redis round trips for the current request. Every command, and
+    every pipeline as a whole, is written with one send_packed_command call.
+    """
+    for module, count in (
+        (redis.connection, count_round_trip),
+        (redis.asyncio.connection, count_async_round_trip),
+    ):
+        cls = module.AbstractConnection
+        if not getattr(cls.send_packed_command, "instrumented", False):
+            cls.send_packed_command = count(cls.send_packed_command) # type: ignore
+
+def timed(func: Callable, instance: str) -> Callable:
+    duration = cache_operation_duration.labels(instance, func.__name__)
+    errors = cache_operation_errors.labels(instance, func.__name__)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - started_at)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started_at)
+
+    return wrapper
+
+def instrument_methods(cls: type, instance: str, exclude: Iterable[str] = ()) -> None:
+    """
+    Time every public method of cls. Label children are resolved once here,
+    so a call only pays for two clock reads and an observation.
+    """
+    for name, func in list(vars(cls).items()):
+        if name.startswith("_") or name in exclude or not inspect.isfunction(func):
+            continue
+        if getattr(func, "instrumented", False):
+            continue
+
+        wrapper = timed(func, instance)
+        wrapper.instrumented = True # type: ignore
+        setattr(cls, name, wrapper)
+
+class SnapshotCollector():
+    """
+    Export counters the application already keeps, read when /metrics is
+    scraped rather than on every update.
+    """
+    def __init__(self, caches: dict[str, Any], password_hasher: Any) -> None:
+        self.caches = caches
+        self.password_hasher = password_hasher
+
+    def collect(self) -> Iterator[Any]:
+        lookups = CounterMetricFamily(
+            "cache_lookups", "Cache lookups per tier", labels=["instance", "tier", "result"]
+        )
+        for instance, cache in self.caches.items():
+            for name, value in cache.metrics.snapshot().items():
+                tier, result = name.rsplit("_", 1)
+                lookups.add_metric([instance, tier, LOOKUP_RESULTS[result]], value)
+        yield lookups
+
+        hasher = self.password_hasher.metrics()
+        yield GaugeMetricFamily(
+            "password_hasher_in_flight", "Password hashes queued or running", value=hasher.get("in_flight", 0)
+        )
+        for name in ("submitted", "completed", "rejected"):
+            yield CounterMetricFamily(
+                f"password_hasher_{name}", f"Password hashes {name}", value=hasher.get(name, 0)
+            )
+        for name in ("wait_seconds", "run_seconds"):
+            yield CounterMetricFamily(
+                f"password_hasher_{name}", f"Total password hash {name.replace('_', ' ')}", value=hasher.get(name, 0)
+            )
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,11 +1,16 @@
+import asyncio
 import logging
+import threading
+import time
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Any, Callable
 
 from jose import jwt
 from passlib.context import CryptContext
 
+from app.cache.local import LocalCache
 from app.core.config import settings
 
 # https://github.com/pyca/bcrypt/issues/684#issuecomment-1858400267
@@ -15,9 +20,17 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 ALGORITHM = "HS256"
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+# Verified tokens mapped to the principal they authenticate
+principal_cache = LocalCache(
+    maxsize=settings.AUTH_CACHE_SIZE,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+def create_access_token(
+    subject: str | Any, expires_delta: timedelta, version: int = 0
+) -> str:
     expire = datetime.utcnow() + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {"exp": expire, "sub": str(subject), "ver": version}
     encoded_jwt = jwt.encode(
         to_encode,
         settings.SECRET_KEY,
@@ -31,3 +44,77 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when the password hashing queue is full.
+    """
+
+class PasswordHasher():
+    """
+    Runs bcrypt on a small dedicated thread pool (bcrypt releases the GIL) with
+    a bounded queue, so a burst of logins is rejected early instead of tying
+    up the threads that serve every other route.
+    """
+    def __init__(self, max_workers: int, max_queue: int) -> None:
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="password-hasher")
+        self.slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.lock = threading.Lock()
+        self.counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "in_flight": 0,
+            "wait_seconds": 0.0,
+            "run_seconds": 0.0,
+        }
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.counters["rejected"] += 1
+            raise PasswordHasherBusy()
+
+        with self.lock:
+            self.counters["submitted"] += 1
+            self.counters["in_flight"] += 1
+
+        queued_at = time.perf_counter()
+
+        def run() -> Any:
+            started_at = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished_at = time.perf_counter()
+                with self.lock:
+                    self.counters["completed"] += 1
+                    self.counters["in_flight"] -= 1
+                    self.counters["wait_seconds"] += started_at - queued_at
+                    self.counters["run_seconds"] += finished_at - started_at
+                self.slots.release()
+
+        return self.executor.submit(run)
+
+    def metrics(self) -> dict[str, float]:
+        with self.lock:
+            return dict(self.counters)
+
+    def hash(self, password: str) -> str:
+        return self.submit(get_password_hash, password).result()
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self.submit(verify_password, plain_password, hashed_password).result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(get_password_hash, password))
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(
+            self.submit(verify_password, plain_password, hashed_password)
+        )
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
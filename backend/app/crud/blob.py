@@ -0,0 +1,180 @@
+from collections import Counter, defaultdict
+from typing import Any, Iterable, List
+
+from sqlalchemy import CompoundSelect, Delete, Update, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.blob import Blob
+from app.models.file import File
+
+def release_statements(blob_ids: Iterable[int | None]) -> tuple[list[Update], Delete | None]:
+    """
+    Statements dropping one reference to the blob per occurrence of it's id,
+    one UPDATE per distinct count, and a DELETE of the blobs left unreferenced
+    returning their access keys. The DELETE is None when there are no ids.
+    """
+    counts = Counter(blob_id for blob_id in blob_ids if blob_id is not None)
+    if not counts:
+        return [], None
+
+    by_count = defaultdict(list)
+    for blob_id, count in counts.items():
+        by_count[count].append(blob_id)
+
+    updates = [
+        update(Blob).where(Blob.id.in_(ids)).values(ref_count=Blob.ref_count - count)
+        for count, ids in by_count.items()
+    ]
+    orphans = delete(Blob).where(Blob.id.in_(counts), Blob.ref_count <= 0).returning(Blob.access_key)
+
+    return updates, orphans
+
+def blobless_keys(files: Iterable[Any]) -> List[str]:
+    """
+    Storage keys of the files, or rows with their access_key and blob_id,
+    that no blob owns. These objects were stored before blobs, or registered
+    directly, and are only removed once no other file refers to them.
+    """
+    return list(dict.fromkeys(file.access_key for file in files if file.blob_id is None))
+
+def referenced_keys_statement(keys: List[str]) -> CompoundSelect:
+    """
+    Statement selecting the storage keys, of those given, that a file or blob
+    still refers to.
+    """
+    return (
+        select(File.access_key).where(File.access_key.in_(keys))
+        .union(select(Blob.access_key).where(Blob.access_key.in_(keys)))
+    )
+
+class CRUDBlobs():
+    """
+    Blobs are only changed inside the transaction of the file they belong to,
+    so none of these methods commit.
+    """
+    def acquire_blob(
+        self, *, session: Session, digest: str, access_key: str, size: int
+    ) -> Blob:
+        """
+        Take a reference to the blob with digest, recording the object at
+        access_key as that blob when there is none yet.
+        """
+        blob = session.scalars(
+            select(Blob).filter_by(digest=digest).with_for_update()
+        ).first()
+
+        if not blob:
+            try:
+                with session.begin_nested():
+                    blob = Blob(digest=digest, access_key=access_key, size=size, ref_count=1)
+                    session.add(blob)
+                return blob
+            except IntegrityError:
+                # Another upload of the same content recorded it first
+                blob = session.scalars(
+                    select(Blob).filter_by(digest=digest).with_for_update()
+                ).one()
+
+        session.execute(update(Blob).where(Blob.id == blob.id).values(ref_count=Blob.ref_count + 1))
+
+        return blob
+
+    def read_blob_by_digest(
+        self, *, session: Session, digest: str, owner_id: int
+    ) -> Blob | None:
+        """
+        Read the blob with digest if one of the owner's files points at it.
+        Other users' blobs are never matched by digest alone, which would let
+        anyone who knows a digest confirm the content exists and copy it.
+        """
+        return session.scalars(
+            select(Blob)
+            .join(File, File.blob_id == Blob.id)
+            .where(Blob.digest == digest, File.owner_id == owner_id)
+            .limit(1)
+        ).first()
+
+    def read_unreferenced_keys(
+        self, *, session: Session, keys: List[str]
+    ) -> List[str]:
+        """
+        Return the storage keys, of those given, that no file or blob refers
+        to.
+        """
+        if not keys:
+            return []
+
+        referenced = set(session.scalars(referenced_keys_statement(keys)).all())
+
+        return [key for key in keys if key not in referenced]
+
+    def release_blobs(
+        self, *, session: Session, blob_ids: Iterable[int | None]
+    ) -> List[str]:
+        """
+        Drop a reference for each id, skipping None. Returns the access keys
+        of blobs left unreferenced, which are deleted, so the caller can
+        remove their objects once it commits.
+        """
+        updates, orphans = release_statements(blob_ids)
+        if orphans is None:
+            return []
+
+        for statement in updates:
+            session.execute(statement)
+
+        return list(session.scalars(orphans).all())
+
+class AsyncCRUDBlobs():
+    """
+    CRUDBlobs for AsyncSession.
+    """
+    async def acquire_blob(
+        self, *, session: AsyncSession, digest: str, access_key: str, size: int
+    ) -> Blob:
+        blob = (await session.scalars(
+            select(Blob).filter_by(digest=digest).with_for_update()
+        )).first()
+
+        if not blob:
+            try:
+                async with session.begin_nested():
+                    blob = Blob(digest=digest, access_key=access_key, size=size, ref_count=1)
+                    session.add(blob)
+                return blob
+            except IntegrityError:
+                # Another upload of the same content recorded it first
+                blob = (await session.scalars(
+                    select(Blob).filter_by(digest=digest).with_for_update()
+                )).one()
+
+        await session.execute(update(Blob).where(Blob.id == blob.id).values(ref_count=Blob.ref_count + 1))
+
+        return blob
+
+    async def read_unreferenced_keys(
+        self, *, session: AsyncSession, keys: List[str]
+    ) -> List[str]:
+        if not keys:
+            return []
+
+        referenced = set((await session.scalars(referenced_keys_statement(keys))).all())
+
+        return [key for key in keys if key not in referenced]
+
+    async def release_blobs(
+        self, *, session: AsyncSession, blob_ids: Iterable[int | None]
+    ) -> List[str]:
+        updates, orphans = release_statements(blob_ids)
+        if orphans is None:
+            return []
+
+        for statement in updates:
+            await session.execute(statement)
+
+        return list((await session.scalars(orphans)).all())
+
+blob_crud = CRUDBlobs()
+async_blob_crud = AsyncCRUDBlobs()
@@ -1,56 +1,303 @@
-from typing import List
+import re
+from typing import Any, List, Type, TypeVar
 
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, func
+from pydantic import BaseModel
+from sqlalchemy import (
+    BigInteger,
+    CompoundSelect,
+    Select,
+    Update,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.cache.core import redis_db as redis
+from app.cache.core import TOMBSTONE, async_redis_db as async_redis, redis_db as redis
+from app.core.config import settings
+from app.crud.blob import async_blob_crud, blob_crud, blobless_keys
 from app.models.file import File
-from app.schemas.file import FileCreate, FileUpdate
+from app.models.user import User
+from app.schemas.file import FileCreate, FileUpdate, StorageUsage
 from app.schemas.security import Message
+from app.schemas.utils import to_pydantic
+from app.storage.engine import storage_engine
+
+T = TypeVar("T", bound=BaseModel)
+
+def owner_files_statement(
+    user_id: int, skip: int, limit: int, after_id: int | None
+) -> Select:
+    """
+    Select a page of the owner's files ordered by id, by keyset when after_id
+    is given and by offset otherwise.
+    """
+    statement = select(File).filter_by(owner_id=user_id).order_by(File.id).limit(limit)
+
+    if after_id is not None:
+        return statement.where(File.id > after_id)
+
+    return statement.offset(skip)
+
+def split_name(name: str) -> tuple[str, str]:
+    """
+    Split name into base and extension, the extension keeping it's dot.
+    """
+    base, dot, extension = name.rpartition(".")
+    if not base:
+        return name, ""
+
+    return base, dot + extension
+
+def unique_name_statement(name: str, owner_id: int) -> tuple[Select, str, str]:
+    """
+    Split name into base and extension and select whether the owner already
+    has name, together with the largest numeric suffix of any base_N copy.
+    """
+    base, extension = split_name(name)
+
+    prefix = f"{base}_".replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    # Longer suffixes are not counted, they would overflow the cast to bigint
+    pattern = f"^{re.escape(base)}_[0-9]{{1,18}}{re.escape(extension)}$"
+    suffix = func.substr(
+        File.name, len(base) + 2, func.length(File.name) - len(base) - 1 - len(extension)
+    )
+
+    statement = select(
+        func.count(case((File.name == name, 1))),
+        func.max(case((File.name.regexp_match(pattern), cast(suffix, BigInteger)))),
+    ).where(
+        File.owner_id == owner_id,
+        or_(File.name == name, File.name.like(f"{prefix}%", escape="\\")),
+    )
+
+    return statement, base, extension
+
+def unique_names_statement(
+    names: List[str], owner_id: int
+) -> tuple[CompoundSelect, List[tuple[str, str]]]:
+    """
+    unique_name_statement for many names in one round trip. Each row carries
+    the position of its name in names, and the base and extension of every
+    name are returned in the same order.
+    """
+    statements, parts = [], []
+    for i, name in enumerate(names):
+        statement, base, extension = unique_name_statement(name, owner_id)
+        statements.append(statement.add_columns(literal(i)))
+        parts.append((base, extension))
+
+    return union_all(*statements), parts
+
+def resolve_unique_names(
+    names: List[str], existing: dict[str, tuple[int, int | None, str, str]]
+) -> List[str]:
+    """
+    Resolve names as if each had been created one after another, given the
+    taken count, largest suffix, base and extension of each distinct name.
+    """
+    assigned: set[str] = set()
+    suffixes: dict[tuple[str, str], int] = {}
+    unique_names = []
+
+    for name in names:
+        taken, max_suffix, base, extension = existing[name]
+
+        if not taken and name not in assigned:
+            unique_name = name
+        else:
+            suffix = suffixes.get((base, extension), max_suffix or 0) + 1
+            while f"{base}_{suffix}{extension}" in assigned:
+                suffix += 1
+
+            suffixes[(base, extension)] = suffix
+            unique_name = f"{base}_{suffix}{extension}"
+
+        assigned.add(unique_name)
+        unique_names.append(unique_name)
+
+    return unique_names
+
+def usage_statement(owner_id: int, file_count: int, storage_used: int) -> Update:
+    """
+    Adjust the owner's denormalized file count and storage usage in the same
+    transaction as the file change.
+    """
+    return update(User).where(User.id == owner_id).values(
+        file_count=User.file_count + file_count,
+        storage_used=User.storage_used + storage_used,
+    )
+
+def lock_owner_statement(owner_id: int) -> Select:
+    """
+    Lock the owner's row, and read it's storage usage, so concurrent creates
+    resolve names and check the quota one at a time.
+    """
+    return select(User.storage_used).where(User.id == owner_id).with_for_update()
+
+def exceeds_quota(storage_used: int | None, size: int) -> bool:
+    quota = settings.USER_STORAGE_QUOTA
+    return quota is not None and (storage_used or 0) + size > quota
+
+class StorageQuotaExceeded(Exception):
+    """
+    Raised when creating or growing files would take their owner past
+    USER_STORAGE_QUOTA. Nothing was written, and the owner's row stays locked
+    until the session's transaction ends.
+    """
+
+# SQLite refuses compound selects of more than 500 terms
+UNIQUE_NAMES_CHUNK = 500
 
 class CRUDFiles():
     def create_file(
-        self, *, session: Session, file_in: FileCreate, owner_id: int
+        self, *, session: Session, file_in: FileCreate, owner_id: int, digest: str | None = None
     ) -> File:
         """
-        Create a new database file.
+        Create a new database file. A name already used by the owner is given
+        the next free numeric suffix. With the digest of the content the file
+        points at the blob holding it, which is the object at
+        file_in.access_key unless the content was stored before. Raises
+        StorageQuotaExceeded when the file does not fit in the owner's quota.
         """
+        storage_used = session.scalar(lock_owner_statement(owner_id))
+        if exceeds_quota(storage_used, file_in.size or 0):
+            raise StorageQuotaExceeded()
+
+        name = self.generate_unique_name(session=session, name=file_in.name, owner_id=owner_id)
+
+        blob_id, access_key = None, file_in.access_key
+        if digest:
+            blob = blob_crud.acquire_blob(
+                session=session, digest=digest, access_key=file_in.access_key, size=file_in.size or 0
+            )
+            blob_id, access_key = blob.id, blob.access_key
+
         new_file = File(
-            name=file_in.name,
-            access_key=file_in.access_key,
+            name=name,
+            access_key=access_key,
             size=file_in.size,
             owner_id=owner_id,
+            blob_id=blob_id,
             created_at=func.now(),
             updated_at=func.now(),
         )
 
         session.add(new_file)
+        session.execute(usage_statement(owner_id, 1, file_in.size or 0))
         session.commit()
         session.refresh(new_file)
 
         redis.write_file_to_cache(new_file.id, new_file.owner_id, jsonable_encoder(new_file))
+        redis.increment_usage_in_cache(owner_id, 1, file_in.size or 0)
 
         return new_file
 
+    def create_files(
+        self, *, session: Session, files_in: List[FileCreate], owner_id: int
+    ) -> List[File]:
+        """
+        Create many database files in one transaction with a multi-row insert.
+        Names are made unique against the owner's files and each other, and
+        either all of the files fit in the owner's quota or none are created.
+        """
+        size = sum(file_in.size or 0 for file_in in files_in)
+
+        storage_used = session.scalar(lock_owner_statement(owner_id))
+        if exceeds_quota(storage_used, size):
+            raise StorageQuotaExceeded()
+
+        names = self.generate_unique_names(
+            session=session, names=[file_in.name for file_in in files_in], owner_id=owner_id
+        )
+
+        files = session.scalars(
+            insert(File).values(created_at=func.now(), updated_at=func.now()).returning(File),
+            [
+                {"name": name, "access_key": file_in.access_key, "size": file_in.size, "owner_id": owner_id}
+                for name, file_in in zip(names, files_in)
+            ],
+        ).all()
+
+        session.execute(usage_statement(owner_id, len(files), size))
+
+        # Encoded before the commit expires the returned rows
+        file_objs = sorted((jsonable_encoder(file) for file in files), key=lambda file: file["id"])
+        session.commit()
+
+        redis.write_files_to_cache([(file["id"], owner_id, file) for file in file_objs])
+        redis.increment_usage_in_cache(owner_id, len(file_objs), size)
+
+        return [File(**file) for file in file_objs]
+
     def read_file(
-        self, *, session: Session, id: int
-    ) -> File | None:
+        self, *, session: Session, id: int, model: Type[T] | None = None
+    ) -> Any:
         """
-        Read the database file by it's id.
+        Read the database file by it's id. Passing a pydantic model returns the
+        file as that model, decoded straight from the cache on a hit. On a miss
+        only one caller per id reloads the file, the others wait for it. Ids
+        that do not exist are remembered for a short while.
         """
-        file_obj = redis.read_file_by_id_from_cache(id)
+        file_obj = redis.read_file_by_id_from_cache(id, model)
+        if file_obj is TOMBSTONE:
+            return None
         if file_obj:
-            return File(**file_obj)
+            return file_obj if model else File(**file_obj)
+
+        with redis.single_flight(f"file:{id}") as leader:
+            if not leader:
+                file_obj = redis.read_file_by_id_from_cache(id, model)
+                if file_obj is TOMBSTONE:
+                    return None
+                if file_obj:
+                    return file_obj if model else File(**file_obj)
+
+            file = session.scalars(
+                select(File).filter_by(id=id)
+            ).first()
+
+            if file:
+                redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+            else:
+                redis.write_tombstone_to_cache(f"file:{id}")
+
+        return to_pydantic(file, model) if file and model else file
+
+    def read_files(
+        self, *, session: Session, ids: List[int], model: Type[T] | None = None
+    ) -> List[Any]:
+        """
+        Read many database files by id, in the order of ids. Cached files are
+        read in one round trip and the rest with a single query. Ids that do
+        not exist are left out.
+        """
+        ids = list(dict.fromkeys(ids))
+        files = {
+            file.id if model else file["id"]: file if model else File(**file)
+            for file in redis.read_files_by_ids_from_cache(ids, model)
+        }
 
-        file = session.scalars(
-            select(File).filter_by(id=id)
-        ).first()
+        missing = [id for id in ids if id not in files]
+        if missing:
+            loaded = session.scalars(select(File).where(File.id.in_(missing))).all()
+            redis.write_files_to_cache(
+                [(file.id, file.owner_id, jsonable_encoder(file)) for file in loaded]
+            )
 
-        if file:
-            redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+            for file in loaded:
+                files[file.id] = to_pydantic(file, model) if model else file
 
-        return file
+        return [files[id] for id in ids if id in files]
 
     def read_file_by_name(
         self, *, session: Session, name: str, owner_id: int
@@ -62,35 +309,79 @@ class CRUDFiles():
             select(File).filter_by(name=name, owner_id=owner_id)
         ).first()
 
+    def read_owned_keys(
+        self, *, session: Session, keys: List[str], owner_id: int
+    ) -> set[str]:
+        """
+        Return the access keys, of those given, that one of the owner's files
+        already points at.
+        """
+        return set(session.scalars(
+            select(File.access_key).where(File.owner_id == owner_id, File.access_key.in_(keys))
+        ).all())
+
     def read_file_count_by_owner_id(
         self, *, session: Session, user_id: int
     ) -> int:
-        count = session.scalar(
-            select(func.count()).select_from(File).where(File.owner_id == user_id)
-        )
+        return self.read_usage_by_owner_id(session=session, user_id=user_id).file_count
+
+    def read_usage_by_owner_id(
+        self, *, session: Session, user_id: int
+    ) -> StorageUsage:
+        """
+        Read the owner's file count and storage usage from the counters kept on
+        their user row.
+        """
+        usage, version = redis.read_usage_from_cache(user_id)
+        if usage:
+            return StorageUsage(**usage, storage_quota=settings.USER_STORAGE_QUOTA)
+
+        row = session.execute(
+            select(User.file_count, User.storage_used).where(User.id == user_id)
+        ).first()
+        file_count, storage_used = (row[0] or 0, row[1] or 0) if row else (0, 0)
 
-        return 0 if count == None else count
+        redis.write_usage_to_cache(user_id, file_count, storage_used, version)
+
+        return StorageUsage(
+            file_count=file_count,
+            storage_used=storage_used,
+            storage_quota=settings.USER_STORAGE_QUOTA,
+        )
 
     def read_all_files_by_owner_id(
-        self, *, session: Session, user_id: int, skip: int = 0, limit: int = 25
-        ) -> List[File]:
+        self,
+        *,
+        session: Session,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 25,
+        after_id: int | None = None,
+        model: Type[T] | None = None,
+        ) -> List[Any]:
         """
-        Read all the database file's that have an owner_id of user_id.
+        Read all the database file's that have an owner_id of user_id, ordered
+        by id. Passing after_id pages by keyset instead of by offset, and
+        passing model returns the files as that pydantic model.
         """
-        database_file_count = self.read_file_count_by_owner_id(session=session, user_id=user_id)
+        file_count = self.read_file_count_by_owner_id(session=session, user_id=user_id)
         cached_file_count = redis.read_file_count_by_owner_id_from_cache(user_id)
 
-        if database_file_count == cached_file_count:
-            file_objs = redis.read_files_by_owner_id_from_cache(user_id)
+        if file_count == cached_file_count:
+            file_objs = redis.read_files_by_owner_id_from_cache(
+                user_id, skip=skip, limit=limit, after_id=after_id, model=model
+            )
             if file_objs:
-                return [File(**file) for file in file_objs]
+                return file_objs if model else [File(**file) for file in file_objs]
 
         files = session.scalars(
-            select(File).filter_by(owner_id=user_id).offset(skip).limit(limit)
+            owner_files_statement(user_id, skip, limit, after_id)
         ).all()
 
-        for file in files:
-            redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+        redis.write_files_to_cache([(file.id, file.owner_id, jsonable_encoder(file)) for file in files])
+
+        if model:
+            return [to_pydantic(file, model) for file in files]
 
         return files # type: ignore
 
@@ -99,21 +390,35 @@ class CRUDFiles():
     ) -> File:
         """
         Update the database file with the details provided in file_in.
+        Raises StorageQuotaExceeded when a larger size does not fit in the
+        owner's quota.
         """
-        file = session.get(File, file_id)
+        file = session.get(File, file_id, with_for_update=True)
+        size = file.size or 0 # type: ignore
 
         obj_data = jsonable_encoder(file)
         update_data = file_in.model_dump(exclude_unset=True)
 
+        if update_data.get("size", size) > size:
+            storage_used = session.scalar(lock_owner_statement(file.owner_id)) # type: ignore
+            if exceeds_quota(storage_used, update_data["size"] - size):
+                raise StorageQuotaExceeded()
+
         for field in obj_data:
             if field in update_data:
                 setattr(file, field, update_data[field])
 
+        size_change = (file.size or 0) - size # type: ignore
+
         session.add(file)
+        if size_change:
+            session.execute(usage_statement(file.owner_id, 0, size_change)) # type: ignore
         session.commit()
         session.refresh(file)
 
         redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file)) # type: ignore
+        if size_change:
+            redis.increment_usage_in_cache(file.owner_id, 0, size_change) # type: ignore
     
         return file
 
@@ -121,34 +426,388 @@ class CRUDFiles():
         self, *, session: Session, file_id: int
     ) -> Message:
         """
-        Delete the database file.
+        Delete the database file, and it's object when no other file or blob
+        refers to it.
         """
-        file = session.get(File, file_id)
+        file = session.get(File, file_id, with_for_update=True)
+        owner_id, size, blob_id = file.owner_id, file.size or 0, file.blob_id # type: ignore
+        keys = blobless_keys([file]) # type: ignore
 
         session.delete(file)
+        session.flush()
+        orphans = blob_crud.release_blobs(session=session, blob_ids=[blob_id])
+        orphans += blob_crud.read_unreferenced_keys(session=session, keys=keys)
+        session.execute(usage_statement(owner_id, -1, -size))
         session.commit()
 
-        redis.delete_file_from_cache(file_id)
+        redis.delete_file_from_cache(file_id, owner_id)
+        redis.increment_usage_in_cache(owner_id, -1, -size)
+        redis.enqueue_storage_deletes(storage_engine().name, orphans)
 
         return Message(message="File deleted successfully")
 
+    def delete_files(
+        self, *, session: Session, file_ids: List[int]
+    ) -> Message:
+        """
+        Delete many database files in one transaction.
+        """
+        files = session.execute(
+            select(File.id, File.owner_id, File.size, File.blob_id, File.access_key)
+            .where(File.id.in_(file_ids)).with_for_update()
+        ).all()
+
+        usage: dict[int, list[int]] = {}
+        for _, owner_id, size, _, _ in files:
+            owner_usage = usage.setdefault(owner_id, [0, 0])
+            owner_usage[0] -= 1
+            owner_usage[1] -= size or 0
+
+        session.execute(delete(File).where(File.id.in_(file_ids)))
+        orphans = blob_crud.release_blobs(session=session, blob_ids=[file.blob_id for file in files])
+        orphans += blob_crud.read_unreferenced_keys(session=session, keys=blobless_keys(files))
+        for owner_id, (file_count, storage_used) in usage.items():
+            session.execute(usage_statement(owner_id, file_count, storage_used))
+        session.commit()
+
+        redis.delete_files_from_cache([file.id for file in files], [file.owner_id for file in files])
+        for owner_id, (file_count, storage_used) in usage.items():
+            redis.increment_usage_in_cache(owner_id, file_count, storage_used)
+        redis.enqueue_storage_deletes(storage_engine().name, orphans)
+
+        return Message(message="Files deleted successfully")
+
     def generate_unique_name(
         self, *, session: Session, name: str, owner_id: int
     ) -> str:
-        base, extension = name.rsplit('.', 1)
+        """
+        Return name if the owner has no file called name, otherwise name with
+        a suffix one past the largest existing base_N suffix.
+        """
+        statement, base, extension = unique_name_statement(name, owner_id)
+        taken, max_suffix = session.execute(statement).one()
 
-        existing_names = session.scalars(
-            select(File.name).filter(File.name.like(f"{base}%")).where(File.owner_id == owner_id)
-        ).all()
+        if not taken:
+            return name
+
+        return f"{base}_{(max_suffix or 0) + 1}{extension}"
+
+    def generate_unique_names(
+        self, *, session: Session, names: List[str], owner_id: int
+    ) -> List[str]:
+        """
+        generate_unique_name for many names, with one query per
+        UNIQUE_NAMES_CHUNK distinct names.
+        """
+        distinct = list(dict.fromkeys(names))
+        existing = {}
+
+        for start in range(0, len(distinct), UNIQUE_NAMES_CHUNK):
+            chunk = distinct[start:start + UNIQUE_NAMES_CHUNK]
+            statement, parts = unique_names_statement(chunk, owner_id)
+
+            for taken, max_suffix, i in session.execute(statement):
+                existing[chunk[i]] = (taken, max_suffix, *parts[i])
+
+        return resolve_unique_names(names, existing)
+
+class AsyncCRUDFiles():
+    """
+    CRUDFiles for AsyncSession and the async redis instance.
+    """
+    async def create_file(
+        self, *, session: AsyncSession, file_in: FileCreate, owner_id: int, digest: str | None = None
+    ) -> File:
+        storage_used = await session.scalar(lock_owner_statement(owner_id))
+        if exceeds_quota(storage_used, file_in.size or 0):
+            raise StorageQuotaExceeded()
+
+        name = await self.generate_unique_name(session=session, name=file_in.name, owner_id=owner_id)
+
+        blob_id, access_key = None, file_in.access_key
+        if digest:
+            blob = await async_blob_crud.acquire_blob(
+                session=session, digest=digest, access_key=file_in.access_key, size=file_in.size or 0
+            )
+            blob_id, access_key = blob.id, blob.access_key
+
+        new_file = File(
+            name=name,
+            access_key=access_key,
+            size=file_in.size,
+            owner_id=owner_id,
+            blob_id=blob_id,
+            created_at=func.now(),
+            updated_at=func.now(),
+        )
+
+        session.add(new_file)
+        await session.execute(usage_statement(owner_id, 1, file_in.size or 0))
+        await session.commit()
+        await session.refresh(new_file)
+
+        await async_redis.write_file_to_cache(new_file.id, new_file.owner_id, jsonable_encoder(new_file))
+        await async_redis.increment_usage_in_cache(owner_id, 1, file_in.size or 0)
+
+        return new_file
+
+    async def create_files(
+        self, *, session: AsyncSession, files_in: List[FileCreate], owner_id: int
+    ) -> List[File]:
+        size = sum(file_in.size or 0 for file_in in files_in)
+
+        storage_used = await session.scalar(lock_owner_statement(owner_id))
+        if exceeds_quota(storage_used, size):
+            raise StorageQuotaExceeded()
+
+        names = await self.generate_unique_names(
+            session=session, names=[file_in.name for file_in in files_in], owner_id=owner_id
+        )
+
+        files = (await session.scalars(
+            insert(File).values(created_at=func.now(), updated_at=func.now()).returning(File),
+            [
+                {"name": name, "access_key": file_in.access_key, "size": file_in.size, "owner_id": owner_id}
+                for name, file_in in zip(names, files_in)
+            ],
+        )).all()
+
+        await session.execute(usage_statement(owner_id, len(files), size))
+
+        file_objs = sorted((jsonable_encoder(file) for file in files), key=lambda file: file["id"])
+        await session.commit()
+
+        await async_redis.write_files_to_cache([(file["id"], owner_id, file) for file in file_objs])
+        await async_redis.increment_usage_in_cache(owner_id, len(file_objs), size)
+
+        return [File(**file) for file in file_objs]
+
+    async def read_file(
+        self, *, session: AsyncSession, id: int, model: Type[T] | None = None
+    ) -> Any:
+        file_obj = await async_redis.read_file_by_id_from_cache(id, model)
+        if file_obj is TOMBSTONE:
+            return None
+        if file_obj:
+            return file_obj if model else File(**file_obj)
+
+        async with async_redis.single_flight(f"file:{id}") as leader:
+            if not leader:
+                file_obj = await async_redis.read_file_by_id_from_cache(id, model)
+                if file_obj is TOMBSTONE:
+                    return None
+                if file_obj:
+                    return file_obj if model else File(**file_obj)
+
+            file = await session.get(File, id)
+
+            if file:
+                await async_redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+            else:
+                await async_redis.write_tombstone_to_cache(f"file:{id}")
+
+        return to_pydantic(file, model) if file and model else file
+
+    async def read_files(
+        self, *, session: AsyncSession, ids: List[int], model: Type[T] | None = None
+    ) -> List[Any]:
+        ids = list(dict.fromkeys(ids))
+        files = {
+            file.id if model else file["id"]: file if model else File(**file)
+            for file in await async_redis.read_files_by_ids_from_cache(ids, model)
+        }
+
+        missing = [id for id in ids if id not in files]
+        if missing:
+            loaded = (await session.scalars(select(File).where(File.id.in_(missing)))).all()
+            await async_redis.write_files_to_cache(
+                [(file.id, file.owner_id, jsonable_encoder(file)) for file in loaded]
+            )
+
+            for file in loaded:
+                files[file.id] = to_pydantic(file, model) if model else file
+
+        return [files[id] for id in ids if id in files]
+
+    async def read_file_by_name(
+        self, *, session: AsyncSession, name: str, owner_id: int
+    ) -> File | None:
+        return (await session.scalars(
+            select(File).filter_by(name=name, owner_id=owner_id)
+        )).first()
+
+    async def read_owned_keys(
+        self, *, session: AsyncSession, keys: List[str], owner_id: int
+    ) -> set[str]:
+        return set((await session.scalars(
+            select(File.access_key).where(File.owner_id == owner_id, File.access_key.in_(keys))
+        )).all())
+
+    async def read_file_count_by_owner_id(
+        self, *, session: AsyncSession, user_id: int
+    ) -> int:
+        return (await self.read_usage_by_owner_id(session=session, user_id=user_id)).file_count
+
+    async def read_usage_by_owner_id(
+        self, *, session: AsyncSession, user_id: int
+    ) -> StorageUsage:
+        usage, version = await async_redis.read_usage_from_cache(user_id)
+        if usage:
+            return StorageUsage(**usage, storage_quota=settings.USER_STORAGE_QUOTA)
+
+        row = (await session.execute(
+            select(User.file_count, User.storage_used).where(User.id == user_id)
+        )).first()
+        file_count, storage_used = (row[0] or 0, row[1] or 0) if row else (0, 0)
+
+        await async_redis.write_usage_to_cache(user_id, file_count, storage_used, version)
+
+        return StorageUsage(
+            file_count=file_count,
+            storage_used=storage_used,
+            storage_quota=settings.USER_STORAGE_QUOTA,
+        )
+
+    async def read_all_files_by_owner_id(
+        self,
+        *,
+        session: AsyncSession,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 25,
+        after_id: int | None = None,
+        model: Type[T] | None = None,
+    ) -> List[Any]:
+        file_count = await self.read_file_count_by_owner_id(session=session, user_id=user_id)
+        cached_file_count = await async_redis.read_file_count_by_owner_id_from_cache(user_id)
+
+        if file_count == cached_file_count:
+            file_objs = await async_redis.read_files_by_owner_id_from_cache(
+                user_id, skip=skip, limit=limit, after_id=after_id, model=model
+            )
+            if file_objs:
+                return file_objs if model else [File(**file) for file in file_objs]
+
+        files = (await session.scalars(
+            owner_files_statement(user_id, skip, limit, after_id)
+        )).all()
+
+        await async_redis.write_files_to_cache(
+            [(file.id, file.owner_id, jsonable_encoder(file)) for file in files]
+        )
+
+        if model:
+            return [to_pydantic(file, model) for file in files]
+
+        return files # type: ignore
 
-        if name not in existing_names:
+    async def update_file(
+        self, *, session: AsyncSession, file_id: int, file_in: FileUpdate
+    ) -> File:
+        file = await session.get(File, file_id, with_for_update=True)
+        size = file.size or 0 # type: ignore
+
+        obj_data = jsonable_encoder(file)
+        update_data = file_in.model_dump(exclude_unset=True)
+
+        if update_data.get("size", size) > size:
+            storage_used = await session.scalar(lock_owner_statement(file.owner_id)) # type: ignore
+            if exceeds_quota(storage_used, update_data["size"] - size):
+                raise StorageQuotaExceeded()
+
+        for field in obj_data:
+            if field in update_data:
+                setattr(file, field, update_data[field])
+
+        size_change = (file.size or 0) - size # type: ignore
+
+        session.add(file)
+        if size_change:
+            await session.execute(usage_statement(file.owner_id, 0, size_change)) # type: ignore
+        await session.commit()
+        await session.refresh(file)
+
+        await async_redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file)) # type: ignore
+        if size_change:
+            await async_redis.increment_usage_in_cache(file.owner_id, 0, size_change) # type: ignore
+
+        return file # type: ignore
+
+    async def delete_file(
+        self, *, session: AsyncSession, file_id: int
+    ) -> Message:
+        file = await session.get(File, file_id, with_for_update=True)
+        owner_id, size, blob_id = file.owner_id, file.size or 0, file.blob_id # type: ignore
+        keys = blobless_keys([file]) # type: ignore
+
+        await session.delete(file)
+        await session.flush()
+        orphans = await async_blob_crud.release_blobs(session=session, blob_ids=[blob_id])
+        orphans += await async_blob_crud.read_unreferenced_keys(session=session, keys=keys)
+        await session.execute(usage_statement(owner_id, -1, -size))
+        await session.commit()
+
+        await async_redis.delete_file_from_cache(file_id, owner_id)
+        await async_redis.increment_usage_in_cache(owner_id, -1, -size)
+        await async_redis.enqueue_storage_deletes(storage_engine().name, orphans)
+
+        return Message(message="File deleted successfully")
+
+    async def delete_files(
+        self, *, session: AsyncSession, file_ids: List[int]
+    ) -> Message:
+        files = (await session.execute(
+            select(File.id, File.owner_id, File.size, File.blob_id, File.access_key)
+            .where(File.id.in_(file_ids)).with_for_update()
+        )).all()
+
+        usage: dict[int, list[int]] = {}
+        for _, owner_id, size, _, _ in files:
+            owner_usage = usage.setdefault(owner_id, [0, 0])
+            owner_usage[0] -= 1
+            owner_usage[1] -= size or 0
+
+        await session.execute(delete(File).where(File.id.in_(file_ids)))
+        orphans = await async_blob_crud.release_blobs(
+            session=session, blob_ids=[file.blob_id for file in files]
+        )
+        orphans += await async_blob_crud.read_unreferenced_keys(session=session, keys=blobless_keys(files))
+        for owner_id, (file_count, storage_used) in usage.items():
+            await session.execute(usage_statement(owner_id, file_count, storage_used))
+        await session.commit()
+
+        await async_redis.delete_files_from_cache([file.id for file in files], [file.owner_id for file in files])
+        for owner_id, (file_count, storage_used) in usage.items():
+            await async_redis.increment_usage_in_cache(owner_id, file_count, storage_used)
+        await async_redis.enqueue_storage_deletes(storage_engine().name, orphans)
+
+        return Message(message="Files deleted successfully")
+
+    async def generate_unique_name(
+        self, *, session: AsyncSession, name: str, owner_id: int
+    ) -> str:
+        statement, base, extension = unique_name_statement(name, owner_id)
+        taken, max_suffix = (await session.execute(statement)).one()
+
+        if not taken:
             return name
 
-        i = 1
-        while True:
-            new_name = f"{base}_{i}.{extension}"
-            if new_name not in existing_names:
-                return new_name
-            i += 1
+        return f"{base}_{(max_suffix or 0) + 1}{extension}"
+
+    async def generate_unique_names(
+        self, *, session: AsyncSession, names: List[str], owner_id: int
+    ) -> List[str]:
+        distinct = list(dict.fromkeys(names))
+        existing = {}
+
+        for start in range(0, len(distinct), UNIQUE_NAMES_CHUNK):
+            chunk = distinct[start:start + UNIQUE_NAMES_CHUNK]
+            statement, parts = unique_names_statement(chunk, owner_id)
+
+            for taken, max_suffix, i in await session.execute(statement):
+                existing[chunk[i]] = (taken, max_suffix, *parts[i])
+
+        return resolve_unique_names(names, existing)
 
 file_crud = CRUDFiles()
+async_file_crud = AsyncCRUDFiles()
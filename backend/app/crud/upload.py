@@ -0,0 +1,139 @@
+import hashlib
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.cache.core import redis_db as redis
+from app.core.config import settings
+from app.crud.blob import blob_crud
+from app.crud.file import StorageQuotaExceeded, file_crud
+from app.models.file import File
+from app.schemas.file import FileCreate
+from app.schemas.security import Message
+from app.schemas.upload import DigestUploadCreate, ResumableUploadCreate, UploadSession
+from app.storage.core import generate_key
+from app.storage.engine import storage_engine
+
+class CRUDUploads():
+    """
+    Resumable uploads. Each session is backed by a multipart upload in the
+    storage engine, with one part per chunk, and tracked in redis until it is
+    completed.
+    """
+    def create_upload(
+        self, *, upload_in: ResumableUploadCreate, owner_id: int
+    ) -> UploadSession:
+        """
+        Start a resumable upload of upload_in.size bytes.
+        """
+        access_key = generate_key(owner_id, upload_in.name)
+
+        upload = UploadSession(
+            id=uuid.uuid4().hex,
+            owner_id=owner_id,
+            name=upload_in.name,
+            size=upload_in.size,
+            content_type=upload_in.content_type,
+            access_key=access_key,
+            storage_upload_id=storage_engine().create_multipart_upload(access_key, upload_in.content_type),
+            chunk_size=settings.RESUMABLE_UPLOAD_CHUNK_SIZE,
+        )
+
+        redis.write_upload_to_cache(
+            upload.id,
+            upload.model_dump(
+                exclude={"etags", "digests", *UploadSession.model_computed_fields},
+                exclude_none=True,
+            ),
+        )
+
+        return upload
+
+    def read_upload(self, *, upload_id: str) -> UploadSession | None:
+        """
+        Read the upload session and the chunks received so far.
+        """
+        upload, etags, digests = redis.read_upload_from_cache(upload_id)
+        if not upload:
+            return None
+
+        return UploadSession(**upload, etags=etags, digests=digests)
+
+    def write_chunk(
+        self, *, upload: UploadSession, index: int, body: bytes
+    ) -> UploadSession:
+        """
+        Store the chunk at index as the next part of the multipart upload.
+        Chunks may arrive in any order and in parallel. Sending a chunk again
+        with the same content is a no-op, so retries are safe.
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        if upload.digests.get(index) == digest:
+            return upload
+
+        etag = storage_engine().upload_part(upload.access_key, upload.storage_upload_id, index + 1, body)
+        redis.write_upload_chunk_to_cache(upload.id, index, etag, digest)
+
+        upload.etags[index] = etag
+        upload.digests[index] = digest
+
+        return upload
+
+    def complete_upload(
+        self, *, session: Session, upload: UploadSession
+    ) -> File:
+        """
+        Assemble the chunks in storage and create the database file. When the
+        same content is already stored the file shares that blob instead, and
+        the object just assembled is queued for deletion, as it is when the
+        file does not fit in the owner's quota.
+        """
+        storage_engine().complete_multipart_upload(
+            upload.access_key,
+            upload.storage_upload_id,
+            [(index + 1, etag) for index, etag in upload.etags.items()],
+        )
+        redis.delete_upload_from_cache(upload.id)
+
+        file_in = FileCreate(name=upload.name, access_key=upload.access_key, size=upload.size)
+        try:
+            file = file_crud.create_file(
+                session=session, file_in=file_in, owner_id=upload.owner_id, digest=upload.content_digest()
+            )
+        except StorageQuotaExceeded:
+            redis.enqueue_storage_deletes(storage_engine().name, [upload.access_key])
+            raise
+
+        if file.access_key != upload.access_key:
+            redis.enqueue_storage_deletes(storage_engine().name, [upload.access_key])
+
+        return file
+
+    def create_file_by_digest(
+        self, *, session: Session, upload_in: DigestUploadCreate, owner_id: int
+    ) -> File | None:
+        """
+        Create a file with content the owner already stores, found by it's
+        content digest, without uploading it again. Returns None when the
+        owner has no such content.
+        """
+        blob = blob_crud.read_blob_by_digest(session=session, digest=upload_in.digest, owner_id=owner_id)
+        if not blob:
+            return None
+
+        file_in = FileCreate(name=upload_in.name, access_key=blob.access_key, size=blob.size)
+
+        return file_crud.create_file(
+            session=session, file_in=file_in, owner_id=owner_id, digest=upload_in.digest
+        )
+
+    def abort_upload(self, *, upload: UploadSession) -> Message:
+        """
+        Discard the upload and the chunks received so far.
+        """
+        redis.delete_upload_from_cache(upload.id)
+        storage_engine().abort_multipart_upload(upload.access_key, upload.storage_upload_id)
+
+        return Message(message="Upload aborted successfully")
+
+upload_crud = CRUDUploads()
@@ -1,14 +1,22 @@
+from typing import Any, Type, TypeVar
+
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, func
+from pydantic import BaseModel
+from sqlalchemy import delete, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.cache.core import redis_db as redis
-from app.core.security import get_password_hash, verify_password
-from app.crud.file import file_crud
+from app.cache.core import TOMBSTONE, async_redis_db as async_redis, redis_db as redis
+from app.core.security import password_hasher
+from app.crud.blob import async_blob_crud, blob_crud, blobless_keys
 from app.models.file import File
 from app.models.user import User
 from app.schemas.security import Message
 from app.schemas.user import UserCreate, UserUpdate
+from app.schemas.utils import to_pydantic
+from app.storage.engine import storage_engine
+
+T = TypeVar("T", bound=BaseModel)
 
 class CRUDUsers():
     def create_user(
@@ -17,7 +25,7 @@ class CRUDUsers():
         """
         Create a new database user.
         """
-        hashed_password = get_password_hash(user_create.password)
+        hashed_password = password_hasher.hash(user_create.password)
 
         new_user = User(
             email=user_create.email,
@@ -35,31 +43,49 @@ class CRUDUsers():
         return new_user
 
     def read_user(
-        self, *, session: Session, id: int
-    ) -> User | None:
+        self, *, session: Session, id: int, model: Type[T] | None = None
+    ) -> Any:
         """
-        Read the database user by their id.
+        Read the database user by their id. Passing a pydantic model returns
+        the user as that model, decoded straight from the cache on a hit. On a
+        miss only one caller per id reloads the user, the others wait for it.
+        Ids that do not exist are remembered for a short while.
         """
-        user_obj = redis.read_user_by_id_from_cache(id)
+        user_obj = redis.read_user_by_id_from_cache(id, model)
+        if user_obj is TOMBSTONE:
+            return None
         if user_obj:
-            return User(**user_obj)
+            return user_obj if model else User(**user_obj)
 
-        user = session.scalars(
-            select(User).filter_by(id=id)
-        ).first()
+        with redis.single_flight(f"user:{id}") as leader:
+            if not leader:
+                user_obj = redis.read_user_by_id_from_cache(id, model)
+                if user_obj is TOMBSTONE:
+                    return None
+                if user_obj:
+                    return user_obj if model else User(**user_obj)
 
-        if user:
-            redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user))
+            user = session.scalars(
+                select(User).filter_by(id=id)
+            ).first()
 
-        return user
+            if user:
+                redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user))
+            else:
+                redis.write_tombstone_to_cache(f"user:{id}")
+
+        return to_pydantic(user, model) if user and model else user
 
     def read_user_by_email(
         self, *, session: Session, email: str
     ) -> User | None:
         """
-        Read the database user with the email that matches email.
+        Read the database user with the email that matches email. Emails that
+        are not registered are remembered for a short while.
         """
         user_obj = redis.read_user_by_email_from_cache(email)
+        if user_obj is TOMBSTONE:
+            return None
         if user_obj:
             return User(**user_obj)
 
@@ -69,6 +95,8 @@ class CRUDUsers():
 
         if user:
             redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user))
+        else:
+            redis.write_tombstone_to_cache(f"email:{email}")
 
         return user
 
@@ -106,7 +134,7 @@ class CRUDUsers():
         """
         user = session.get(User, user_id)
 
-        hashed_password = get_password_hash(password)
+        hashed_password = password_hasher.hash(password)
     
         setattr(user, "hashed_password", hashed_password)
     
@@ -118,25 +146,46 @@ class CRUDUsers():
     
         return Message(message="Password updated successfully")
 
-    def delete_user(
+    def revoke_tokens(
         self, *, session: Session, user_id: int
     ) -> Message:
         """
-        Delete the database user and all files with their id.
+        Invalidate every access token issued to the user so far.
         """
         user = session.get(User, user_id)
 
-        file_ids = session.scalars(
-            select(File.id).filter_by(owner_id=user.id) # type: ignore
-        ).all()
+        setattr(user, "token_version", (user.token_version or 0) + 1) # type: ignore
 
-        for id in file_ids:
-            file_crud.delete_file(session=session, file_id=id)
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+        redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user)) # type: ignore
+        redis.revoke_principals(user_id)
+
+        return Message(message="Tokens revoked successfully")
+
+    def delete_user(
+        self, *, session: Session, user_id: int
+    ) -> Message:
+        """
+        Delete the database user and all files with their id. The files go in
+        one bulk delete, in the same transaction as the user, and their cache
+        entries in one sweep once it commits. Objects no remaining file or
+        blob refers to are queued for deletion.
+        """
+        files = session.execute(
+            delete(File).where(File.owner_id == user_id).returning(File.id, File.blob_id, File.access_key)
+        ).all()
 
-        session.delete(user)
+        orphans = blob_crud.release_blobs(session=session, blob_ids=[file.blob_id for file in files])
+        orphans += blob_crud.read_unreferenced_keys(session=session, keys=blobless_keys(files))
+        session.execute(delete(User).where(User.id == user_id))
         session.commit()
 
-        redis.delete_user_from_cache(user.id) # type: ignore
+        redis.delete_owner_from_cache(user_id, [file.id for file in files])
+        redis.enqueue_storage_deletes(storage_engine().name, orphans)
+        redis.revoke_principals(user_id)
 
         return Message(message="User deleted successfully")
 
@@ -150,10 +199,168 @@ class CRUDUsers():
         if not user:
             return None
 
-        is_authenticated = verify_password(password, user.hashed_password)
+        is_authenticated = password_hasher.verify(password, user.hashed_password)
+        if not is_authenticated:
+            return None
+
+        return user
+
+class AsyncCRUDUsers():
+    """
+    CRUDUsers for AsyncSession and the async redis instance.
+    """
+    async def create_user(
+        self, *, session: AsyncSession, user_create: UserCreate
+    ) -> User:
+        hashed_password = await password_hasher.hash_async(user_create.password)
+
+        new_user = User(
+            email=user_create.email,
+            hashed_password=hashed_password,
+            created_at=func.now(),
+            updated_at=func.now(),
+        )
+
+        session.add(new_user)
+        await session.commit()
+        await session.refresh(new_user)
+
+        await async_redis.write_user_to_cache(new_user.id, new_user.email, jsonable_encoder(new_user))
+
+        return new_user
+
+    async def read_user(
+        self, *, session: AsyncSession, id: int, model: Type[T] | None = None
+    ) -> Any:
+        user_obj = await async_redis.read_user_by_id_from_cache(id, model)
+        if user_obj is TOMBSTONE:
+            return None
+        if user_obj:
+            return user_obj if model else User(**user_obj)
+
+        async with async_redis.single_flight(f"user:{id}") as leader:
+            if not leader:
+                user_obj = await async_redis.read_user_by_id_from_cache(id, model)
+                if user_obj is TOMBSTONE:
+                    return None
+                if user_obj:
+                    return user_obj if model else User(**user_obj)
+
+            user = await session.get(User, id)
+
+            if user:
+                await async_redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user))
+            else:
+                await async_redis.write_tombstone_to_cache(f"user:{id}")
+
+        return to_pydantic(user, model) if user and model else user
+
+    async def read_user_by_email(
+        self, *, session: AsyncSession, email: str
+    ) -> User | None:
+        user_obj = await async_redis.read_user_by_email_from_cache(email)
+        if user_obj is TOMBSTONE:
+            return None
+        if user_obj:
+            return User(**user_obj)
+
+        user = (await session.scalars(
+            select(User).filter_by(email=email)
+        )).first()
+
+        if user:
+            await async_redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user))
+        else:
+            await async_redis.write_tombstone_to_cache(f"email:{email}")
+
+        return user
+
+    async def update_user(
+        self, *, session: AsyncSession, user_id: int, user_in: UserUpdate
+    ) -> User:
+        user = await session.get(User, user_id)
+
+        obj_data = jsonable_encoder(user)
+        update_data = user_in.model_dump(exclude_unset=True)
+
+        for field in obj_data:
+            if field in update_data:
+                setattr(user, field, update_data[field])
+
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+
+        await async_redis.delete_user_from_cache(user_id)
+        await async_redis.write_user_to_cache(user_id, user.email, jsonable_encoder(user)) # type: ignore
+
+        return user # type: ignore
+
+    async def update_user_password(
+        self, *, session: AsyncSession, user_id: int, password: str
+    ) -> Message:
+        user = await session.get(User, user_id)
+
+        hashed_password = await password_hasher.hash_async(password)
+
+        setattr(user, "hashed_password", hashed_password)
+
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+
+        await async_redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user)) # type: ignore
+
+        return Message(message="Password updated successfully")
+
+    async def revoke_tokens(
+        self, *, session: AsyncSession, user_id: int
+    ) -> Message:
+        user = await session.get(User, user_id)
+
+        setattr(user, "token_version", (user.token_version or 0) + 1) # type: ignore
+
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+
+        await async_redis.write_user_to_cache(user.id, user.email, jsonable_encoder(user)) # type: ignore
+        await async_redis.revoke_principals(user_id)
+
+        return Message(message="Tokens revoked successfully")
+
+    async def delete_user(
+        self, *, session: AsyncSession, user_id: int
+    ) -> Message:
+        files = (await session.execute(
+            delete(File).where(File.owner_id == user_id).returning(File.id, File.blob_id, File.access_key)
+        )).all()
+
+        orphans = await async_blob_crud.release_blobs(
+            session=session, blob_ids=[file.blob_id for file in files]
+        )
+        orphans += await async_blob_crud.read_unreferenced_keys(session=session, keys=blobless_keys(files))
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+        await async_redis.delete_owner_from_cache(user_id, [file.id for file in files])
+        await async_redis.enqueue_storage_deletes(storage_engine().name, orphans)
+        await async_redis.revoke_principals(user_id)
+
+        return Message(message="User deleted successfully")
+
+    async def authenticate(
+        self, *, session: AsyncSession, email: str, password: str
+    ) -> User | None:
+        user = await self.read_user_by_email(session=session, email=email)
+        if not user:
+            return None
+
+        is_authenticated = await password_hasher.verify_async(password, user.hashed_password)
         if not is_authenticated:
             return None
 
         return user
 
 user_crud = CRUDUsers()
+async_user_crud = AsyncCRUDUsers()
@@ -1,5 +1,6 @@
 from app.database.core import Base
 
 # Import your models here; Alembic uses this module to handle database migrations
+from app.models.blob import Blob
 from app.models.file import File
 from app.models.user import User
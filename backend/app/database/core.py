@@ -1,11 +1,16 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from app.core.config import settings
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
-# TODO: check if this is being used anywhere; if not delete
+# psycopg 3 drives both engines; the same URL selects its async mode here
+async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 Base = declarative_base()
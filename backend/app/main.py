@@ -1,11 +1,25 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.routers import api_router
-from app.cache.core import redis_db as redis
+from app.cache.core import AsyncRedisInstance, RedisInstance, async_redis_db as async_redis, redis_db as redis
 from app.core.config import settings
+from app.core.metrics import (
+    MetricsMiddleware,
+    SnapshotCollector,
+    instrument_engines,
+    instrument_methods,
+    instrument_redis_connections,
+    metrics_endpoint,
+    registry,
+)
+from app.core.security import PasswordHasherBusy, password_hasher
+from app.crud.file import StorageQuotaExceeded
+from app.database.core import async_engine
+from app.storage.core import storage
 
 def custom_generate_unique_id(route: APIRoute):
     return f"{route.tags[0]}-{route.name}"
@@ -13,10 +27,15 @@ def custom_generate_unique_id(route: APIRoute):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     redis.connect()
+    await async_redis.connect()
+    storage.connect()
 
     yield
 
+    await async_redis.disconnect()
+    await async_engine.dispose()
     redis.disconnect()
+    storage.disconnect()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -36,4 +55,29 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+if settings.METRICS_ENABLED:
+    instrument_engines()
+    instrument_redis_connections()
+    for cls, instance in ((RedisInstance, "sync"), (AsyncRedisInstance, "async")):
+        instrument_methods(cls, instance, exclude={"connect", "disconnect", "handle_invalidation_error", "listen_for_invalidations"})
+    registry.register(SnapshotCollector({"sync": redis, "async": async_redis}, password_hasher))
+
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password requests, try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(StorageQuotaExceeded)
+async def storage_quota_exceeded_handler(request: Request, exc: StorageQuotaExceeded):
+    return JSONResponse(
+        status_code=403,
+        content={"detail": "Storage quota exceeded"},
+    )
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Integer, String, DateTime, func
+from sqlalchemy.orm import mapped_column
+
+from app.database.core import Base
+
+class Blob(Base):
+    """
+    A stored object shared by every file with the same content. ref_count is
+    the number of files pointing at it; the object is deleted with the last.
+    """
+    __tablename__ = "blob"
+
+    id = mapped_column(Integer, primary_key=True)
+    digest = mapped_column(String, unique=True)
+    access_key = mapped_column(String)
+    size = mapped_column(BigInteger, default=0)
+    ref_count = mapped_column(Integer, default=0)
+    created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,18 +1,31 @@
-from sqlalchemy import ForeignKey, Integer, String, DateTime, func
+from sqlalchemy import ForeignKey, Index, Integer, String, DateTime, func
 from sqlalchemy.orm import relationship, mapped_column
 
 from app.database.base import Base
 
 class File(Base):
     __tablename__ = "file"
+    __table_args__ = (
+        Index("ix_file_owner_id_id", "owner_id", "id"),
+        # Pattern ops let Postgres serve both name equality and "base%" prefix
+        # LIKE lookups from the same index regardless of the database collation.
+        Index(
+            "ix_file_owner_id_name",
+            "owner_id",
+            "name",
+            postgresql_ops={"name": "varchar_pattern_ops"},
+        ),
+    )
 
     id = mapped_column(Integer, primary_key=True)
     name = mapped_column(String)
-    access_key = mapped_column(String, unique=True)
+    # Files with the same content share their blob's access key
+    access_key = mapped_column(String, index=True)
     size = mapped_column(Integer, default=0)
     created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at = mapped_column(DateTime(timezone=True), onupdate=func.now())
     owner_id = mapped_column(Integer, ForeignKey("user.id"))
+    blob_id = mapped_column(Integer, ForeignKey("blob.id"), index=True)
     owner = relationship(
         "User",
         back_populates="files",
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, DateTime, func
+from sqlalchemy import BigInteger, Integer, String, DateTime, func
 from sqlalchemy.orm import relationship, mapped_column
 
 
@@ -10,6 +10,10 @@ class User(Base):
     id = mapped_column(Integer, primary_key=True)
     email = mapped_column(String, unique=True, index=True)
     hashed_password = mapped_column(String)
+    token_version = mapped_column(Integer, default=0)
+    # Denormalized totals of the user's files, kept in step by the file CRUD
+    file_count = mapped_column(Integer, default=0)
+    storage_used = mapped_column(BigInteger, default=0)
     created_at = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at = mapped_column(DateTime(timezone=True), onupdate=func.now())
     files = relationship(
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class FileBase(BaseModel):
     name: str
@@ -13,12 +13,15 @@ class FileBase(BaseModel):
 class FileCreate(BaseModel):
     name: str
     access_key: str
-    size: Optional[int] = 0
+    size: int = Field(default=0, ge=0)
+
+class FilesCreate(BaseModel):
+    data: list[FileCreate] = Field(min_length=1)
 
 class FileUpdate(BaseModel):
     name: Optional[str] = None
     access_key: Optional[str] = None
-    size: Optional[int] = 0
+    size: int = Field(default=0, ge=0)
 
 class File(FileBase):
     id: int
@@ -34,3 +37,9 @@ class FilePublic(FileBase):
 class FilesPublic(BaseModel):
     data: list[FilePublic]
     count: int
+    next_cursor: str | None = None
+
+class StorageUsage(BaseModel):
+    file_count: int
+    storage_used: int
+    storage_quota: int | None = None
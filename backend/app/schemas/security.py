@@ -11,6 +11,8 @@ class Token(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: Optional[int]
+    exp: Optional[int] = None
+    ver: int = 0
 
 class NewPassword(BaseModel):
     token: str
@@ -0,0 +1,45 @@
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+
+PartNumber = Annotated[int, Field(ge=1, le=settings.S3_MULTIPART_MAX_PARTS)]
+
+class UploadCreate(BaseModel):
+    name: str
+    content_type: Optional[str] = None
+
+class PresignedUpload(BaseModel):
+    access_key: str
+    url: str
+    expires_in: int
+
+class PresignedDownload(BaseModel):
+    url: str
+    expires_in: int
+
+class MultipartUploadCreate(UploadCreate):
+    part_count: int = Field(ge=1, le=settings.S3_MULTIPART_MAX_PARTS)
+
+class PresignedPart(BaseModel):
+    part_number: int
+    url: str
+
+class MultipartUpload(BaseModel):
+    access_key: str
+    upload_id: str
+    parts: list[PresignedPart]
+    expires_in: int
+
+class MultipartPartsCreate(BaseModel):
+    access_key: str
+    part_numbers: list[PartNumber] = Field(min_length=1)
+
+class CompletedPart(BaseModel):
+    part_number: PartNumber
+    etag: str
+
+class MultipartUploadComplete(BaseModel):
+    access_key: str
+    parts: list[CompletedPart] = Field(min_length=1)
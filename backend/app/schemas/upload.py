@@ -0,0 +1,70 @@
+import math
+from typing import Optional
+
+from pydantic import BaseModel, Field, computed_field
+
+from app.storage.core import content_digest
+
+class ResumableUploadCreate(BaseModel):
+    name: str
+    size: int = Field(ge=1)
+    content_type: Optional[str] = None
+
+class DigestUploadCreate(BaseModel):
+    name: str
+    digest: str
+
+class ResumableUpload(BaseModel):
+    id: str
+    name: str
+    size: int
+    chunk_size: int
+    chunk_count: int
+    offset: int
+    received: list[int]
+
+class UploadSession(BaseModel):
+    """
+    A resumable upload as kept in redis. etags and the hex sha256 digests of
+    the chunks received so far are keyed by chunk index.
+    """
+    id: str
+    owner_id: int
+    name: str
+    size: int
+    content_type: Optional[str] = None
+    access_key: str
+    storage_upload_id: str
+    chunk_size: int
+    etags: dict[int, str] = {}
+    digests: dict[int, str] = {}
+
+    @computed_field
+    @property
+    def chunk_count(self) -> int:
+        return math.ceil(self.size / self.chunk_size)
+
+    @computed_field
+    @property
+    def received(self) -> list[int]:
+        return sorted(self.etags)
+
+    @computed_field
+    @property
+    def offset(self) -> int:
+        """
+        Bytes received without a gap from the start of the file.
+        """
+        index = 0
+        while index in self.etags:
+            index += 1
+
+        return min(index * self.chunk_size, self.size)
+
+    def content_digest(self) -> str:
+        return content_digest(
+            [self.digests[index] for index in range(self.chunk_count)], self.chunk_size
+        )
+
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
@@ -1,3 +1,5 @@
+import base64
+import binascii
 from typing import Type, TypeVar
 
 from pydantic import BaseModel
@@ -8,3 +10,17 @@ T = TypeVar("T", bound=BaseModel)
 
 def to_pydantic(db_object: Base, pydantic_model: Type[T]) -> T: # type: ignore
     return pydantic_model(**db_object.__dict__)
+
+def encode_cursor(id: int) -> str:
+    return base64.urlsafe_b64encode(str(id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Decode an opaque page cursor, raising ValueError if it was tampered with.
+    """
+    padding = "=" * (-len(cursor) % 4)
+
+    try:
+        return int(base64.urlsafe_b64decode(cursor + padding).decode())
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(cursor) from e
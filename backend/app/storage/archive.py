@@ -0,0 +1,139 @@
+import io
+import queue
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Iterable, Iterator, NamedTuple
+
+from app.core.config import settings
+
+# Marks the end of an object in its prefetch queue
+END = object()
+
+class ArchiveEntry(NamedTuple):
+    name: str
+    key: str
+    modified: datetime | None = None
+
+class ArchiveBuffer(io.RawIOBase):
+    """
+    An unseekable sink for ZipFile that holds what was written until drained,
+    so the archive can be sent as it is built.
+    """
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        self.chunks.append(bytes(b))
+        self.offset += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.offset
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+class Prefetcher():
+    """
+    Read the objects of entries in order, keeping up to ARCHIVE_PREFETCH_FILES
+    of them downloading ahead in worker threads.
+    """
+    def __init__(self, engine: Any, entries: Iterable[ArchiveEntry]) -> None:
+        self.engine = engine
+        self.entries = iter(entries)
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=settings.ARCHIVE_PREFETCH_FILES)
+        self.pending: deque[tuple[ArchiveEntry, queue.Queue]] = deque()
+
+    def put(self, chunks: queue.Queue, item: Any) -> bool:
+        while not self.stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch(self, entry: ArchiveEntry, chunks: queue.Queue) -> None:
+        try:
+            stat = self.engine.stat(entry.key)
+            if stat is None:
+                raise FileNotFoundError(entry.key)
+
+            if stat.size:
+                for chunk in self.engine.iter_range(entry.key, 0, stat.size - 1):
+                    if not self.put(chunks, chunk):
+                        return
+        except Exception as e:
+            self.put(chunks, e)
+            return
+
+        self.put(chunks, END)
+
+    def schedule(self) -> None:
+        while len(self.pending) < settings.ARCHIVE_PREFETCH_FILES:
+            entry = next(self.entries, None)
+            if entry is None:
+                return
+
+            chunks: queue.Queue = queue.Queue(maxsize=settings.ARCHIVE_PREFETCH_CHUNKS)
+            self.executor.submit(self.fetch, entry, chunks)
+            self.pending.append((entry, chunks))
+
+    def __iter__(self) -> Iterator[tuple[ArchiveEntry, Iterator[bytes]]]:
+        try:
+            self.schedule()
+            while self.pending:
+                entry, chunks = self.pending.popleft()
+                yield entry, self.drain(chunks)
+                self.schedule()
+        finally:
+            self.close()
+
+    def drain(self, chunks: queue.Queue) -> Iterator[bytes]:
+        while True:
+            item = chunks.get()
+            if item is END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_zip(engine: Any, entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of the entries' objects as it is written. Entries are
+    stored uncompressed with data descriptors, since their sizes are only
+    known once read, and ZIP64 extensions, so no entry or archive is too big.
+    """
+    buffer = ArchiveBuffer()
+
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for entry, chunks in Prefetcher(engine, entries):
+            info = zipfile.ZipInfo(entry.name, date_time=(entry.modified or datetime.now()).timetuple()[:6])
+
+            with archive.open(info, mode="w", force_zip64=True) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+            data = buffer.drain()
+            if data:
+                yield data
+
+    yield buffer.drain()
@@ -0,0 +1,307 @@
+import hashlib
+import logging
+import os
+import uuid
+from datetime import date, datetime
+from typing import Any, BinaryIO, Iterable, Iterator, NamedTuple
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ObjectStat(NamedTuple):
+    size: int
+    etag: str
+    last_modified: datetime
+
+class MultipartUploadError(Exception):
+    """
+    Raised when the parts of a multipart upload cannot be assembled, such as
+    when one of them is missing, whatever the engine.
+    """
+
+class StorageEngine():
+    """
+    Where file contents are kept. Objects are written and read by key, read
+    back in chunks of STORAGE_STREAM_CHUNK_SIZE, and can be assembled from
+    parts uploaded in any order.
+    """
+    name = ""
+
+    def put(self, key: str, body: bytes | BinaryIO) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Read the whole object, or None when it does not exist.
+        """
+        stat = self.stat(key)
+        if stat is None:
+            return None
+
+        return b"".join(self.iter_range(key, 0, stat.size - 1))
+
+    def stat(self, key: str) -> ObjectStat | None:
+        raise NotImplementedError
+
+    def iter_range(self, key: str, start: int, end: int) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def list_objects(self) -> Iterator[tuple[str, datetime]]:
+        """
+        Yield the key and last modified time of every stored object.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        self.delete_objects([key])
+
+    def delete_objects(self, keys: list[str]) -> list[str]:
+        """
+        Delete the objects, ignoring missing ones, and return the keys that
+        could not be deleted.
+        """
+        raise NotImplementedError
+
+    def create_multipart_upload(self, key: str, content_type: str | None = None) -> str:
+        raise NotImplementedError
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> str:
+        raise NotImplementedError
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: Iterable[tuple[int, str]]
+    ) -> None:
+        """
+        Assemble the uploaded parts, given as (part number, ETag) pairs, or
+        raise MultipartUploadError.
+        """
+        raise NotImplementedError
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        raise NotImplementedError
+
+def generate_key(owner_id: int, name: str) -> str:
+    """
+    Return a new object key for a file called name. Keys are prefixed with the
+    owner's id so presign requests can be checked against the caller.
+    """
+    _, extension = os.path.splitext(name)
+
+    return f"{owner_id}/{date.today().isoformat()}/{uuid.uuid4().hex}{extension}"
+
+def is_owner_key(key: str, owner_id: int) -> bool:
+    return key.startswith(f"{owner_id}/")
+
+def content_digest(chunk_digests: Iterable[str], chunk_size: int) -> str:
+    """
+    Return the digest blobs are addressed by: the sha256 of the chunk size and
+    the hex sha256 digest of each chunk_size chunk of the content, one per
+    line. Unlike a plain sha256 it is built from the chunks as they arrive,
+    in any order, without reading the assembled object back.
+    """
+    return hashlib.sha256("\n".join([str(chunk_size), *chunk_digests]).encode()).hexdigest()
+
+class S3Instance(StorageEngine):
+    """
+    Issues presigned URLs so clients upload and download straight against the
+    bucket, and coordinates multipart uploads whose parts are sent in parallel.
+    """
+    name = "s3"
+    client = None
+    presigner = None
+
+    def __init__(self) -> None:
+        self.bucket = settings.S3_FILE_BUCKET_NAME
+
+    def create_client(self, endpoint_url: str | None) -> Any:
+        return boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def connect(self) -> None:
+        try:
+            self.bucket = settings.S3_FILE_BUCKET_NAME
+            self.client = self.create_client(settings.S3_ENDPOINT_URL)
+            self.presigner = self.create_client(
+                settings.S3_PUBLIC_ENDPOINT_URL or settings.S3_ENDPOINT_URL
+            )
+
+            logger.info("S3 client is ready")
+
+        except Exception as e:
+            logger.error(e)
+            raise e
+
+    def disconnect(self) -> None:
+        if self.client:
+            self.client.close()
+            self.presigner.close() # type: ignore
+            logger.info("S3 client has been closed")
+
+        self.client = None
+        self.presigner = None
+
+    @property
+    def expires_in(self) -> int:
+        return int(settings.S3_PRESIGNED_URL_EXPIRY.total_seconds())
+
+    def presign(self, method: str, params: dict[str, Any]) -> str:
+        return self.presigner.generate_presigned_url( # type: ignore
+            ClientMethod=method,
+            Params={"Bucket": self.bucket, **params},
+            ExpiresIn=self.expires_in,
+        )
+
+    def presign_upload(self, key: str, content_type: str | None = None) -> str:
+        """
+        Return a URL the object can be PUT to directly. When content_type is
+        given the upload must send the same Content-Type header.
+        """
+        params = {"Key": key}
+        if content_type:
+            params["ContentType"] = content_type
+
+        return self.presign("put_object", params)
+
+    def presign_download(self, key: str, filename: str | None = None) -> str:
+        params = {"Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+
+        return self.presign("get_object", params)
+
+    def put(self, key: str, body: bytes | BinaryIO) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body) # type: ignore
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"] # type: ignore
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise e
+
+        with body:
+            return body.read()
+
+    def stat(self, key: str) -> ObjectStat | None:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key) # type: ignore
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise e
+
+        return ObjectStat(head["ContentLength"], head["ETag"], head["LastModified"])
+
+    def iter_range(self, key: str, start: int, end: int) -> Iterator[bytes]:
+        """
+        Yield bytes start to end inclusive of the object, one
+        STORAGE_STREAM_CHUNK_SIZE chunk at a time.
+        """
+        body = self.client.get_object( # type: ignore
+            Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end}"
+        )["Body"]
+
+        try:
+            yield from body.iter_chunks(settings.STORAGE_STREAM_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def create_multipart_upload(self, key: str, content_type: str | None = None) -> str:
+        """
+        Start a multipart upload of key and return it's upload id.
+        """
+        params = {"Bucket": self.bucket, "Key": key}
+        if content_type:
+            params["ContentType"] = content_type
+
+        return self.client.create_multipart_upload(**params)["UploadId"] # type: ignore
+
+    def presign_parts(
+        self, key: str, upload_id: str, part_numbers: Iterable[int]
+    ) -> list[tuple[int, str]]:
+        """
+        Return a URL for each part number that the part can be PUT to. Signing
+        is local, so any number of parts costs no round trips to storage.
+        """
+        return [
+            (part_number, self.presign("upload_part", {
+                "Key": key,
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+            }))
+            for part_number in part_numbers
+        ]
+
+    def upload_part(
+        self, key: str, upload_id: str, part_number: int, body: bytes
+    ) -> str:
+        """
+        Upload one part of a multipart upload through the server and return
+        it's ETag.
+        """
+        return self.client.upload_part( # type: ignore
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )["ETag"]
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: Iterable[tuple[int, str]]
+    ) -> None:
+        try:
+            self.client.complete_multipart_upload( # type: ignore
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [
+                    {"PartNumber": part_number, "ETag": etag}
+                    for part_number, etag in sorted(parts)
+                ]},
+            )
+        except ClientError as e:
+            raise MultipartUploadError(str(e)) from e
+
+    def list_objects(self) -> Iterator[tuple[str, datetime]]:
+        pages = self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket) # type: ignore
+
+        for page in pages:
+            for obj in page.get("Contents", []):
+                yield obj["Key"], obj["LastModified"]
+
+    def delete_objects(self, keys: list[str]) -> list[str]:
+        """
+        Delete the objects, up to 1000 per request as S3 allows. In quiet mode
+        S3 only reports the keys it failed to delete.
+        """
+        failed = []
+
+        if self.client:
+            for i in range(0, len(keys), 1000):
+                response = self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in keys[i:i + 1000]], "Quiet": True},
+                )
+                failed.extend(error["Key"] for error in response.get("Errors", []))
+
+        return failed
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self.client.abort_multipart_upload( # type: ignore
+            Bucket=self.bucket, Key=key, UploadId=upload_id
+        )
+
+storage = S3Instance()
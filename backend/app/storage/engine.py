@@ -0,0 +1,17 @@
+from app.core.config import settings
+from app.storage.core import StorageEngine, storage
+from app.storage.local import local_storage
+
+ENGINES: dict[str, StorageEngine] = {
+    engine.name: engine for engine in (storage, local_storage)
+}
+
+def storage_engine(name: str | None = None) -> StorageEngine:
+    """
+    Return the storage engine file contents are kept in, STORAGE_BACKEND
+    unless name is given.
+    """
+    name = name or settings.STORAGE_BACKEND
+    if name not in ENGINES:
+        raise ValueError(f"Unknown storage backend {name}")
+    return ENGINES[name]
@@ -0,0 +1,159 @@
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Iterator
+from urllib.parse import quote, unquote
+
+from app.core.config import settings
+from app.storage.core import MultipartUploadError, ObjectStat, StorageEngine
+
+class LocalStorage(StorageEngine):
+    """
+    Objects kept as files under STORAGE_LOCAL_PATH, for single node
+    deployments without an object store. Files are named by their quoted key
+    and sharded two directory levels deep by the key's sha256, so no
+    directory grows past a few thousand entries. Every write goes to a
+    temporary file that is renamed into place, so readers never see a
+    partial object.
+    """
+    name = "local"
+
+    @property
+    def root(self) -> str:
+        return os.path.realpath(settings.STORAGE_LOCAL_PATH)
+
+    def path(self, key: str) -> str:
+        """
+        Return the file holding key, e.g. root/3f/a0/7%2F2024-06-01%2F0a1b.txt
+        for 7/2024-06-01/0a1b.txt. A leading dot is quoted too, so no object
+        is named like a temporary file, or "." or "..".
+        """
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        name = quote(key, safe="")
+        if name.startswith("."):
+            name = "%2E" + name[1:]
+
+        return os.path.join(self.root, digest[:2], digest[2:4], name)
+
+    def upload_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, "uploads", uuid.UUID(upload_id).hex)
+
+    def write(self, path: str, chunks: Iterable[bytes]) -> None:
+        """
+        Write chunks to a temporary file next to path, then rename it over
+        path once it is on disk.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def read_chunks(self, f: BinaryIO) -> Iterator[bytes]:
+        return iter(lambda: f.read(settings.STORAGE_STREAM_CHUNK_SIZE), b"")
+
+    def put(self, key: str, body: bytes | BinaryIO) -> None:
+        self.write(self.path(key), [body] if isinstance(body, bytes) else self.read_chunks(body))
+
+    def stat(self, key: str) -> ObjectStat | None:
+        try:
+            result = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+
+        return ObjectStat(
+            result.st_size,
+            f'"{result.st_mtime_ns:x}-{result.st_size:x}"',
+            datetime.fromtimestamp(result.st_mtime, tz=timezone.utc),
+        )
+
+    def iter_range(self, key: str, start: int, end: int) -> Iterator[bytes]:
+        """
+        Yield bytes start to end inclusive of the object from a read only
+        memory map, leaving read ahead and caching to the page cache.
+        """
+        with open(self.path(key), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                if hasattr(view, "madvise"):
+                    view.madvise(mmap.MADV_SEQUENTIAL)
+
+                end = min(end, len(view) - 1)
+                for offset in range(start, end + 1, settings.STORAGE_STREAM_CHUNK_SIZE):
+                    yield view[offset:min(offset + settings.STORAGE_STREAM_CHUNK_SIZE, end + 1)]
+
+    def list_objects(self) -> Iterator[tuple[str, datetime]]:
+        for directory, subdirectories, names in os.walk(self.root):
+            if directory == self.root:
+                subdirectories[:] = [name for name in subdirectories if name != "uploads"]
+
+            for name in names:
+                if name.startswith("."):
+                    continue
+
+                modified = os.stat(os.path.join(directory, name)).st_mtime
+                yield unquote(name), datetime.fromtimestamp(modified, tz=timezone.utc)
+
+    def delete_objects(self, keys: list[str]) -> list[str]:
+        for key in keys:
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+
+        return []
+
+    def create_multipart_upload(self, key: str, content_type: str | None = None) -> str:
+        """
+        Start a multipart upload of key, kept in a directory of it's own until
+        the parts are assembled.
+        """
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self.upload_path(upload_id))
+
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> str:
+        self.write(os.path.join(self.upload_path(upload_id), str(part_number)), [body])
+
+        return f'"{hashlib.md5(body).hexdigest()}"'
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: Iterable[tuple[int, str]]
+    ) -> None:
+        """
+        Concatenate the parts in order into the object and drop the upload.
+        """
+        upload_path = self.upload_path(upload_id)
+
+        def chunks() -> Iterator[bytes]:
+            for part_number, _ in sorted(parts):
+                with open(os.path.join(upload_path, str(part_number)), "rb") as f:
+                    yield from self.read_chunks(f)
+
+        try:
+            self.write(self.path(key), chunks())
+        except OSError as e:
+            raise MultipartUploadError(str(e)) from e
+
+        shutil.rmtree(upload_path)
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        shutil.rmtree(self.upload_path(upload_id), ignore_errors=True)
+
+local_storage = LocalStorage()
@@ -0,0 +1,105 @@
+"""
+The storage purge worker. Deleting a file or user only removes metadata and
+queues the objects left unreferenced; this process deletes them from storage
+in batches, retries failures with backoff, and periodically sweeps storage
+for objects no file refers to.
+
+    python -m app.storage.purge
+"""
+import logging
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from sqlalchemy.orm import Session
+
+from app.cache.core import redis_db as redis
+from app.core.config import settings
+from app.crud.blob import blob_crud
+from app.database.core import SessionLocal
+from app.storage.core import StorageEngine, storage
+from app.storage.engine import storage_engine
+
+logger = logging.getLogger(__name__)
+
+class StoragePurger():
+    """
+    Deletes the objects queued for engine.
+    """
+    def __init__(self, engine: StorageEngine) -> None:
+        self.engine = engine
+
+    def purge(self) -> int:
+        """
+        Delete one batch of up to STORAGE_DELETE_BATCH_SIZE queued objects and
+        return how many were taken off the queue.
+        """
+        batch_size = settings.STORAGE_DELETE_BATCH_SIZE
+
+        redis.promote_storage_deletes(self.engine.name, batch_size)
+        keys = redis.pop_storage_deletes(self.engine.name, batch_size)
+        if not keys:
+            return 0
+
+        try:
+            failed = self.engine.delete_objects(keys)
+        except Exception as e:
+            logger.warning(f"Deleting {len(keys)} storage objects failed: {e}")
+            failed = keys
+
+        failed_keys = set(failed)
+        redis.delete_storage_delete_attempts(self.engine.name, [key for key in keys if key not in failed_keys])
+
+        dropped = redis.retry_storage_deletes(self.engine.name, failed)
+        if dropped:
+            logger.error(f"Gave up deleting {len(dropped)} storage objects, the orphan sweep will retry them")
+
+        return len(keys)
+
+    def sweep(self, session: Session) -> int:
+        """
+        Queue every object older than STORAGE_ORPHAN_GRACE that no file or
+        blob refers to, and return how many were queued.
+        """
+        cutoff = datetime.now(timezone.utc) - settings.STORAGE_ORPHAN_GRACE
+        keys = (key for key, modified in self.engine.list_objects() if modified < cutoff)
+
+        queued = 0
+        while batch := list(islice(keys, settings.STORAGE_DELETE_BATCH_SIZE)):
+            orphans = blob_crud.read_unreferenced_keys(session=session, keys=batch)
+            redis.enqueue_storage_deletes(self.engine.name, orphans)
+            queued += len(orphans)
+
+        return queued
+
+    def run(self) -> None:
+        """
+        Purge until interrupted, sleeping STORAGE_DELETE_POLL_INTERVAL while
+        the queue is empty.
+        """
+        sweep_interval = settings.STORAGE_ORPHAN_SWEEP_INTERVAL
+        next_sweep = time.monotonic()
+
+        while True:
+            if sweep_interval and time.monotonic() >= next_sweep:
+                with SessionLocal() as session:
+                    logger.info(f"Orphan sweep queued {self.sweep(session)} storage objects")
+                next_sweep = time.monotonic() + sweep_interval.total_seconds()
+
+            if self.purge() < settings.STORAGE_DELETE_BATCH_SIZE:
+                time.sleep(settings.STORAGE_DELETE_POLL_INTERVAL.total_seconds())
+
+def main() -> None:
+    redis.connect()
+    storage.connect()
+
+    try:
+        StoragePurger(storage_engine()).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.disconnect()
+        redis.disconnect()
+
+if __name__ == "__main__":
+    main()
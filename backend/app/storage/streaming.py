@@ -0,0 +1,173 @@
+import re
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any
+from urllib.parse import quote
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.storage.core import ObjectStat
+from app.storage.local import LocalStorage
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Return the first and last byte of a single "bytes=" range, or None to
+    send the whole object. Several ranges are answered with the whole object,
+    as RFC 9110 allows.
+    """
+    match = RANGE_PATTERN.fullmatch((header or "").strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # A suffix range, the final last bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+
+    if start > end or start >= size:
+        raise RangeNotSatisfiable(header)
+
+    return start, end
+
+def if_range_matches(if_range: str | None, stat: ObjectStat) -> bool:
+    """
+    A range is only honoured while the object still has the strong ETag or
+    the Last-Modified date given in If-Range.
+    """
+    if not if_range:
+        return True
+
+    if if_range.startswith('"'):
+        return if_range == stat.etag
+
+    try:
+        return parsedate_to_datetime(if_range) == stat.last_modified.replace(microsecond=0)
+    except (TypeError, ValueError):
+        return False
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+
+    return f'attachment; filename="{filename}"'
+
+class ObjectResponse(Response):
+    """
+    Stream bytes start to end of a stored object with memory bounded by the
+    chunk size. Objects on local disk are handed to the server as a file
+    descriptor when it supports the ASGI zero-copy send extension.
+    """
+    def __init__(
+        self,
+        engine: Any,
+        key: str,
+        start: int,
+        end: int,
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+        background: BackgroundTask | None = None,
+    ) -> None:
+        self.engine = engine
+        self.key = key
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.media_type = "application/octet-stream"
+        self.background = background
+        self.init_headers({**(headers or {}), "content-length": str(end - start + 1)})
+
+    async def listen_for_disconnect(self, receive: Receive) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+
+    async def send_body(self, scope: Scope, send: Send) -> None:
+        if self.end < self.start:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if isinstance(self.engine, LocalStorage) and ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.engine.path(self.key), "rb") as f:
+                await send({
+                    "type": ZERO_COPY_EXTENSION,
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": self.end - self.start + 1,
+                    "more_body": False,
+                })
+            return
+
+        async for chunk in iterate_in_threadpool(self.engine.iter_range(self.key, self.start, self.end)):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        # Stop reading storage as soon as the client goes away
+        async with anyio.create_task_group() as task_group:
+            async def send_and_cancel() -> None:
+                await self.send_body(scope, send)
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(send_and_cancel)
+            await self.listen_for_disconnect(receive)
+            task_group.cancel_scope.cancel()
+
+        if self.background is not None:
+            await self.background()
+
+def object_response(
+    engine: Any,
+    key: str,
+    stat: ObjectStat,
+    filename: str,
+    range_header: str | None = None,
+    if_range: str | None = None,
+) -> Response:
+    """
+    Answer a download of the object, with 206 and just the requested bytes
+    for a satisfiable Range, or 416 for one past the end of the object.
+    """
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": stat.etag,
+        "last-modified": format_datetime(stat.last_modified.astimezone(timezone.utc), usegmt=True),
+        "content-disposition": content_disposition(filename),
+    }
+
+    try:
+        byte_range = parse_range(range_header, stat.size) if if_range_matches(if_range, stat) else None
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={"content-range": f"bytes */{stat.size}"})
+
+    if byte_range is None:
+        return ObjectResponse(engine, key, 0, stat.size - 1, headers=headers)
+
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{stat.size}"
+
+    return ObjectResponse(engine, key, start, end, status_code=206, headers=headers)
@@ -0,0 +1,277 @@
+import io
+import zipfile
+from collections.abc import AsyncGenerator
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import get_async_database_session, get_current_principal_async
+from app.api.routes import async_file
+from app.core.config import settings
+from app.crud.file import StorageQuotaExceeded, async_file_crud
+from app.crud.user import async_user_crud
+from app.main import storage_quota_exceeded_handler
+from app.models.file import File
+from app.models.user import User
+from app.schemas.file import FileCreate
+from app.schemas.user import UserCreate
+from app.storage.core import generate_key
+from app.storage.local import local_storage
+from app.tests.utils.utils import random_email, random_lower_string, random_name
+
+pytestmark = pytest.mark.anyio
+
+URL = f"{settings.API_V1_STR}/files"
+
+async def create_random_user(session: AsyncSession) -> User:
+    user_in = UserCreate(email=random_email(), password=random_lower_string(32))
+
+    return await async_user_crud.create_user(session=session, user_create=user_in)
+
+async def create_random_file(session: AsyncSession, owner_id: int) -> File:
+    file_in = FileCreate(name=random_name(), access_key=generate_key(owner_id, "file.txt"), size=548)
+
+    return await async_file_crud.create_file(session=session, file_in=file_in, owner_id=owner_id)
+
+@pytest.fixture
+async def user(async_session: AsyncSession) -> User:
+    return await create_random_user(async_session)
+
+@pytest.fixture
+async def client(async_session: AsyncSession, user: User) -> AsyncGenerator[httpx.AsyncClient, None]:
+    """
+    Mount the async router on an app of it's own, as the current user.
+    """
+    app = FastAPI()
+    app.include_router(async_file.router, prefix=URL)
+    app.add_exception_handler(StorageQuotaExceeded, storage_quota_exceeded_handler) # type: ignore
+
+    async def override_get_async_database_session():
+        yield async_session
+
+    app.dependency_overrides[get_async_database_session] = override_get_async_database_session
+    app.dependency_overrides[get_current_principal_async] = lambda: user
+
+    transport = httpx.ASGITransport(app=app) # type: ignore
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+async def test_create_file_duplicate_names(client: httpx.AsyncClient, user: User) -> None:
+    names = []
+    for _ in range(3):
+        r = await client.post(
+            f"{URL}/",
+            json={"name": "file.png", "access_key": generate_key(user.id, "file.png"), "size": 648},
+        )
+
+        assert r.status_code == 200
+        assert r.json()["owner_id"] == user.id
+        names.append(r.json()["name"])
+
+    assert names == ["file.png", "file_1.png", "file_2.png"]
+
+async def test_create_file_storage_quota_exceeded_error(client: httpx.AsyncClient, user: User) -> None:
+    data = {"name": random_name(), "access_key": generate_key(user.id, "file.txt"), "size": 100}
+
+    with patch("app.core.config.settings.USER_STORAGE_QUOTA", 99):
+        r = await client.post(f"{URL}/", json=data)
+
+    assert r.status_code == 403
+    assert r.json()["detail"] == "Storage quota exceeded"
+
+async def test_create_update_file_foreign_access_key_error(
+    client: httpx.AsyncClient, async_session: AsyncSession, user: User
+) -> None:
+    own = await create_random_file(async_session, user.id)
+    other = await create_random_file(async_session, (await create_random_user(async_session)).id)
+
+    for method, url, data in (
+        ("POST", f"{URL}/", {"name": random_name(), "access_key": other.access_key}),
+        ("POST", f"{URL}/batch", {"data": [{"name": random_name(), "access_key": other.access_key}]}),
+        ("PUT", f"{URL}/{own.id}", {"access_key": other.access_key}),
+    ):
+        r = await client.request(method, url, json=data)
+
+        assert r.status_code == 400
+        assert r.json()["detail"] == "User does not have permission to use this access key"
+
+async def test_read_file(client: httpx.AsyncClient, async_session: AsyncSession, user: User) -> None:
+    file = await create_random_file(async_session, user.id)
+
+    r = await client.get(f"{URL}/{file.id}")
+
+    assert r.status_code == 200
+    assert r.json()["name"] == file.name
+
+    r = await client.get(f"{URL}/0")
+
+    assert r.status_code == 404
+    assert r.json()["detail"] == "File not found"
+
+async def test_read_files_with_cursor(client: httpx.AsyncClient, async_session: AsyncSession, user: User) -> None:
+    file_ids = [(await create_random_file(async_session, user.id)).id for _ in range(3)]
+
+    seen_ids = []
+    params: dict = {"limit": 2}
+    while True:
+        r = await client.get(f"{URL}/", params=params)
+
+        assert r.status_code == 200
+        assert r.json()["count"] == 3
+        seen_ids += [file["id"] for file in r.json()["data"]]
+
+        if not r.json()["next_cursor"]:
+            break
+
+        params["cursor"] = r.json()["next_cursor"]
+
+    assert seen_ids == file_ids
+
+async def test_read_files_invalid_params_error(client: httpx.AsyncClient) -> None:
+    for params in ({"limit": 0}, {"limit": settings.FILE_PAGE_LIMIT + 1}, {"skip": -2}):
+        r = await client.get(f"{URL}/", params=params)
+
+        assert r.status_code == 422
+
+    r = await client.get(f"{URL}/", params={"cursor": "not-a-cursor"})
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+async def test_create_read_delete_files(client: httpx.AsyncClient, async_session: AsyncSession, user: User) -> None:
+    data = {"data": [
+        {"name": "folder.txt", "access_key": generate_key(user.id, "folder.txt"), "size": 5},
+        {"name": "folder.txt", "access_key": generate_key(user.id, "folder.txt"), "size": 5},
+    ]}
+
+    r = await client.post(f"{URL}/batch", json=data)
+
+    assert r.status_code == 200
+    files = r.json()["data"]
+    assert [file["name"] for file in files] == ["folder.txt", "folder_1.txt"]
+
+    ids = [file["id"] for file in files]
+    other = await create_random_file(async_session, (await create_random_user(async_session)).id)
+
+    r = await client.get(f"{URL}/batch", params={"ids": [*ids[::-1], other.id]})
+
+    assert r.status_code == 200
+    assert [file["id"] for file in r.json()["data"]] == ids[::-1]
+
+    r = await client.delete(f"{URL}/batch", params={"ids": [*ids, other.id]})
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "User does not have permission to delete this file"
+
+    r = await client.delete(f"{URL}/batch", params={"ids": ids})
+
+    assert r.status_code == 200
+    assert r.json()["message"] == "Files deleted successfully"
+
+    r = await client.get(f"{URL}/batch", params={"ids": ids})
+
+    assert r.json()["data"] == []
+
+async def test_create_files_batch_too_large_error(client: httpx.AsyncClient, user: User) -> None:
+    data = {"data": [{"name": random_name(), "access_key": generate_key(user.id, "file.txt")}] * 3}
+
+    with patch("app.core.config.settings.FILE_BATCH_LIMIT", 2):
+        r = await client.post(f"{URL}/batch", json=data)
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "At most 2 files can be handled in one batch"
+
+async def test_update_and_delete_file(client: httpx.AsyncClient, async_session: AsyncSession, user: User) -> None:
+    file = await create_random_file(async_session, user.id)
+
+    r = await client.put(f"{URL}/{file.id}", json={"name": "some-file.txt", "size": 600})
+
+    assert r.status_code == 200
+    assert r.json()["name"] == "some-file.txt"
+    assert r.json()["size"] == 600
+
+    r = await client.put(f"{URL}/{file.id}", json={"size": -1})
+
+    assert r.status_code == 422
+
+    r = await client.delete(f"{URL}/{file.id}")
+
+    assert r.status_code == 200
+    assert r.json()["message"] == "File deleted successfully"
+
+    r = await client.delete(f"{URL}/{file.id}")
+
+    assert r.status_code == 404
+
+async def test_update_delete_file_not_enough_permissions_error(
+    client: httpx.AsyncClient, async_session: AsyncSession
+) -> None:
+    other = await create_random_file(async_session, (await create_random_user(async_session)).id)
+
+    r = await client.put(f"{URL}/{other.id}", json={"name": "mine.txt"})
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "User does not have permission to update this file"
+
+    r = await client.delete(f"{URL}/{other.id}")
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "User does not have permission to delete this file"
+
+async def test_read_file_content(
+    client: httpx.AsyncClient, async_session: AsyncSession, user: User, tmp_path: Path
+) -> None:
+    file = await create_random_file(async_session, user.id)
+    other = await create_random_file(async_session, (await create_random_user(async_session)).id)
+    content = bytes(range(256)) * 16
+
+    with patch.multiple(settings, STORAGE_BACKEND="local", STORAGE_LOCAL_PATH=str(tmp_path)):
+        r = await client.get(f"{URL}/{file.id}/content")
+
+        assert r.status_code == 404
+        assert r.json()["detail"] == "File content not found"
+
+        local_storage.put(file.access_key, content)
+        r = await client.get(f"{URL}/{file.id}/content")
+
+        assert r.status_code == 200
+        assert r.content == content
+
+        r = await client.get(f"{URL}/{file.id}/content", headers={"Range": "bytes=100-199"})
+
+        assert r.status_code == 206
+        assert r.content == content[100:200]
+
+        r = await client.get(f"{URL}/{other.id}/content")
+
+        assert r.status_code == 400
+        assert r.json()["detail"] == "User does not have permission to download this file"
+
+async def test_read_files_archive(
+    client: httpx.AsyncClient, async_session: AsyncSession, user: User, tmp_path: Path
+) -> None:
+    files = [await create_random_file(async_session, user.id) for _ in range(3)]
+    other = await create_random_file(async_session, (await create_random_user(async_session)).id)
+
+    with patch.multiple(settings, STORAGE_BACKEND="local", STORAGE_LOCAL_PATH=str(tmp_path)):
+        for i, file in enumerate(files):
+            local_storage.put(file.access_key, bytes([i]) * 1000)
+
+        r = await client.get(f"{URL}/archive", params={"ids": [file.id for file in files]})
+
+        assert r.status_code == 200
+        assert r.headers["content-type"] == "application/zip"
+
+        with zipfile.ZipFile(io.BytesIO(r.content)) as archive:
+            assert archive.namelist() == [file.name for file in files]
+            for i, file in enumerate(files):
+                assert archive.read(file.name) == bytes([i]) * 1000
+
+        r = await client.get(f"{URL}/archive", params={"ids": [files[0].id, other.id]})
+
+        assert r.status_code == 400
+        assert r.json()["detail"] == "User does not have permission to download this file"
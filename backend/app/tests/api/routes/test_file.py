@@ -1,8 +1,15 @@
+import io
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.crud.file import file_crud
+from app.storage.core import S3Instance, generate_key
+from app.storage.local import local_storage
 from app.tests.utils.file import create_random_file
 from app.tests.utils.utils import random_lower_string, random_name
 
@@ -11,8 +18,15 @@ def test_create_file(
     session: Session,
     user_token_headers: dict[str, str],
 ) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers=user_token_headers,
+    )
+
+    user_id = r.json()["id"]
+
     name = random_name()
-    key = random_lower_string(32)
+    key = generate_key(user_id, name)
 
     data = {
         "name" : name,
@@ -29,29 +43,69 @@ def test_create_file(
     new_file = r.json()
     assert new_file["name"] == name
 
-    r = client.get(
-        f"{settings.API_V1_STR}/users/me",
-        headers=user_token_headers,
-    )
-
-    user_id = r.json()["id"]
-
     file = file_crud.read_file_by_name(session=session, name=name, owner_id=user_id)
 
     assert file
     assert file.name == name
     assert file.owner_id == new_file["owner_id"]
 
+def test_create_file_storage_quota_exceeded_error(
+    client: TestClient,
+    user_token_headers: dict[str, str],
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    user_id = r.json()["id"]
+    r = client.get(f"{settings.API_V1_STR}/users/me/usage", headers=user_token_headers)
+    storage_used = r.json()["storage_used"]
+
+    data = {"name": random_name(), "access_key": generate_key(user_id, "file.txt"), "size": 100}
+
+    with patch("app.core.config.settings.USER_STORAGE_QUOTA", storage_used + 99):
+        r = client.post(
+            f"{settings.API_V1_STR}/files/",
+            headers=user_token_headers,
+            json=data,
+        )
+
+    assert r.status_code == 403
+    assert r.json()["detail"] == "Storage quota exceeded"
+
+def test_create_update_file_invalid_size_error(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    file = create_random_file(session=session, owner_id=r.json()["id"])
+
+    for size in (-1_000_000_000, None):
+        r = client.post(
+            f"{settings.API_V1_STR}/files/",
+            headers=user_token_headers,
+            json={"name": random_name(), "access_key": file.access_key, "size": size},
+        )
+
+        assert r.status_code == 422
+
+        r = client.put(
+            f"{settings.API_V1_STR}/files/{file.id}",
+            headers=user_token_headers,
+            json={"size": size},
+        )
+
+        assert r.status_code == 422
+
 def test_create_file_duplicate_names(
     client: TestClient,
     session: Session,
     user_token_headers: dict[str, str],
 ) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    user_id = r.json()["id"]
+
     name = "file.png"
     size = 648
-    key_1 = random_lower_string(32)
-    key_2 = random_lower_string(32)
-    key_3 = random_lower_string(32)
+    key_1 = generate_key(user_id, name)
+    key_2 = generate_key(user_id, name)
+    key_3 = generate_key(user_id, name)
 
     file_data_1 = {
         "name": name,
@@ -146,6 +200,76 @@ def test_read_files(
     content = r.json()
     assert len(content["data"]) >= 3
 
+def test_read_files_with_cursor(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers=user_token_headers,
+    )
+
+    assert r.status_code == 200
+
+    user_id = r.json()["id"]
+
+    file_ids = [create_random_file(session=session, owner_id=user_id).id for _ in range(3)]
+
+    seen_ids = []
+    params = {"limit": 2}
+    while True:
+        r = client.get(
+            f"{settings.API_V1_STR}/files/",
+            headers=user_token_headers,
+            params=params,
+        )
+
+        assert r.status_code == 200
+        content = r.json()
+        seen_ids += [file["id"] for file in content["data"]]
+
+        if not content["next_cursor"]:
+            break
+
+        params["cursor"] = content["next_cursor"]
+
+    assert seen_ids == sorted(set(seen_ids))
+    assert set(file_ids) <= set(seen_ids)
+
+def test_read_files_invalid_cursor_error(
+    client: TestClient, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/files/",
+        headers=user_token_headers,
+        params={"cursor": "not-a-cursor"},
+    )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+def test_read_files_invalid_limit_error(
+    client: TestClient, user_token_headers: dict[str, str]
+) -> None:
+    for limit in (0, -1, settings.FILE_PAGE_LIMIT + 1):
+        r = client.get(
+            f"{settings.API_V1_STR}/files/",
+            headers=user_token_headers,
+            params={"limit": limit},
+        )
+
+        assert r.status_code == 422
+
+def test_read_files_invalid_skip_error(
+    client: TestClient, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/files/",
+        headers=user_token_headers,
+        params={"skip": -2, "limit": 2},
+    )
+
+    assert r.status_code == 422
+
 def test_update_file(
     client: TestClient, session: Session, user_token_headers: dict[str, str]
 ) -> None:
@@ -209,6 +333,35 @@ def test_update_file_not_enough_permissions_error(
     assert r.status_code == 400
     assert r.json()["detail"] == "User does not have permission to update this file"
 
+def test_create_update_file_foreign_access_key_error(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    """
+    Registering another user's access key would let the current user
+    download their content.
+    """
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    own = create_random_file(session=session, owner_id=r.json()["id"])
+    other = create_random_file(session=session)
+
+    for method, url, data in (
+        ("POST", "/files/", {"name": random_name(), "access_key": other.access_key}),
+        ("POST", "/files/batch", {"data": [{"name": random_name(), "access_key": other.access_key}]}),
+        ("PUT", f"/files/{own.id}", {"access_key": other.access_key}),
+    ):
+        r = client.request(method, f"{settings.API_V1_STR}{url}", headers=user_token_headers, json=data)
+
+        assert r.status_code == 400
+        assert r.json()["detail"] == "User does not have permission to use this access key"
+
+    r = client.post(
+        f"{settings.API_V1_STR}/files/",
+        headers=user_token_headers,
+        json={"name": random_name(), "access_key": own.access_key},
+    )
+
+    assert r.status_code == 200
+
 def test_delete_file(
     client: TestClient, session: Session, user_token_headers: dict[str, str]
 ) -> None:
@@ -257,3 +410,245 @@ def test_delete_file_not_enough_permissions_error(
 
     assert r.status_code == 400
     assert r.json()["detail"] == "User does not have permission to delete this file"
+
+def test_create_read_delete_files(
+    client: TestClient, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    user_id = r.json()["id"]
+
+    data = {"data": [
+        {"name": "folder.txt", "access_key": generate_key(user_id, "folder.txt"), "size": 5},
+        {"name": "folder.txt", "access_key": generate_key(user_id, "folder.txt"), "size": 5},
+    ]}
+
+    r = client.post(
+        f"{settings.API_V1_STR}/files/batch",
+        headers=user_token_headers,
+        json=data,
+    )
+
+    assert r.status_code == 200
+    files = r.json()["data"]
+    assert r.json()["count"] == 2
+    assert files[1]["name"] != files[0]["name"]
+
+    ids = [file["id"] for file in files]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/files/batch",
+        headers=user_token_headers,
+        params={"ids": ids[::-1]},
+    )
+
+    assert r.status_code == 200
+    assert [file["id"] for file in r.json()["data"]] == ids[::-1]
+
+    r = client.delete(
+        f"{settings.API_V1_STR}/files/batch",
+        headers=user_token_headers,
+        params={"ids": ids},
+    )
+
+    assert r.status_code == 200
+    assert r.json()["message"] == "Files deleted successfully"
+
+    r = client.get(
+        f"{settings.API_V1_STR}/files/batch",
+        headers=user_token_headers,
+        params={"ids": ids},
+    )
+
+    assert r.json()["data"] == []
+
+def test_read_files_batch_only_own_files(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    own = create_random_file(session=session, owner_id=r.json()["id"])
+    other = create_random_file(session=session)
+
+    r = client.get(f"{settings.API_V1_STR}/files/batch", params={"ids": [own.id, other.id]})
+
+    assert r.status_code == 401
+
+    r = client.get(
+        f"{settings.API_V1_STR}/files/batch",
+        headers=user_token_headers,
+        params={"ids": [own.id, other.id]},
+    )
+
+    assert r.status_code == 200
+    assert [file["id"] for file in r.json()["data"]] == [own.id]
+    assert r.json()["count"] == 1
+
+def test_create_files_batch_too_large_error(
+    client: TestClient, user_token_headers: dict[str, str]
+) -> None:
+    data = {"data": [{"name": random_name(), "access_key": random_lower_string(32)}] * 3}
+
+    with patch("app.core.config.settings.FILE_BATCH_LIMIT", 2):
+        r = client.post(
+            f"{settings.API_V1_STR}/files/batch",
+            headers=user_token_headers,
+            json=data,
+        )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "At most 2 files can be handled in one batch"
+
+def test_delete_files_not_enough_permissions_error(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    """
+    The current user is not the owner of one of the files.
+    """
+    file = create_random_file(session=session)
+
+    r = client.delete(
+        f"{settings.API_V1_STR}/files/batch",
+        headers=user_token_headers,
+        params={"ids": [file.id]},
+    )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "User does not have permission to delete this file"
+
+    r = client.delete(
+        f"{settings.API_V1_STR}/files/batch",
+        headers=user_token_headers,
+        params={"ids": [file.id, 999_999]},
+    )
+
+    assert r.status_code == 404
+    assert r.json()["detail"] == "File not found"
+
+def test_read_file_content(
+    client: TestClient, session: Session, user_token_headers: dict[str, str], tmp_path: Path
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    file = create_random_file(session=session, owner_id=r.json()["id"])
+    content = bytes(range(256)) * 4096
+
+    url = f"{settings.API_V1_STR}/files/{file.id}/content"
+
+    with patch.multiple(settings, STORAGE_BACKEND="local", STORAGE_LOCAL_PATH=str(tmp_path)):
+        local_storage.put(file.access_key, content)
+        r = client.get(url, headers=user_token_headers)
+
+        assert r.status_code == 200
+        assert r.content == content
+        assert r.headers["accept-ranges"] == "bytes"
+
+        etag = r.headers["etag"]
+        r = client.get(url, headers={**user_token_headers, "Range": "bytes=1000-1999", "If-Range": etag})
+
+        assert r.status_code == 206
+        assert r.content == content[1000:2000]
+        assert r.headers["content-range"] == f"bytes 1000-1999/{len(content)}"
+
+        r = client.get(url, headers={**user_token_headers, "Range": "bytes=1000-1999", "If-Range": '"stale"'})
+
+        assert r.status_code == 200
+        assert len(r.content) == len(content)
+
+        r = client.get(url, headers={**user_token_headers, "Range": f"bytes={len(content)}-"})
+
+        assert r.status_code == 416
+        assert r.headers["content-range"] == f"bytes */{len(content)}"
+
+def test_read_file_content_from_s3(
+    client: TestClient, session: Session, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    file = create_random_file(session=session, owner_id=r.json()["id"])
+    s3.client.put_object(Bucket=s3.bucket, Key=file.access_key, Body=b"0123456789") # type: ignore
+
+    r = client.get(
+        f"{settings.API_V1_STR}/files/{file.id}/content",
+        headers={**user_token_headers, "Range": "bytes=-4"},
+    )
+
+    assert r.status_code == 206
+    assert r.content == b"6789"
+
+def test_read_file_content_not_found_error(
+    client: TestClient, session: Session, user_token_headers: dict[str, str], tmp_path: Path
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    file = create_random_file(session=session, owner_id=r.json()["id"])
+
+    with patch.multiple(settings, STORAGE_BACKEND="local", STORAGE_LOCAL_PATH=str(tmp_path)):
+        r = client.get(f"{settings.API_V1_STR}/files/{file.id}/content", headers=user_token_headers)
+
+    assert r.status_code == 404
+    assert r.json()["detail"] == "File content not found"
+
+def test_read_files_archive(
+    client: TestClient, session: Session, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    files = [create_random_file(session=session, owner_id=r.json()["id"]) for _ in range(3)]
+    for i, file in enumerate(files):
+        s3.client.put_object(Bucket=s3.bucket, Key=file.access_key, Body=bytes([i]) * 100_000) # type: ignore
+
+    r = client.get(
+        f"{settings.API_V1_STR}/files/archive",
+        headers=user_token_headers,
+        params={"ids": [file.id for file in files]},
+    )
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(r.content)) as archive:
+        assert archive.namelist() == [file.name for file in files]
+        for i, file in enumerate(files):
+            assert archive.read(file.name) == bytes([i]) * 100_000
+
+def test_read_files_archive_duplicate_names(
+    client: TestClient, session: Session, user_token_headers: dict[str, str], tmp_path: Path
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    files = [create_random_file(session=session, owner_id=r.json()["id"]) for _ in range(3)]
+
+    for file in files:
+        r = client.put(
+            f"{settings.API_V1_STR}/files/{file.id}",
+            headers=user_token_headers,
+            json={"name": "notes.txt"},
+        )
+
+        assert r.status_code == 200
+
+    with patch.multiple(settings, STORAGE_BACKEND="local", STORAGE_LOCAL_PATH=str(tmp_path)):
+        for i, file in enumerate(files):
+            local_storage.put(file.access_key, bytes([i]) * 10)
+
+        r = client.get(
+            f"{settings.API_V1_STR}/files/archive",
+            headers=user_token_headers,
+            params={"ids": [file.id for file in files]},
+        )
+
+    assert r.status_code == 200
+
+    with zipfile.ZipFile(io.BytesIO(r.content)) as archive:
+        assert archive.namelist() == ["notes.txt", "notes_1.txt", "notes_2.txt"]
+        assert archive.read("notes_2.txt") == bytes([2]) * 10
+
+def test_read_files_archive_not_enough_permissions_error(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    own = create_random_file(session=session, owner_id=r.json()["id"])
+    other = create_random_file(session=session)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/files/archive",
+        headers=user_token_headers,
+        params={"ids": [own.id, other.id]},
+    )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "User does not have permission to download this file"
@@ -1,8 +1,25 @@
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.security import principal_cache
+from app.crud.user import user_crud
+from app.schemas.user import UserCreate
+from app.tests.utils.utils import random_email, random_lower_string
+
+def get_random_user_token_headers(client: TestClient, session: Session) -> dict[str, str]:
+    email = random_email()
+    password = random_lower_string(32)
+    user_crud.create_user(session=session, user_create=UserCreate(email=email, password=password))
+
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
 
 def test_get_access_token(client: TestClient) -> None:
     login_data = {
@@ -36,3 +53,40 @@ def test_use_access_token(
 
     assert r.status_code == 200
     assert "email" in result
+
+def test_revoke_tokens(client: TestClient, session: Session) -> None:
+    headers = get_random_user_token_headers(client, session)
+
+    r = client.post(f"{settings.API_V1_STR}/login/revoke-tokens", headers=headers)
+
+    assert r.status_code == 200
+    assert r.json()["message"] == "Tokens revoked successfully"
+
+    r = client.post(f"{settings.API_V1_STR}/login/test-token", headers=headers)
+
+    assert r.status_code == 403
+
+def test_stateless_auth(client: TestClient, session: Session) -> None:
+    headers = get_random_user_token_headers(client, session)
+    token = headers["Authorization"].removeprefix("Bearer ")
+
+    with patch.object(settings, "STATELESS_AUTH", True):
+        r = client.get(f"{settings.API_V1_STR}/files/", headers=headers)
+
+        assert r.status_code == 200
+        assert principal_cache.get(token)
+
+        with patch.object(user_crud, "read_user") as read_user:
+            r = client.get(f"{settings.API_V1_STR}/files/", headers=headers)
+
+            assert r.status_code == 200
+            read_user.assert_not_called()
+
+        r = client.post(f"{settings.API_V1_STR}/login/revoke-tokens", headers=headers)
+
+        assert r.status_code == 200
+        assert not principal_cache.get(token)
+
+        r = client.get(f"{settings.API_V1_STR}/files/", headers=headers)
+
+        assert r.status_code == 403
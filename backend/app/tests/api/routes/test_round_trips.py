@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.cache.core import redis_db as redis
+from app.core.config import settings
+from app.core.metrics import track_round_trips
+from app.crud.file import file_crud
+from app.crud.user import user_crud
+from app.schemas.user import UserCreate
+from app.tests.utils.file import create_random_file
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_email, random_lower_string
+
+# Round trips a request may make, however many files it touches. Raising one
+# of these should come with a reason in the commit that does it.
+READ_FILES_BUDGET = {"db_queries": 2, "redis_round_trips": 5}
+READ_FILES_CACHED_BUDGET = {"db_queries": 0, "redis_round_trips": 5}
+READ_FILES_BATCH_BUDGET = {"db_queries": 1, "redis_round_trips": 2}
+
+def login_with_files(client: TestClient, session: Session, file_count: int) -> dict[str, str]:
+    email, password = random_email(), random_lower_string(32)
+    user = user_crud.create_user(session=session, user_create=UserCreate(email=email, password=password))
+    for _ in range(file_count):
+        create_random_file(session=session, owner_id=user.id)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    # Warm the principal cache so only the route itself is counted
+    client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+
+    return headers
+
+def round_trips(client: TestClient, url: str, headers: dict[str, str]) -> dict[str, int]:
+    with patch("app.core.config.settings.REQUEST_ROUND_TRIP_HEADERS", True):
+        r = client.get(url, headers=headers)
+
+    assert r.status_code == 200
+    assert r.headers["server-timing"].startswith("db;dur=")
+
+    return {
+        "db_queries": int(r.headers["x-db-queries"]),
+        "redis_round_trips": int(r.headers["x-redis-round-trips"]),
+    }
+
+def within(trips: dict[str, int], budget: dict[str, int]) -> bool:
+    return all(trips[name] <= limit for name, limit in budget.items())
+
+def test_read_files_round_trips(client: TestClient, session: Session) -> None:
+    url = f"{settings.API_V1_STR}/files/"
+    results = []
+
+    for file_count in (2, 20):
+        headers = login_with_files(client, session, file_count)
+        user_id = client.get(f"{settings.API_V1_STR}/users/me", headers=headers).json()["id"]
+
+        # The first page is read from the database, the second from the cache
+        redis.connection.delete(f"owner_id:{user_id}") # type: ignore
+        results.append((round_trips(client, url, headers), round_trips(client, url, headers)))
+
+    assert results[0] == results[1]
+    assert within(results[0][0], READ_FILES_BUDGET)
+    assert within(results[0][1], READ_FILES_CACHED_BUDGET)
+
+def test_read_files_batch_round_trips(client: TestClient, session: Session) -> None:
+    results = []
+
+    for file_count in (2, 20):
+        headers = login_with_files(client, session, 0)
+        user_id = client.get(f"{settings.API_V1_STR}/users/me", headers=headers).json()["id"]
+        ids = [create_random_file(session=session, owner_id=user_id).id for _ in range(file_count)]
+
+        redis.delete_files_from_cache(ids)
+        query = "&".join(f"ids={id}" for id in ids)
+        results.append(round_trips(client, f"{settings.API_V1_STR}/files/batch?{query}", headers))
+
+    assert results[0] == results[1]
+    assert within(results[0], READ_FILES_BATCH_BUDGET)
+
+def test_delete_round_trips(session: Session) -> None:
+    """
+    Deleting many files, or a user with many files, costs the same number of
+    statements and round trips as deleting a few.
+    """
+    results = []
+
+    for file_count in (2, 20):
+        user = create_random_user(session=session)
+        file_ids = [create_random_file(session=session, owner_id=user.id).id for _ in range(file_count)]
+        other = create_random_user(session=session)
+        for _ in range(file_count):
+            create_random_file(session=session, owner_id=other.id)
+
+        with track_round_trips() as delete_files:
+            file_crud.delete_files(session=session, file_ids=file_ids)
+
+        with track_round_trips() as delete_user:
+            user_crud.delete_user(session=session, user_id=other.id)
+
+        results.append([
+            (trips.db_queries, trips.redis_round_trips) for trips in (delete_files, delete_user)
+        ])
+
+    assert results[0] == results[1]
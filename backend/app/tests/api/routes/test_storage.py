@@ -0,0 +1,116 @@
+from unittest.mock import patch
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.storage.core import S3Instance
+from app.tests.utils.file import create_random_file
+
+def test_upload_and_download_file(
+    client: TestClient, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/storage/uploads",
+        headers=user_token_headers,
+        json={"name": "report.pdf"},
+    )
+
+    assert r.status_code == 200
+    upload = r.json()
+    assert upload["access_key"].endswith(".pdf")
+    assert httpx.put(upload["url"], content=b"%PDF").status_code == 200
+
+    r = client.post(
+        f"{settings.API_V1_STR}/files/",
+        headers=user_token_headers,
+        json={"name": "report.pdf", "access_key": upload["access_key"], "size": 4},
+    )
+    file_id = r.json()["id"]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/storage/download/{file_id}",
+        headers=user_token_headers,
+    )
+
+    assert r.status_code == 200
+    assert httpx.get(r.json()["url"]).content == b"%PDF"
+
+def test_download_file_not_enough_permissions_error(
+    client: TestClient, session: Session, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    file = create_random_file(session=session)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/storage/download/{file.id}",
+        headers=user_token_headers,
+    )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "User does not have permission to download this file"
+
+def test_multipart_upload(
+    client: TestClient, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/storage/multipart",
+        headers=user_token_headers,
+        json={"name": "archive.zip", "part_count": 1},
+    )
+
+    assert r.status_code == 200
+    upload = r.json()
+    assert [part["part_number"] for part in upload["parts"]] == [1]
+
+    r = client.post(
+        f"{settings.API_V1_STR}/storage/multipart/{upload['upload_id']}/parts",
+        headers=user_token_headers,
+        json={"access_key": upload["access_key"], "part_numbers": [1]},
+    )
+
+    assert r.status_code == 200
+
+    r = httpx.put(r.json()[0]["url"], content=b"zip")
+    parts = [{"part_number": 1, "etag": r.headers["etag"]}]
+
+    r = client.post(
+        f"{settings.API_V1_STR}/storage/multipart/{upload['upload_id']}/complete",
+        headers=user_token_headers,
+        json={"access_key": upload["access_key"], "parts": parts},
+    )
+
+    assert r.status_code == 200
+    assert r.json()["message"] == "Upload completed successfully"
+
+def test_multipart_upload_not_enough_permissions_error(
+    client: TestClient, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    """
+    The access key was not issued to the current user.
+    """
+    r = client.delete(
+        f"{settings.API_V1_STR}/storage/multipart/some-upload",
+        headers=user_token_headers,
+        params={"access_key": "0/2024-01-01/other.zip"},
+    )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "User does not have permission to upload this file"
+
+def test_presign_local_backend_error(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    file = create_random_file(session=session, owner_id=r.json()["id"])
+
+    with patch("app.core.config.settings.STORAGE_BACKEND", "local"):
+        for method, url, data in (
+            ("POST", "/storage/uploads", {"name": "report.pdf"}),
+            ("POST", "/storage/multipart", {"name": "report.pdf", "part_count": 1}),
+            ("GET", f"/storage/download/{file.id}", None),
+        ):
+            r = client.request(method, f"{settings.API_V1_STR}{url}", headers=user_token_headers, json=data)
+
+            assert r.status_code == 400
+            assert r.json()["detail"] == "Presigned URLs are only available with the s3 storage backend"
@@ -0,0 +1,236 @@
+import base64
+import hashlib
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.storage.core import S3Instance, content_digest
+from app.storage.local import local_storage
+from app.storage.purge import StoragePurger
+from app.tests.utils.utils import random_lower_string
+
+CHUNK_SIZE = 5 * 1024 * 1024
+
+def checksum(body: bytes) -> dict[str, str]:
+    return {
+        "Content-Type": "application/octet-stream",
+        "Upload-Checksum": f"sha256 {base64.b64encode(hashlib.sha256(body).digest()).decode()}",
+    }
+
+def test_resumable_upload(
+    client: TestClient, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    chunks = [b"a" * CHUNK_SIZE, b"tail"]
+
+    with patch("app.core.config.settings.RESUMABLE_UPLOAD_CHUNK_SIZE", CHUNK_SIZE):
+        r = client.post(
+            f"{settings.API_V1_STR}/uploads/",
+            headers=user_token_headers,
+            json={"name": "disk.img", "size": CHUNK_SIZE + 4},
+        )
+
+    assert r.status_code == 200
+    upload = r.json()
+    assert upload["chunk_count"] == 2
+    assert upload["offset"] == 0
+
+    # The last chunk arrives first, as it may when chunks are sent in parallel
+    r = client.put(
+        f"{settings.API_V1_STR}/uploads/{upload['id']}/chunks/1",
+        headers={**user_token_headers, **checksum(chunks[1])},
+        content=chunks[1],
+    )
+
+    assert r.status_code == 200
+    assert r.json()["received"] == [1]
+    assert r.json()["offset"] == 0
+
+    r = client.post(f"{settings.API_V1_STR}/uploads/{upload['id']}/complete", headers=user_token_headers)
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Upload is missing chunks"
+
+    for _ in range(2):
+        r = client.put(
+            f"{settings.API_V1_STR}/uploads/{upload['id']}/chunks/0",
+            headers={**user_token_headers, **checksum(chunks[0])},
+            content=chunks[0],
+        )
+
+        assert r.status_code == 200
+
+    r = client.get(f"{settings.API_V1_STR}/uploads/{upload['id']}", headers=user_token_headers)
+
+    assert r.json()["offset"] == CHUNK_SIZE + 4
+
+    r = client.post(f"{settings.API_V1_STR}/uploads/{upload['id']}/complete", headers=user_token_headers)
+
+    assert r.status_code == 200
+    file = r.json()
+    assert file["name"] == "disk.img"
+    assert file["size"] == CHUNK_SIZE + 4
+
+    obj = s3.client.get_object(Bucket=s3.bucket, Key=file["access_key"]) # type: ignore
+
+    assert obj["Body"].read() == b"".join(chunks)
+
+    r = client.get(f"{settings.API_V1_STR}/uploads/{upload['id']}", headers=user_token_headers)
+
+    assert r.status_code == 404
+
+def test_resumable_upload_to_local_storage(
+    client: TestClient, user_token_headers: dict[str, str], tmp_path: Path
+) -> None:
+    chunks = [b"a" * 4, b"b" * 4, b"c"]
+
+    with patch.multiple(
+        settings, STORAGE_BACKEND="local", STORAGE_LOCAL_PATH=str(tmp_path), RESUMABLE_UPLOAD_CHUNK_SIZE=4
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/uploads/",
+            headers=user_token_headers,
+            json={"name": "notes.txt", "size": 9},
+        )
+        upload = r.json()
+
+        for index in reversed(range(len(chunks))):
+            r = client.put(
+                f"{settings.API_V1_STR}/uploads/{upload['id']}/chunks/{index}",
+                headers={**user_token_headers, **checksum(chunks[index])},
+                content=chunks[index],
+            )
+
+            assert r.status_code == 200
+
+        r = client.post(f"{settings.API_V1_STR}/uploads/{upload['id']}/complete", headers=user_token_headers)
+
+        assert r.status_code == 200
+        assert local_storage.get(r.json()["access_key"]) == b"".join(chunks)
+
+def test_resumable_upload_too_large_error(
+    client: TestClient, user_token_headers: dict[str, str]
+) -> None:
+    with patch.multiple(settings, RESUMABLE_UPLOAD_CHUNK_SIZE=4, S3_MULTIPART_MAX_PARTS=2):
+        r = client.post(
+            f"{settings.API_V1_STR}/uploads/",
+            headers=user_token_headers,
+            json={"name": "notes.txt", "size": 9},
+        )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Uploads can be at most 8 bytes"
+
+def test_resumable_upload_missing_part_error(
+    client: TestClient, user_token_headers: dict[str, str], tmp_path: Path
+) -> None:
+    with patch.multiple(
+        settings, STORAGE_BACKEND="local", STORAGE_LOCAL_PATH=str(tmp_path), RESUMABLE_UPLOAD_CHUNK_SIZE=4
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/uploads/",
+            headers=user_token_headers,
+            json={"name": "notes.txt", "size": 4},
+        )
+        upload = r.json()
+
+        r = client.put(
+            f"{settings.API_V1_STR}/uploads/{upload['id']}/chunks/0",
+            headers={**user_token_headers, **checksum(b"abcd")},
+            content=b"abcd",
+        )
+
+        assert r.status_code == 200
+
+        # The part is lost from disk after it was received
+        for part in (tmp_path / "uploads").glob("*/1"):
+            part.unlink()
+
+        r = client.post(f"{settings.API_V1_STR}/uploads/{upload['id']}/complete", headers=user_token_headers)
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Upload could not be completed"
+
+def test_upload_chunk_checksum_mismatch_error(
+    client: TestClient, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/uploads/",
+        headers=user_token_headers,
+        json={"name": "notes.txt", "size": 5},
+    )
+    upload = r.json()
+
+    r = client.put(
+        f"{settings.API_V1_STR}/uploads/{upload['id']}/chunks/0",
+        headers={**user_token_headers, **checksum(b"hello")},
+        content=b"jello",
+    )
+
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Chunk checksum mismatch"
+
+    r = client.put(
+        f"{settings.API_V1_STR}/uploads/{upload['id']}/chunks/0",
+        headers={**user_token_headers, "Content-Type": "application/octet-stream"},
+        content=b"hello",
+    )
+
+    assert r.status_code == 400
+
+    r = client.delete(f"{settings.API_V1_STR}/uploads/{upload['id']}", headers=user_token_headers)
+
+    assert r.status_code == 200
+    assert r.json()["message"] == "Upload aborted successfully"
+
+def test_resumable_upload_of_stored_content(
+    client: TestClient, s3: S3Instance, user_token_headers: dict[str, str]
+) -> None:
+    body = random_lower_string(32).encode()
+
+    files = []
+    for _ in range(2):
+        r = client.post(
+            f"{settings.API_V1_STR}/uploads/",
+            headers=user_token_headers,
+            json={"name": "copy.txt", "size": len(body)},
+        )
+        upload = r.json()
+
+        client.put(
+            f"{settings.API_V1_STR}/uploads/{upload['id']}/chunks/0",
+            headers={**user_token_headers, **checksum(body)},
+            content=body,
+        )
+        r = client.post(f"{settings.API_V1_STR}/uploads/{upload['id']}/complete", headers=user_token_headers)
+
+        assert r.status_code == 200
+        files.append(r.json())
+
+    # The second copy shares the first one's object and its own was deleted
+    assert files[1]["access_key"] == files[0]["access_key"]
+    assert files[1]["name"] == "copy_1.txt"
+    StoragePurger(s3).purge()
+    objects = s3.client.list_objects_v2(Bucket=s3.bucket, Prefix=f"{files[0]['owner_id']}/")["Contents"] # type: ignore
+    assert [obj["Key"] for obj in objects if obj["Size"] == len(body)] == [files[0]["access_key"]]
+
+    digest = content_digest([hashlib.sha256(body).hexdigest()], settings.RESUMABLE_UPLOAD_CHUNK_SIZE)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/uploads/by-digest",
+        headers=user_token_headers,
+        json={"name": "copy.txt", "digest": digest},
+    )
+
+    assert r.status_code == 200
+    assert r.json()["access_key"] == files[0]["access_key"]
+
+    r = client.post(
+        f"{settings.API_V1_STR}/uploads/by-digest",
+        headers=user_token_headers,
+        json={"name": "copy.txt", "digest": "0" * 64},
+    )
+
+    assert r.status_code == 404
+    assert r.json()["detail"] == "No stored file matches this digest"
@@ -2,13 +2,16 @@ from unittest.mock import patch
 
 from fastapi.testclient import TestClient
 from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.crud.file import file_crud
 from app.crud.user import user_crud
 from app.models.user import User
 from app.core.security import verify_password
 from app.schemas.user import UserCreate, UserUpdate
+from app.tests.utils.file import create_random_file
 from app.tests.utils.utils import random_email, random_lower_string
 
 def test_register_user(client: TestClient, session: Session) -> None:
@@ -70,6 +73,18 @@ def test_read_user_me(
     assert current_user
     assert current_user["email"] == settings.TEST_USER_EMAIL
 
+def test_read_user_me_usage(
+    client: TestClient,
+    user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me/usage", headers=user_token_headers)
+    usage = r.json()
+
+    assert r.status_code == 200
+    assert usage["file_count"] >= 0
+    assert usage["storage_used"] >= 0
+    assert usage["storage_quota"] == settings.USER_STORAGE_QUOTA
+
 def test_update_user_me(
     client: TestClient, user_token_headers: dict[str, str], session: Session
 ) -> None:
@@ -216,3 +231,59 @@ def test_delete_user_me(
     assert user
     assert user.email == settings.TEST_USER_EMAIL
     assert verify_password(settings.TEST_USER_PASSWORD, user.hashed_password)
+
+def test_delete_user_me_in_background(client: TestClient, session: Session) -> None:
+    email = random_email()
+    password = random_lower_string(32)
+    user = user_crud.create_user(session=session, user_create=UserCreate(email=email, password=password))
+    user_id = user.id
+    file_ids = [create_random_file(session=session, owner_id=user_id).id for _ in range(2)]
+
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    with patch("app.core.config.settings.USER_DELETE_BACKGROUND_FILES", 1):
+        r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+
+    assert r.status_code == 202
+    assert r.json()["message"] == "User deletion scheduled"
+
+    # The test client runs background tasks before returning the response
+    assert user_crud.read_user(session=session, id=user_id) is None
+    assert file_crud.read_files(session=session, ids=file_ids) == []
+
+def test_delete_user_me_in_background_retries(client: TestClient, session: Session) -> None:
+    email = random_email()
+    password = random_lower_string(32)
+    user = user_crud.create_user(session=session, user_create=UserCreate(email=email, password=password))
+    user_id = user.id
+    for _ in range(2):
+        create_random_file(session=session, owner_id=user_id)
+
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    delete_user = user_crud.delete_user
+    attempts = []
+
+    def fail_once(**kwargs):
+        attempts.append(kwargs["user_id"])
+        if len(attempts) == 1:
+            raise OperationalError("DELETE", {}, Exception("connection lost"))
+        return delete_user(**kwargs)
+
+    with (
+        patch("app.core.config.settings.USER_DELETE_BACKGROUND_FILES", 1),
+        patch.object(user_crud, "delete_user", side_effect=fail_once),
+    ):
+        r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+
+    assert r.status_code == 202
+    assert attempts == [user_id, user_id]
+    assert user_crud.read_user(session=session, id=user_id) is None
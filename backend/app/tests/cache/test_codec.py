@@ -0,0 +1,42 @@
+import pytest
+
+from app.cache.codec import CODECS, MsgpackCodec, get_codec, msgpack
+from app.schemas.file import FilePublic
+
+FILE = {
+    "id": 1,
+    "name": "file.txt",
+    "access_key": "key",
+    "size": 12,
+    "owner_id": 2,
+    "created_at": "2024-06-01T12:00:00+00:00",
+    "updated_at": None,
+}
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+def test_codec_round_trip(name: str) -> None:
+    if CODECS[name] is MsgpackCodec and msgpack is None:
+        pytest.skip("msgpack is not installed")
+
+    codec = get_codec(name)
+    payload = codec.encode(FILE)
+
+    assert codec.decode(payload) == FILE
+
+    file = codec.decode(payload, FilePublic)
+
+    assert isinstance(file, FilePublic)
+    assert file.id == FILE["id"]
+    assert file.created_at and file.created_at.year == 2024
+
+def test_codec_ignores_stale_payloads() -> None:
+    codec = get_codec("orjson")
+
+    assert codec.decode(None) is None
+    assert codec.decode(b'{"id": 1}') is None
+    assert codec.decode(get_codec("json").encode(FILE)) is None
+    assert codec.decode(codec.encode(FILE).replace(b"v", b"v0", 1)) is None
+
+def test_get_codec_unknown() -> None:
+    with pytest.raises(ValueError):
+        get_codec("pickle")
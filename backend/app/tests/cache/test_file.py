@@ -1,7 +1,15 @@
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 
-from app.cache.core import redis_db as redis
+from app.cache.core import TOMBSTONE, RedisInstance, redis_db as redis
+from app.core.config import settings
+from app.schemas.file import FilePublic
 from app.tests.utils.file import create_random_file
 from app.tests.utils.user import create_random_user
 
@@ -51,6 +59,24 @@ def test_read_files_by_owner_id_from_cache(session: Session) -> None:
     for file in file_objs:
         assert file["owner_id"] == user.id
 
+    assert redis.read_files_by_owner_id_from_cache(user.id, limit=0) == []
+
+def test_read_files_by_ids_from_cache(session: Session) -> None:
+    file_1 = create_random_file(session=session)
+    file_2 = create_random_file(session=session)
+
+    assert file_1
+    assert file_2
+
+    redis.write_file_to_cache(file_1.id, file_1.owner_id, jsonable_encoder(file_1))
+    redis.write_file_to_cache(file_2.id, file_2.owner_id, jsonable_encoder(file_2))
+
+    file_objs = redis.read_files_by_ids_from_cache([file_1.id, file_2.id, 0])
+
+    assert len(file_objs) == 2
+    assert file_objs[0]["id"] == file_1.id
+    assert file_objs[1]["id"] == file_2.id
+
 def test_read_file_count_by_owner_id_from_cache(session: Session) -> None:
     user = create_random_user(session=session)
 
@@ -84,3 +110,171 @@ def test_delete_file_from_cache(session: Session) -> None:
     file_obj = redis.read_file_by_id_from_cache(file.id)
 
     assert not file_obj
+
+def test_delete_file_from_cache_keeps_owner_index(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    file_1 = create_random_file(session=session, owner_id=user.id)
+    file_2 = create_random_file(session=session, owner_id=user.id)
+
+    assert file_1
+    assert file_2
+
+    redis.write_file_to_cache(file_1.id, file_1.owner_id, jsonable_encoder(file_1))
+    redis.write_file_to_cache(file_2.id, file_2.owner_id, jsonable_encoder(file_2))
+
+    redis.delete_file_from_cache(file_1.id)
+
+    assert redis.exists(f"file:{file_1.id}") == 0
+    assert redis.read_file_count_by_owner_id_from_cache(user.id) == 1
+    assert redis.read_files_by_owner_id_from_cache(user.id)[0]["id"] == file_2.id
+
+def test_read_file_by_id_from_cache_tiers(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    before = redis.metrics.snapshot()
+
+    redis.read_file_by_id_from_cache(file.id)
+    redis.read_file_by_id_from_cache(file.id)
+
+    after = redis.metrics.snapshot()
+
+    assert after["l1_misses"] - before["l1_misses"] == 1
+    assert after["l2_hits"] - before["l2_hits"] == 1
+    assert after["l1_hits"] - before["l1_hits"] == 1
+
+def test_write_file_to_cache_invalidates_other_workers(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    worker = RedisInstance()
+    worker.connect()
+
+    try:
+        assert worker.read_file_by_id_from_cache(file.id)["name"] == file.name
+        assert worker.local.get(f"file:{file.id}")
+
+        file_obj = jsonable_encoder(file)
+        file_obj["name"] = "renamed.txt"
+        redis.write_file_to_cache(file.id, file.owner_id, file_obj)
+
+        deadline = time.monotonic() + 5
+        while worker.local.get(f"file:{file.id}") and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert worker.read_file_by_id_from_cache(file.id)["name"] == "renamed.txt"
+    finally:
+        worker.disconnect()
+
+def test_read_file_by_id_from_cache_model(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+
+    file_obj = redis.read_file_by_id_from_cache(file.id, FilePublic)
+
+    assert isinstance(file_obj, FilePublic)
+    assert file_obj.id == file.id
+    assert file_obj.name == file.name
+
+    assert redis.read_file_by_id_from_cache(0, FilePublic) is None
+
+def test_read_file_by_id_from_cache_stale_format(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    redis.connection.hset(f"file:{file.id}", mapping={ # type: ignore
+        "owner_id": file.owner_id,
+        "data": json.dumps(jsonable_encoder(file)),
+    })
+    redis.local.delete(f"file:{file.id}")
+
+    assert redis.read_file_by_id_from_cache(file.id) == {}
+
+def test_single_flight_across_workers(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    worker = RedisInstance()
+    worker.connect()
+
+    barrier = threading.Barrier(6)
+    leaders = []
+
+    def load(instance: RedisInstance) -> None:
+        barrier.wait()
+        with instance.single_flight(f"file:{file.id}") as leader:
+            leaders.append(leader)
+            time.sleep(0.1)
+
+    try:
+        threads = [threading.Thread(target=load, args=(instance,)) for instance in [redis, worker] * 3]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        worker.disconnect()
+
+    assert leaders.count(True) == 1
+    assert redis.exists(f"lock:file:{file.id}") == 0
+
+def test_read_file_by_id_from_cache_refreshes_early(session: Session, monkeypatch) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+
+    monkeypatch.setattr(settings, "CACHE_REFRESH_DELTA", timedelta(hours=1))
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+
+    assert redis.read_file_by_id_from_cache(file.id)
+
+    redis.local.delete(f"file:{file.id}")
+    monkeypatch.setattr(random, "random", lambda: 0.999999)
+
+    assert redis.read_file_by_id_from_cache(file.id) == {}
+    assert redis.exists(f"file:{file.id}") == 1
+
+def test_write_tombstone_to_cache(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    redis.delete_file_from_cache(file.id)
+    redis.write_tombstone_to_cache(f"file:{file.id}")
+
+    assert redis.read_file_by_id_from_cache(file.id) is TOMBSTONE
+    assert redis.read_file_by_id_from_cache(file.id, FilePublic) is TOMBSTONE
+
+    redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+
+    assert redis.exists(f"missing:file:{file.id}") == 0
+    assert redis.read_file_by_id_from_cache(file.id)["id"] == file.id
+
+def test_delete_file_from_cache_after_file_expired(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    files = [create_random_file(session=session, owner_id=user.id) for _ in range(3)]
+    for file in files:
+        redis.write_file_to_cache(file.id, file.owner_id, jsonable_encoder(file))
+
+    # The file hashes expire on their own, before the owner's index does
+    redis.connection.delete(*[f"file:{file.id}" for file in files]) # type: ignore
+
+    redis.delete_file_from_cache(files[0].id, user.id)
+    redis.delete_files_from_cache([files[1].id], [user.id])
+
+    assert redis.read_file_count_by_owner_id_from_cache(user.id) == 1
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from app.cache.local import LocalCache, SingleFlight
+
+def test_local_cache_evicts_least_recently_used() -> None:
+    cache = LocalCache(maxsize=2, ttl=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_local_cache_expires_entries() -> None:
+    cache = LocalCache(maxsize=2, ttl=60)
+
+    cache.set("a", 1, ttl=0.01)
+    cache.set("b", 2)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+def test_local_cache_delete_where() -> None:
+    cache = LocalCache(maxsize=4, ttl=60)
+
+    for key in range(4):
+        cache.set(key, key)
+
+    cache.delete_where(lambda value: value % 2 == 0)
+
+    assert [cache.get(key) for key in range(4)] == [None, 1, None, 3]
+
+def test_single_flight_serialises_callers() -> None:
+    flights = SingleFlight()
+    barrier = threading.Barrier(4)
+    waited = []
+
+    def load() -> None:
+        barrier.wait()
+        with flights.acquire("a") as result:
+            waited.append(result)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(waited) == [False, True, True, True]
+    assert not flights.flights
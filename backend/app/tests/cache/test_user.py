@@ -1,7 +1,12 @@
+import time
+
 from sqlalchemy.orm import Session
 from fastapi.encoders import jsonable_encoder
 
 from app.cache.core import redis_db as redis
+from app.core.config import settings
+from app.core.security import principal_cache
+from app.models.user import User
 from app.tests.utils.user import create_random_user
 
 def test_write_user_to_cache(session: Session) -> None:
@@ -55,3 +60,23 @@ def test_delete_user_from_cache(session: Session) -> None:
     user_obj = redis.read_user_by_id_from_cache(user.id)
 
     assert not user_obj
+
+def test_revoke_principals_reaches_other_workers(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    principal_cache.set("token", User(id=user.id, email=user.email, token_version=0))
+    principal_cache.set("other-token", User(id=user.id + 1, email="other@example.com", token_version=0))
+
+    # As published by revoke_principals on another worker
+    redis.connection.publish(settings.REDIS_INVALIDATION_CHANNEL, f"principal:{user.id}") # type: ignore
+
+    deadline = time.monotonic() + 5
+    while principal_cache.get("token") and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert not principal_cache.get("token")
+    assert principal_cache.get("other-token")
+
+    principal_cache.clear()
@@ -1,14 +1,27 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from contextlib import nullcontext
+from unittest.mock import patch
 
 import pytest
 from fastapi.testclient import TestClient
+from moto.server import ThreadedMotoServer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.main import app
-from app.tests.core.database import SessionTesting, engine, init_db
-from app.api.dependencies import get_database_session
+from app.tests.core.database import (
+    AsyncSessionTesting,
+    SessionTesting,
+    async_engine,
+    engine,
+    init_async_db,
+    init_db,
+)
+from app.api.dependencies import get_database_session, get_session_factory
 from app.tests.utils.user import get_user_token_headers
-from app.cache.core import redis_db as redis
+from app.cache.core import async_redis_db as async_redis, redis_db as redis
+from app.core.config import settings
+from app.storage.core import S3Instance, storage
 
 # TODO: create a generator for our redis module
 
@@ -40,17 +53,71 @@ def session() -> Generator[Session, None, None]:
 
     redis.disconnect()
 
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+@pytest.fixture
+async def async_session(anyio_backend) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Each async test gets a fresh in-memory database, and the cache is flushed
+    around it so its ids cannot collide with the sync tests' cached rows.
+    """
+    await init_async_db()
+    await async_redis.connect()
+    await async_redis.flushall()
+
+    async with AsyncSessionTesting() as session:
+        yield session
+
+    await async_redis.flushall()
+    await async_redis.disconnect()
+    await async_engine.dispose()
+
 @pytest.fixture(scope="module")
 def client(session) -> Generator[TestClient, None, None]:
     def override_get_database_session():
         yield session
+
+    def override_get_session_factory():
+        return lambda: nullcontext(session)
     
     app.dependency_overrides[get_database_session] = override_get_database_session
+    app.dependency_overrides[get_session_factory] = override_get_session_factory
 
     yield TestClient(app)
 
     del app.dependency_overrides[get_database_session]
+    del app.dependency_overrides[get_session_factory]
 
 @pytest.fixture(scope="module")
 def user_token_headers(client: TestClient) -> dict[str, str]:
     return get_user_token_headers(client)
+
+@pytest.fixture(scope="session")
+def s3() -> Generator[S3Instance, None, None]:
+    """
+    Point the storage module at a moto server standing in for S3, with the
+    file bucket created.
+    """
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+
+    with patch.multiple(
+        settings,
+        S3_ENDPOINT_URL=f"http://{host}:{port}",
+        S3_ACCESS_KEY_ID="testing",
+        S3_SECRET_ACCESS_KEY="testing",
+    ):
+        storage.connect()
+        storage.client.create_bucket( # type: ignore
+            Bucket=storage.bucket,
+            CreateBucketConfiguration={"LocationConstraint": settings.S3_REGION},
+        )
+
+        yield storage
+
+        storage.disconnect()
+
+    server.stop()
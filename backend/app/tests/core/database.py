@@ -1,4 +1,8 @@
-from sqlalchemy import create_engine, select
+from collections.abc import Generator
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -19,6 +23,13 @@ SessionTesting = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 model_base.Base.metadata.create_all(bind=engine)
 
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_TESTING_ASYNC_DATABASE_URI),
+    poolclass=StaticPool,
+)
+
+AsyncSessionTesting = async_sessionmaker(async_engine, expire_on_commit=False)
+
 def init_db(session: Session) -> None:
 
     user = session.scalars(
@@ -32,3 +43,33 @@ def init_db(session: Session) -> None:
         )
         user = user_crud.create_user(session=session, user_create=user_in)
 
+async def init_async_db() -> None:
+    async with async_engine.begin() as connection:
+        await connection.run_sync(model_base.Base.metadata.create_all)
+
+@contextmanager
+def capture_query_plans(session: Session) -> Generator[list[str], None, None]:
+    """
+    Collect the SQLite query plan of every SELECT executed inside the block.
+    The yielded list is filled once the block exits.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+    plans: list[str] = []
+    try:
+        yield plans
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    for statement, parameters in statements:
+        rows = session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).all()
+
+        plans.append(" | ".join(row[-1] for row in rows))
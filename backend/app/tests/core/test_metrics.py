@@ -0,0 +1,93 @@
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.cache.core import redis_db as redis
+from app.core.metrics import instrument_methods, registry, track_round_trips
+from app.tests.utils.file import create_random_file
+
+def sample(name: str, **labels: str) -> float | None:
+    return registry.get_sample_value(name, labels)
+
+def test_request_metrics(
+    client: TestClient, session: Session, user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    file = create_random_file(session=session, owner_id=r.json()["id"])
+    route = f"{settings.API_V1_STR}/files/{{file_id}}"
+
+    before = sample("http_requests_total", method="GET", route=route, status="200") or 0
+
+    for _ in range(2):
+        r = client.get(f"{settings.API_V1_STR}/files/{file.id}", headers=user_token_headers)
+
+        assert r.status_code == 200
+
+    # Both reads share the route template's series
+    assert sample("http_requests_total", method="GET", route=route, status="200") == before + 2
+    assert sample("http_request_duration_seconds_count", method="GET", route=route) >= 2 # type: ignore
+    assert sample("http_requests_in_flight", method="GET", route=route) == 0
+
+    # Reads were served from the cache, an update always reaches the database
+    queries_before = sample("http_request_db_queries_total", method="PUT", route=route) or 0
+
+    r = client.put(f"{settings.API_V1_STR}/files/{file.id}", headers=user_token_headers, json={"size": 10})
+
+    assert r.status_code == 200
+    assert sample("http_request_db_queries_total", method="PUT", route=route) > queries_before # type: ignore
+    assert sample("http_request_db_duration_seconds_count", method="PUT", route=route) >= 1 # type: ignore
+    assert sample("db_query_duration_seconds_count", operation="SELECT") > 0 # type: ignore
+    assert sample("cache_operation_duration_seconds_count", instance="sync", method="read_file_by_id_from_cache") >= 2 # type: ignore
+
+    r = client.get(f"{settings.API_V1_STR}/files/not-an-id/missing", headers=user_token_headers)
+
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1 # type: ignore
+
+def test_metrics_endpoint(client: TestClient) -> None:
+    r = client.get("/metrics")
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+
+    families = {family.name: family for family in text_string_to_metric_families(r.text)}
+
+    assert "http_request_duration_seconds" in families
+    assert "cache_lookups" in families
+    assert {sample.labels["result"] for sample in families["cache_lookups"].samples} == {"hit", "miss"}
+    assert "password_hasher_completed" in families
+
+def test_instrument_methods_errors() -> None:
+    class Cache():
+        def read(self) -> None:
+            raise ConnectionError
+
+    instrument_methods(Cache, "test")
+    instrument_methods(Cache, "test")
+
+    for _ in range(2):
+        try:
+            Cache().read()
+        except ConnectionError:
+            pass
+
+    # Instrumenting twice does not time calls twice
+    assert sample("cache_operation_errors_total", instance="test", method="read") == 2
+    assert sample("cache_operation_duration_seconds_count", instance="test", method="read") == 2
+
+def test_track_round_trips(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    with track_round_trips() as trips:
+        redis.connection.get("missing") # type: ignore
+
+        pipe = redis.connection.pipeline(transaction=True) # type: ignore
+        for _ in range(10):
+            pipe.get("missing")
+        pipe.execute()
+
+        session.get(type(file), file.id, populate_existing=True)
+
+    # A pipeline is one round trip however many commands it holds
+    assert trips.redis_round_trips == 2
+    assert trips.db_queries == 1
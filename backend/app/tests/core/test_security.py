@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from app.core.security import PasswordHasher, PasswordHasherBusy, verify_password
+
+def test_password_hasher_hash_and_verify() -> None:
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+
+    hashed_password = hasher.hash("password")
+
+    assert verify_password("password", hashed_password)
+    assert hasher.verify("password", hashed_password)
+    assert not hasher.verify("wrong", hashed_password)
+    assert hasher.metrics()["completed"] == 3
+
+def test_password_hasher_rejects_when_queue_is_full() -> None:
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    running = hasher.submit(release.wait)
+    queued = hasher.submit(release.wait)
+
+    with pytest.raises(PasswordHasherBusy):
+        hasher.submit(release.wait)
+
+    assert hasher.metrics()["in_flight"] == 2
+
+    release.set()
+    running.result()
+    queued.result()
+
+    metrics = hasher.metrics()
+    assert metrics["rejected"] == 1
+    assert metrics["completed"] == 2
+    assert metrics["in_flight"] == 0
+
+    # Slots are returned once work finishes
+    assert hasher.submit(release.wait).result()
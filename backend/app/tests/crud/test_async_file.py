@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.core import async_redis_db as async_redis
+from app.crud.file import async_file_crud
+from app.crud.user import async_user_crud
+from app.schemas.file import FileCreate, FileUpdate
+from app.schemas.user import UserCreate
+from app.tests.utils.utils import random_email, random_lower_string, random_name
+
+pytestmark = pytest.mark.anyio
+
+async def create_random_user(session: AsyncSession) -> int:
+    user_in = UserCreate(email=random_email(), password=random_lower_string(32))
+    user = await async_user_crud.create_user(session=session, user_create=user_in)
+
+    return user.id
+
+async def create_random_file(session: AsyncSession, owner_id: int, name: str | None = None) -> int:
+    file_in = FileCreate(name=name or random_name(), access_key=random_lower_string(32), size=548)
+    file = await async_file_crud.create_file(session=session, file_in=file_in, owner_id=owner_id)
+
+    return file.id
+
+async def test_create_file(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+
+    names = []
+    for _ in range(2):
+        file_in = FileCreate(name="file.png", access_key=random_lower_string(32))
+        file = await async_file_crud.create_file(session=async_session, file_in=file_in, owner_id=user_id)
+        names.append(file.name)
+
+    assert names == ["file.png", "file_1.png"]
+
+async def test_read_file(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+    file_id = await create_random_file(async_session, user_id)
+
+    file = await async_file_crud.read_file(session=async_session, id=file_id)
+
+    assert file
+    assert file.id == file_id
+    assert file.owner_id == user_id
+
+async def test_read_file_single_flight(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+    file_id = await create_random_file(async_session, user_id)
+
+    await async_redis.delete_file_from_cache(file_id)
+    before = async_redis.metrics.snapshot()
+
+    files = await asyncio.gather(*(
+        async_file_crud.read_file(session=async_session, id=file_id) for _ in range(5)
+    ))
+
+    after = async_redis.metrics.snapshot()
+
+    assert all(file.id == file_id for file in files)
+    # The four callers that waited for the loader are served from the cache
+    hits = after["l1_hits"] + after["l2_hits"] - before["l1_hits"] - before["l2_hits"]
+    assert hits == 4
+
+async def test_read_usage_by_owner_id(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+    file_ids = [await create_random_file(async_session, user_id) for _ in range(2)]
+
+    await async_file_crud.delete_file(session=async_session, file_id=file_ids[0])
+
+    usage = await async_file_crud.read_usage_by_owner_id(session=async_session, user_id=user_id)
+
+    assert usage.file_count == 1
+    assert usage.storage_used == 548
+    assert await async_file_crud.read_file_count_by_owner_id(session=async_session, user_id=user_id) == 1
+
+async def test_create_read_delete_files(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+
+    files_in = [FileCreate(name="file.png", access_key=random_lower_string(32), size=1) for _ in range(3)]
+    files = await async_file_crud.create_files(session=async_session, files_in=files_in, owner_id=user_id)
+    ids = [file.id for file in files]
+
+    assert [file.name for file in files] == ["file.png", "file_1.png", "file_2.png"]
+
+    read_files = await async_file_crud.read_files(session=async_session, ids=ids[::-1])
+
+    assert [file.id for file in read_files] == ids[::-1]
+
+    await async_file_crud.delete_files(session=async_session, file_ids=ids[:2])
+
+    remaining = await async_file_crud.read_files(session=async_session, ids=ids)
+
+    assert [file.id for file in remaining] == ids[2:]
+    assert await async_file_crud.read_file_count_by_owner_id(session=async_session, user_id=user_id) == 1
+
+async def test_read_all_files_by_owner_id(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+    file_ids = [await create_random_file(async_session, user_id) for _ in range(3)]
+
+    files = await async_file_crud.read_all_files_by_owner_id(
+        session=async_session, user_id=user_id, skip=1, limit=1
+    )
+    assert [file.id for file in files] == file_ids[1:2]
+
+    files = await async_file_crud.read_all_files_by_owner_id(
+        session=async_session, user_id=user_id, after_id=file_ids[0]
+    )
+    assert [file.id for file in files] == file_ids[1:]
+
+async def test_update_and_delete_file(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+    file_id = await create_random_file(async_session, user_id)
+
+    file = await async_file_crud.update_file(
+        session=async_session, file_id=file_id, file_in=FileUpdate(name="renamed.txt", size=10)
+    )
+    assert file.name == "renamed.txt"
+
+    await async_file_crud.delete_file(session=async_session, file_id=file_id)
+
+    assert await async_file_crud.read_file(session=async_session, id=file_id) is None
+
+async def test_create_files_sharing_blob(async_session: AsyncSession) -> None:
+    user_id = await create_random_user(async_session)
+    digest = random_lower_string(64)
+
+    files = [
+        await async_file_crud.create_file(
+            session=async_session,
+            file_in=FileCreate(name="copy.txt", access_key=random_lower_string(32), size=4),
+            owner_id=user_id,
+            digest=digest,
+        )
+        for _ in range(2)
+    ]
+
+    assert files[0].blob_id is not None
+    assert files[0].blob_id == files[1].blob_id
+    assert files[1].access_key == files[0].access_key
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.user import async_user_crud
+from app.schemas.user import UserCreate, UserUpdate
+from app.tests.utils.utils import random_email, random_lower_string
+
+pytestmark = pytest.mark.anyio
+
+async def test_create_and_read_user(async_session: AsyncSession) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string(32))
+    user = await async_user_crud.create_user(session=async_session, user_create=user_in)
+
+    read_user = await async_user_crud.read_user(session=async_session, id=user.id)
+    assert read_user
+    assert read_user.email == user.email
+
+    read_user = await async_user_crud.read_user_by_email(session=async_session, email=user.email)
+    assert read_user
+    assert read_user.id == user.id
+
+async def test_update_user(async_session: AsyncSession) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string(32))
+    user = await async_user_crud.create_user(session=async_session, user_create=user_in)
+
+    new_email = random_email()
+    updated_user = await async_user_crud.update_user(
+        session=async_session, user_id=user.id, user_in=UserUpdate(email=new_email)
+    )
+
+    assert updated_user.email == new_email
+    assert await async_user_crud.read_user_by_email(session=async_session, email=user_in.email) is None
+
+async def test_authenticate_and_delete_user(async_session: AsyncSession) -> None:
+    password = random_lower_string(32)
+    user_in = UserCreate(email=random_email(), password=password)
+    user = await async_user_crud.create_user(session=async_session, user_create=user_in)
+
+    assert await async_user_crud.authenticate(session=async_session, email=user.email, password=password)
+    assert not await async_user_crud.authenticate(session=async_session, email=user.email, password="wrong")
+
+    await async_user_crud.delete_user(session=async_session, user_id=user.id)
+
+    assert await async_user_crud.read_user(session=async_session, id=user.id) is None
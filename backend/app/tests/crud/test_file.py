@@ -1,8 +1,18 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from fastapi.encoders import jsonable_encoder
 
-from app.crud.file import file_crud
-from app.schemas.file import FileCreate, FileUpdate
+from app.cache.core import redis_db as redis
+from app.core.config import settings
+from app.crud.file import StorageQuotaExceeded, file_crud
+from app.crud.user import user_crud
+from app.models.blob import Blob
+from app.schemas.file import FileCreate, FilePublic, FileUpdate
+from app.storage.core import S3Instance, generate_key
+from app.storage.purge import StoragePurger
 from app.tests.utils.user import create_random_user
 from app.tests.utils.utils import random_name, random_lower_string
 from app.tests.utils.file import create_random_file
@@ -61,6 +71,177 @@ def test_read_file(session: Session) -> None:
     assert read_file.name == file.name
     assert jsonable_encoder(file) == jsonable_encoder(read_file)
 
+def test_read_file_model(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    redis.delete_file_from_cache(file.id)
+
+    from_database = file_crud.read_file(session=session, id=file.id, model=FilePublic)
+    from_cache = file_crud.read_file(session=session, id=file.id, model=FilePublic)
+
+    assert isinstance(from_database, FilePublic)
+    assert isinstance(from_cache, FilePublic)
+    assert from_database == from_cache
+    assert from_cache.name == file.name
+
+def test_read_file_missing(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    assert file
+
+    missing_id = file.id + 1_000_000
+
+    assert file_crud.read_file(session=session, id=missing_id) is None
+    assert redis.exists(f"missing:file:{missing_id}") == 1
+
+    before = redis.metrics.snapshot()["negative_hits"]
+
+    assert file_crud.read_file(session=session, id=missing_id) is None
+    assert file_crud.read_file(session=session, id=missing_id, model=FilePublic) is None
+    assert redis.metrics.snapshot()["negative_hits"] - before == 2
+
+def test_create_files(session: Session) -> None:
+    user = create_random_user(session=session)
+    existing = create_random_file(session=session, owner_id=user.id)
+
+    files_in = [
+        FileCreate(name=name, access_key=random_lower_string(32), size=10)
+        for name in ["batch.txt", "batch.txt", existing.name, "batch_1.txt"] + [random_name() for _ in range(46)]
+    ]
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(session.get_bind(), "before_cursor_execute", count_statement)
+    try:
+        files = file_crud.create_files(session=session, files_in=files_in, owner_id=user.id)
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", count_statement)
+
+    base, extension = existing.name.rsplit(".", 1)
+
+    assert len(statements) <= 5
+    assert [file.name for file in files[:4]] == [
+        "batch.txt", "batch_1.txt", f"{base}_1.{extension}", "batch_1_1.txt"
+    ]
+    assert [file.access_key for file in files] == [file_in.access_key for file_in in files_in]
+    assert redis.read_file_by_id_from_cache(files[-1].id)["name"] == files[-1].name
+
+    usage = file_crud.read_usage_by_owner_id(session=session, user_id=user.id)
+
+    assert usage.file_count == 51
+    assert usage.storage_used == existing.size + 500
+
+def test_generate_unique_names(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    for name in ["a.txt", "a.txt", "a_5.txt"]:
+        file_crud.create_file(
+            session=session,
+            file_in=FileCreate(name=name, access_key=random_lower_string(32)),
+            owner_id=user.id,
+        )
+
+    names = file_crud.generate_unique_names(
+        session=session, names=["a.txt", "b.txt", "a_6.txt", "a.txt", "b.txt"], owner_id=user.id
+    )
+
+    assert names == ["a_6.txt", "b.txt", "a_6_1.txt", "a_7.txt", "b_1.txt"]
+
+def test_read_files(session: Session) -> None:
+    user = create_random_user(session=session)
+    file_1 = create_random_file(session=session, owner_id=user.id)
+    file_2 = create_random_file(session=session, owner_id=user.id)
+
+    redis.delete_file_from_cache(file_2.id)
+
+    files = file_crud.read_files(session=session, ids=[file_2.id, 0, file_1.id, file_2.id])
+
+    assert [file.id for file in files] == [file_2.id, file_1.id]
+    assert redis.exists(f"file:{file_2.id}") == 1
+
+    public = file_crud.read_files(session=session, ids=[file_1.id, file_2.id], model=FilePublic)
+
+    assert all(isinstance(file, FilePublic) for file in public)
+    assert [file.name for file in public] == [file_1.name, file_2.name]
+
+def test_delete_files(session: Session) -> None:
+    user = create_random_user(session=session)
+    files = [create_random_file(session=session, owner_id=user.id) for _ in range(3)]
+    ids = [file.id for file in files[:2]]
+
+    file_crud.delete_files(session=session, file_ids=ids)
+
+    assert file_crud.read_files(session=session, ids=ids) == []
+    assert redis.read_file_count_by_owner_id_from_cache(user.id) == 1
+    assert file_crud.read_file_count_by_owner_id(session=session, user_id=user.id) == 1
+
+def test_create_and_delete_files_sharing_blob(session: Session, s3: S3Instance) -> None:
+    user = create_random_user(session=session)
+    access_keys = [generate_key(user.id, "copy.txt") for _ in range(2)]
+    for access_key in access_keys:
+        s3.client.put_object(Bucket=s3.bucket, Key=access_key, Body=b"same") # type: ignore
+
+    digest = random_lower_string(64)
+    files = [
+        file_crud.create_file(
+            session=session,
+            file_in=FileCreate(name="copy.txt", access_key=access_key, size=4),
+            owner_id=user.id,
+            digest=digest,
+        )
+        for access_key in access_keys
+    ]
+
+    assert files[0].blob_id == files[1].blob_id
+    assert files[1].access_key == access_keys[0]
+    assert session.get(Blob, files[0].blob_id).ref_count == 2 # type: ignore
+
+    blob_id = files[0].blob_id
+    redis.connection.delete("storage:delete:s3") # type: ignore
+    file_crud.delete_file(session=session, file_id=files[0].id)
+
+    assert session.get(Blob, blob_id).ref_count == 1 # type: ignore
+
+    file_crud.delete_files(session=session, file_ids=[files[1].id])
+
+    assert session.get(Blob, blob_id) is None
+    assert redis.connection.lrange("storage:delete:s3", 0, -1) == [access_keys[0]] # type: ignore
+
+    StoragePurger(s3).purge()
+
+    assert "Contents" not in s3.client.list_objects_v2(Bucket=s3.bucket, Prefix=access_keys[0]) # type: ignore
+
+def test_delete_files_without_blob(session: Session) -> None:
+    """
+    Objects registered without a blob are queued for deletion with the last
+    file that refers to them.
+    """
+    user = create_random_user(session=session)
+    access_keys = [generate_key(user.id, "file.txt") for _ in range(2)]
+    files = [
+        file_crud.create_file(
+            session=session,
+            file_in=FileCreate(name="file.txt", access_key=access_key, size=4),
+            owner_id=user.id,
+        )
+        for access_key in [*access_keys, access_keys[1], access_keys[1]]
+    ]
+    queue = f"storage:delete:{settings.STORAGE_BACKEND}"
+    redis.connection.delete(queue) # type: ignore
+
+    file_crud.delete_file(session=session, file_id=files[0].id)
+    file_crud.delete_files(session=session, file_ids=[files[1].id])
+
+    assert redis.connection.lrange(queue, 0, -1) == [access_keys[0]] # type: ignore
+
+    user_crud.delete_user(session=session, user_id=user.id)
+
+    assert redis.connection.lrange(queue, 0, -1) == access_keys # type: ignore
+
 def test_read_file_by_name(session: Session) -> None:
     file = create_random_file(session=session)
 
@@ -111,6 +292,94 @@ def test_read_file_count_by_owner_id(session: Session) -> None:
 
     assert count == 2
 
+def test_read_usage_by_owner_id(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    file_1 = create_random_file(session=session, owner_id=user.id)
+    file_2 = create_random_file(session=session, owner_id=user.id)
+
+    usage = file_crud.read_usage_by_owner_id(session=session, user_id=user.id)
+
+    assert usage.file_count == 2
+    assert usage.storage_used == file_1.size + file_2.size
+
+    file_crud.update_file(session=session, file_id=file_1.id, file_in=FileUpdate(size=100))
+    file_crud.delete_file(session=session, file_id=file_2.id)
+
+    cached = file_crud.read_usage_by_owner_id(session=session, user_id=user.id)
+
+    assert cached.file_count == 1
+    assert cached.storage_used == 100
+
+    # The counters on the user row agree with the cached ones
+    redis.connection.delete(f"usage:{user.id}") # type: ignore
+
+    assert file_crud.read_usage_by_owner_id(session=session, user_id=user.id) == cached
+
+def test_read_usage_by_owner_id_keeps_concurrent_changes(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    create_random_file(session=session, owner_id=user.id)
+    redis.connection.delete(f"usage:{user.id}") # type: ignore
+
+    # A file created between the miss and the database read of another
+    # request, whose stale counters must not be cached
+    usage, version = redis.read_usage_from_cache(user.id)
+    assert not usage
+
+    file = create_random_file(session=session, owner_id=user.id)
+    redis.write_usage_to_cache(user.id, 1, 0, version)
+
+    assert redis.read_usage_from_cache(user.id)[0] == {}
+
+    usage = file_crud.read_usage_by_owner_id(session=session, user_id=user.id)
+
+    assert usage.file_count == 2
+    assert redis.read_usage_from_cache(user.id)[0]["storage_used"] == usage.storage_used >= file.size
+
+def test_create_files_storage_quota_exceeded(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    files_in = [FileCreate(name=random_name(), access_key=random_lower_string(32), size=60) for _ in range(2)]
+
+    with patch("app.core.config.settings.USER_STORAGE_QUOTA", 100):
+        file_crud.create_file(session=session, file_in=files_in[0], owner_id=user.id)
+
+        with pytest.raises(StorageQuotaExceeded):
+            file_crud.create_file(session=session, file_in=files_in[1], owner_id=user.id)
+
+        with pytest.raises(StorageQuotaExceeded):
+            file_crud.create_files(session=session, files_in=files_in, owner_id=user.id)
+
+    usage = file_crud.read_usage_by_owner_id(session=session, user_id=user.id)
+
+    assert usage.file_count == 1
+    assert usage.storage_used == 60
+
+def test_update_file_storage_quota_exceeded(session: Session) -> None:
+    user = create_random_user(session=session)
+    file = file_crud.create_file(
+        session=session,
+        file_in=FileCreate(name=random_name(), access_key=random_lower_string(32), size=60),
+        owner_id=user.id,
+    )
+
+    with patch("app.core.config.settings.USER_STORAGE_QUOTA", 100):
+        with pytest.raises(StorageQuotaExceeded):
+            file_crud.update_file(session=session, file_id=file.id, file_in=FileUpdate(size=101))
+
+        file_crud.update_file(session=session, file_id=file.id, file_in=FileUpdate(size=100))
+
+    usage = file_crud.read_usage_by_owner_id(session=session, user_id=user.id)
+
+    assert usage.storage_used == 100
+
 def test_update_file(session: Session) -> None:
     file = create_random_file(session=session)
 
@@ -139,3 +408,66 @@ def test_delete_file(session: Session) -> None:
     result = file_crud.read_file_by_name(session=session, name=file.name, owner_id=user.id)
 
     assert result is None
+
+def test_read_all_files_by_owner_id_paginated(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    file_ids = [create_random_file(session=session, owner_id=user.id).id for _ in range(3)]
+
+    file_list = file_crud.read_all_files_by_owner_id(session=session, user_id=user.id, skip=1, limit=1)
+
+    assert [file.id for file in file_list] == file_ids[1:2]
+
+    file_list = file_crud.read_all_files_by_owner_id(session=session, user_id=user.id, skip=0, limit=25)
+
+    assert [file.id for file in file_list] == file_ids
+
+def test_read_all_files_by_owner_id_after_id(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    file_ids = [create_random_file(session=session, owner_id=user.id).id for _ in range(3)]
+
+    file_list = file_crud.read_all_files_by_owner_id(
+        session=session, user_id=user.id, limit=2, after_id=file_ids[0]
+    )
+
+    assert [file.id for file in file_list] == file_ids[1:]
+
+def test_create_file_duplicate_name(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    names = []
+    for _ in range(3):
+        file_in = FileCreate(name="notes", access_key=random_lower_string(32))
+        names.append(file_crud.create_file(session=session, file_in=file_in, owner_id=user.id).name)
+
+    assert names == ["notes", "notes_1", "notes_2"]
+
+def test_generate_unique_name(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    for name in ["100%_a.txt", "100%_a_7.txt", "100%_a_x.txt", "100%_ab_9.txt"]:
+        file_in = FileCreate(name=name, access_key=random_lower_string(32))
+        file_crud.create_file(session=session, file_in=file_in, owner_id=user.id)
+
+    assert file_crud.generate_unique_name(session=session, name="100%_a.txt", owner_id=user.id) == "100%_a_8.txt"
+    assert file_crud.generate_unique_name(session=session, name="free.txt", owner_id=user.id) == "free.txt"
+
+def test_generate_unique_name_ignores_oversized_suffix(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    assert user
+
+    for name in ["a.txt", f"a_{'9' * 20}.txt"]:
+        file_in = FileCreate(name=name, access_key=random_lower_string(32))
+        file_crud.create_file(session=session, file_in=file_in, owner_id=user.id)
+
+    assert file_crud.generate_unique_name(session=session, name="a.txt", owner_id=user.id) == "a_1.txt"
@@ -0,0 +1,52 @@
+from sqlalchemy.orm import Session
+
+from app.cache.core import redis_db as redis
+from app.crud.file import file_crud
+from app.tests.core.database import capture_query_plans
+from app.tests.utils.file import create_random_file
+from app.tests.utils.user import create_random_user
+
+def test_read_file_by_name_uses_owner_name_index(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    with capture_query_plans(session) as plans:
+        file_crud.read_file_by_name(session=session, name=file.name, owner_id=file.owner_id)
+
+    assert len(plans) == 1
+    assert "USING INDEX ix_file_owner_id_name (owner_id=? AND name=?)" in plans[0]
+
+def test_read_file_count_by_owner_id_uses_user_primary_key(session: Session) -> None:
+    user = create_random_user(session=session)
+
+    # Drop the cached counters so the count is read from the user row
+    redis.connection.delete(f"usage:{user.id}") # type: ignore
+
+    with capture_query_plans(session) as plans:
+        file_crud.read_file_count_by_owner_id(session=session, user_id=user.id)
+
+    assert len(plans) == 1
+    assert "SEARCH user USING INTEGER PRIMARY KEY (rowid=?)" in plans[0]
+
+def test_read_all_files_by_owner_id_uses_owner_id_index(session: Session) -> None:
+    user = create_random_user(session=session)
+    create_random_file(session=session, owner_id=user.id)
+
+    # Drop the cached owner index so the listing is served by the database
+    redis.connection.delete(f"owner_id:{user.id}") # type: ignore
+
+    with capture_query_plans(session) as plans:
+        file_crud.read_all_files_by_owner_id(session=session, user_id=user.id, after_id=0)
+
+    assert "USING INDEX ix_file_owner_id_id (owner_id=? AND id>?)" in plans[-1]
+    assert "TEMP B-TREE" not in plans[-1]
+
+def test_generate_unique_name_uses_owner_name_index(session: Session) -> None:
+    file = create_random_file(session=session)
+
+    with capture_query_plans(session) as plans:
+        file_crud.generate_unique_name(session=session, name=file.name, owner_id=file.owner_id)
+
+    assert plans
+    for plan in plans:
+        assert "SCAN file" not in plan
+        assert "ix_file_owner_id_name" in plan
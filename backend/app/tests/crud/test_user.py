@@ -1,9 +1,12 @@
 from sqlalchemy.orm import Session
 from fastapi.encoders import jsonable_encoder
+from app.cache.core import redis_db as redis
 from app.core.security import verify_password
 
+from app.crud.file import file_crud
 from app.crud.user import user_crud
 from app.schemas.user import UserCreate, UserUpdate
+from app.tests.utils.file import create_random_file
 from app.tests.utils.user import create_random_user
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -42,6 +45,27 @@ def test_read_user_by_email(session: Session) -> None:
     assert user.email == read_user.email
     assert jsonable_encoder(user) == jsonable_encoder(read_user)
 
+def test_read_user_by_email_missing(session: Session) -> None:
+    email = random_email()
+
+    assert user_crud.read_user_by_email(session=session, email=email) is None
+    assert redis.exists(f"missing:email:{email}") == 1
+
+    before = redis.metrics.snapshot()["negative_hits"]
+
+    assert user_crud.read_user_by_email(session=session, email=email) is None
+    assert redis.metrics.snapshot()["negative_hits"] - before == 1
+
+    user_in = UserCreate(email=email, password=random_lower_string(32))
+    user = user_crud.create_user(session=session, user_create=user_in)
+
+    assert redis.exists(f"missing:email:{email}") == 0
+
+    read_user = user_crud.read_user_by_email(session=session, email=email)
+
+    assert read_user
+    assert read_user.id == user.id
+
 def test_update_user(session: Session) -> None:
     user = create_random_user(session=session)
 
@@ -78,6 +102,16 @@ def test_delete_user(session: Session) -> None:
 
     assert result is None
 
+def test_delete_user_with_files(session: Session) -> None:
+    user = create_random_user(session=session)
+    file_ids = [create_random_file(session=session, owner_id=user.id).id for _ in range(3)]
+
+    user_crud.delete_user(session=session, user_id=user.id)
+
+    assert user_crud.read_user(session=session, id=user.id) is None
+    assert file_crud.read_files(session=session, ids=file_ids) == []
+    assert redis.exists(f"owner_id:{user.id}", f"usage:{user.id}", f"file:{file_ids[0]}") == 0
+
 def test_authenticate_user(session: Session) -> None:
     email = random_email()
     password = random_lower_string(32)
@@ -0,0 +1,45 @@
+import io
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.storage.archive import ArchiveEntry, iter_zip
+from app.storage.local import local_storage
+
+def test_iter_zip(tmp_path: Path) -> None:
+    contents = {f"file_{i}.bin": bytes([i]) * (i * 1000) for i in range(10)}
+    entries = [ArchiveEntry(name, name, datetime(2024, 6, 1, 12, 30)) for name in contents]
+
+    with patch.multiple(
+        "app.core.config.settings",
+        STORAGE_LOCAL_PATH=str(tmp_path),
+        STORAGE_STREAM_CHUNK_SIZE=512,
+        ARCHIVE_PREFETCH_FILES=3,
+        ARCHIVE_PREFETCH_CHUNKS=2,
+    ):
+        for name, content in contents.items():
+            local_storage.put(name, content)
+
+        chunks = list(iter_zip(local_storage, entries))
+
+    # The archive is sent in pieces, not buffered as a whole
+    assert max(len(chunk) for chunk in chunks) < 1024
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(contents)
+        assert archive.getinfo("file_1.bin").date_time == (2024, 6, 1, 12, 30, 0)
+        for name, content in contents.items():
+            assert archive.read(name) == content
+
+def test_iter_zip_missing_object(tmp_path: Path) -> None:
+    entries = [ArchiveEntry("present", "present"), ArchiveEntry("missing", "missing")]
+
+    with patch("app.core.config.settings.STORAGE_LOCAL_PATH", str(tmp_path)):
+        local_storage.put("present", b"data")
+
+        with pytest.raises(FileNotFoundError):
+            list(iter_zip(local_storage, entries))
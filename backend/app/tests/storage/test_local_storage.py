@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.storage.core import S3Instance
+from app.storage.engine import storage_engine
+from app.storage.local import local_storage
+
+@pytest.fixture
+def root(tmp_path: Path):
+    with patch.multiple(
+        "app.core.config.settings", STORAGE_LOCAL_PATH=str(tmp_path), STORAGE_STREAM_CHUNK_SIZE=4
+    ):
+        yield tmp_path
+
+def test_storage_engine(s3: S3Instance) -> None:
+    assert storage_engine() is s3
+    assert storage_engine("local") is local_storage
+
+    with pytest.raises(ValueError):
+        storage_engine("ftp")
+
+def test_put_get_stat_delete(root: Path) -> None:
+    key = "7/2024-06-01/0123abcd.txt"
+
+    assert local_storage.stat(key) is None
+    assert local_storage.get(key) is None
+
+    local_storage.put(key, b"0123456789")
+    local_storage.put("other", io.BytesIO(b"from a file"))
+
+    # Objects are named by their key and sharded by it's hash
+    path = Path(local_storage.path(key))
+    digest = hashlib.sha256(key.encode()).hexdigest()
+
+    assert path == root / digest[:2] / digest[2:4] / "7%2F2024-06-01%2F0123abcd.txt"
+    assert path.read_bytes() == b"0123456789"
+    assert Path(local_storage.path("..")).name == "%2E."
+    assert sorted(key for key, _ in local_storage.list_objects()) == ["7/2024-06-01/0123abcd.txt", "other"]
+
+    assert local_storage.stat(key).size == 10 # type: ignore
+    assert local_storage.get(key) == b"0123456789"
+    assert local_storage.get("other") == b"from a file"
+    assert list(local_storage.iter_range(key, 3, 8)) == [b"3456", b"78"]
+
+    local_storage.delete(key)
+    local_storage.delete_objects(["other", "missing"])
+
+    assert local_storage.stat(key) is None
+    assert local_storage.stat("other") is None
+
+def test_put_is_atomic(root: Path) -> None:
+    local_storage.put("key", b"before")
+
+    def chunks():
+        yield b"after"
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        local_storage.write(local_storage.path("key"), chunks())
+
+    # The old object is left whole and the temporary file is cleaned up
+    assert local_storage.get("key") == b"before"
+    assert os.listdir(os.path.dirname(local_storage.path("key"))) == [os.path.basename(local_storage.path("key"))]
+
+def test_multipart_upload(root: Path) -> None:
+    upload_id = local_storage.create_multipart_upload("video.mp4")
+
+    etags = [
+        (part_number, local_storage.upload_part("video.mp4", upload_id, part_number, body))
+        for part_number, body in [(2, b"world"), (1, b"hello ")]
+    ]
+    local_storage.complete_multipart_upload("video.mp4", upload_id, etags)
+
+    assert local_storage.get("video.mp4") == b"hello world"
+    assert not os.path.exists(local_storage.upload_path(upload_id))
+
+    upload_id = local_storage.create_multipart_upload("aborted")
+    local_storage.upload_part("aborted", upload_id, 1, b"part")
+    local_storage.abort_multipart_upload("aborted", upload_id)
+
+    assert not os.path.exists(local_storage.upload_path(upload_id))
+    assert local_storage.stat("aborted") is None
@@ -0,0 +1,86 @@
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.cache.core import redis_db as redis
+from app.core.config import settings
+from app.storage.local import local_storage
+from app.storage.purge import StoragePurger
+from app.tests.utils.file import create_random_file
+
+QUEUE = "storage:delete:local"
+
+@pytest.fixture
+def purger(tmp_path: Path):
+    redis.connection.delete(QUEUE, f"{QUEUE}:retry", f"{QUEUE}:attempts") # type: ignore
+
+    with patch.multiple(settings, STORAGE_LOCAL_PATH=str(tmp_path), STORAGE_DELETE_BATCH_SIZE=2):
+        yield StoragePurger(local_storage)
+
+def test_purge_in_batches(purger: StoragePurger) -> None:
+    keys = [f"1/2024-06-01/{i}.txt" for i in range(3)]
+    for key in keys:
+        local_storage.put(key, b"data")
+
+    redis.enqueue_storage_deletes("local", keys)
+
+    assert purger.purge() == 2
+    assert [local_storage.stat(key) is None for key in keys] == [True, True, False]
+    assert purger.purge() == 1
+    assert purger.purge() == 0
+    assert local_storage.stat(keys[2]) is None
+
+def test_purge_retries_with_backoff(purger: StoragePurger) -> None:
+    local_storage.put("key", b"data")
+    redis.enqueue_storage_deletes("local", ["key"])
+
+    with patch.object(local_storage, "delete_objects", side_effect=OSError("disk busy")):
+        assert purger.purge() == 1
+
+    retry_at = redis.connection.zscore(f"{QUEUE}:retry", "key") # type: ignore
+
+    assert redis.connection.hget(f"{QUEUE}:attempts", "key") == "1" # type: ignore
+    assert time.time() < retry_at <= time.time() + settings.STORAGE_DELETE_RETRY_DELAY.total_seconds()
+
+    # The retry is not due yet
+    assert purger.purge() == 0
+
+    redis.connection.zadd(f"{QUEUE}:retry", {"key": 0}) # type: ignore
+
+    assert purger.purge() == 1
+    assert local_storage.stat("key") is None
+    assert redis.connection.exists(f"{QUEUE}:retry", f"{QUEUE}:attempts") == 0 # type: ignore
+
+def test_purge_gives_up_after_max_attempts(purger: StoragePurger) -> None:
+    redis.enqueue_storage_deletes("local", ["key"])
+
+    with patch.object(local_storage, "delete_objects", return_value=["key"]), \
+            patch.multiple(settings, STORAGE_DELETE_MAX_ATTEMPTS=2, STORAGE_DELETE_RETRY_DELAY=timedelta(0)):
+        assert purger.purge() == 1
+        assert purger.purge() == 1
+        assert purger.purge() == 0
+
+    assert redis.connection.exists(QUEUE, f"{QUEUE}:retry", f"{QUEUE}:attempts") == 0 # type: ignore
+
+def test_sweep_orphans(session: Session, purger: StoragePurger) -> None:
+    file = create_random_file(session=session)
+    for key in [file.access_key, "1/2024-06-01/orphan.txt", "1/2024-06-01/new.txt"]:
+        local_storage.put(key, b"data")
+
+    # Only objects older than the grace period are swept
+    old = time.time() - 2 * 24 * 3600
+    for key in [file.access_key, "1/2024-06-01/orphan.txt"]:
+        os.utime(local_storage.path(key), (old, old))
+
+    assert purger.sweep(session) == 1
+
+    purger.purge()
+
+    assert local_storage.stat("1/2024-06-01/orphan.txt") is None
+    assert local_storage.stat(file.access_key) is not None
+    assert local_storage.stat("1/2024-06-01/new.txt") is not None
@@ -0,0 +1,47 @@
+import httpx
+
+from app.storage.core import S3Instance, generate_key, is_owner_key
+
+def test_generate_key() -> None:
+    key = generate_key(7, "photo.tar.gz")
+
+    assert is_owner_key(key, 7)
+    assert not is_owner_key(key, 70)
+    assert key.endswith(".gz")
+    assert generate_key(7, "photo.tar.gz") != key
+
+def test_presigned_upload_and_download(s3: S3Instance) -> None:
+    key = generate_key(1, "notes.txt")
+
+    r = httpx.put(s3.presign_upload(key, "text/plain"), content=b"hello", headers={"Content-Type": "text/plain"})
+
+    assert r.status_code == 200
+
+    r = httpx.get(s3.presign_download(key, "notes.txt"))
+
+    assert r.status_code == 200
+    assert r.content == b"hello"
+    assert r.headers["content-disposition"] == 'attachment; filename="notes.txt"'
+
+def test_multipart_upload(s3: S3Instance) -> None:
+    key = generate_key(1, "video.mp4")
+    # Every part but the last must be at least 5 MiB
+    chunks = [b"a" * 5 * 1024 * 1024, b"b" * 1024]
+
+    upload_id = s3.create_multipart_upload(key, "video/mp4")
+    parts = s3.presign_parts(key, upload_id, range(1, len(chunks) + 1))
+
+    etags = []
+    for (part_number, url), chunk in zip(parts, chunks):
+        r = httpx.put(url, content=chunk)
+
+        assert r.status_code == 200
+        etags.append((part_number, r.headers["etag"]))
+
+    s3.complete_multipart_upload(key, upload_id, reversed(etags))
+
+    obj = s3.client.head_object(Bucket=s3.bucket, Key=key) # type: ignore
+
+    assert obj["ContentLength"] == sum(len(chunk) for chunk in chunks)
+    assert obj["ContentType"] == "video/mp4"
+    assert key in [key for key, _ in s3.list_objects()]
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import anyio
+import pytest
+
+from app.storage.core import ObjectStat
+from app.storage.local import local_storage
+from app.storage.streaming import (
+    ObjectResponse,
+    RangeNotSatisfiable,
+    if_range_matches,
+    parse_range,
+)
+
+def test_parse_range() -> None:
+    assert parse_range(None, 10) is None
+    assert parse_range("bytes=2-5", 10) == (2, 5)
+    assert parse_range("bytes=7-", 10) == (7, 9)
+    assert parse_range("bytes=4-100", 10) == (4, 9)
+    assert parse_range("bytes=-3", 10) == (7, 9)
+    assert parse_range("bytes=-30", 10) == (0, 9)
+    assert parse_range("bytes=0-1,4-5", 10) is None
+    assert parse_range("items=0-1", 10) is None
+
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=10-", 10)
+
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=5-2", 10)
+
+def test_if_range_matches() -> None:
+    modified = datetime(2024, 6, 1, 12, 0, 0, 500, tzinfo=timezone.utc)
+    stat = ObjectStat(10, '"abc"', modified)
+
+    assert if_range_matches(None, stat)
+    assert if_range_matches('"abc"', stat)
+    assert not if_range_matches('"abd"', stat)
+    assert not if_range_matches('W/"abc"', stat)
+    assert if_range_matches(format_datetime(modified, usegmt=True), stat)
+    assert not if_range_matches("Sat, 01 Jun 2024 12:00:01 GMT", stat)
+
+@pytest.mark.anyio
+async def test_object_response_zero_copy_send(tmp_path: Path) -> None:
+    messages = []
+
+    async def receive() -> dict:
+        await anyio.sleep_forever()
+        return {}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.zerocopysend":
+            with open(message["file"], "rb", closefd=False) as f:
+                f.seek(message["offset"])
+                message = {**message, "data": f.read(message["count"])}
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "extensions": {"http.response.zerocopysend": {}}}
+
+    with patch("app.core.config.settings.STORAGE_LOCAL_PATH", str(tmp_path)):
+        local_storage.put("object", b"0123456789")
+        await ObjectResponse(local_storage, "object", 3, 6, status_code=206)(scope, receive, send)
+
+    assert messages[0]["status"] == 206
+    assert (b"content-length", b"4") in messages[0]["headers"]
+    assert messages[1]["type"] == "http.response.zerocopysend"
+    assert messages[1]["data"] == b"3456"
@@ -0,0 +1,69 @@
+"""
+Compare encode and decode cost and bytes per entry of the cache codecs against
+the previous format, where a cached file was stored with json.dumps and read
+back through json.loads, File(**obj) and to_pydantic.
+
+Run from the backend directory:
+
+    python -m benchmarks.cache_codec
+"""
+import json
+import time
+
+from app.cache.codec import CODECS, MsgpackCodec, get_codec, msgpack
+from app.models.file import File
+from app.schemas.file import FilePublic
+from app.schemas.utils import to_pydantic
+
+ENTRIES = 10_000
+REPEAT = 5
+
+def entry(i: int) -> dict:
+    return {
+        "id": i,
+        "name": f"holiday_photo_{i}.jpeg",
+        "access_key": f"{i:032x}",
+        "size": 1_048_576 + i,
+        "owner_id": 42,
+        "created_at": "2024-06-01T12:00:00.123456+00:00",
+        "updated_at": "2024-06-02T08:30:00.654321+00:00",
+    }
+
+def timed(func) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best / ENTRIES * 1_000_000
+
+def main() -> None:
+    objs = [entry(i) for i in range(ENTRIES)]
+
+    print(f"{'format':>10} {'bytes':>7} {'encode us':>10} {'dict us':>10} {'public us':>10}")
+
+    legacy = [json.dumps(obj) for obj in objs]
+    print(
+        f"{'legacy':>10} {sum(map(len, legacy)) / ENTRIES:>7.0f} "
+        f"{timed(lambda: [json.dumps(obj) for obj in objs]):>10.2f} "
+        f"{timed(lambda: [json.loads(data) for data in legacy]):>10.2f} "
+        f"{timed(lambda: [to_pydantic(File(**json.loads(data)), FilePublic) for data in legacy]):>10.2f}"
+    )
+
+    for name, codec_class in CODECS.items():
+        if codec_class is MsgpackCodec and msgpack is None:
+            continue
+
+        codec = get_codec(name)
+        payloads = [codec.encode(obj) for obj in objs]
+
+        print(
+            f"{name:>10} {sum(map(len, payloads)) / ENTRIES:>7.0f} "
+            f"{timed(lambda: [codec.encode(obj) for obj in objs]):>10.2f} "
+            f"{timed(lambda: [codec.decode(payload) for payload in payloads]):>10.2f} "
+            f"{timed(lambda: [codec.decode(payload, FilePublic) for payload in payloads]):>10.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
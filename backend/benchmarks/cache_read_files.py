@@ -0,0 +1,66 @@
+"""
+Compare the per-id HGETALL listing against the pipelined batch read.
+
+Run from the backend directory against a disposable redis instance:
+
+    python -m benchmarks.cache_read_files
+"""
+import time
+
+from app.cache.core import redis_db as redis
+
+OWNER_ID = 10_000_000
+SIZES = [10, 100, 1_000, 5_000]
+REPEAT = 5
+
+def populate(size: int) -> None:
+    redis.connection.delete(f"owner_id:{OWNER_ID}") # type: ignore
+
+    for file_id in range(size):
+        redis.write_file_to_cache(OWNER_ID + file_id, OWNER_ID, {
+            "id": OWNER_ID + file_id,
+            "name": f"file_{file_id}.txt",
+            "access_key": f"key_{file_id}",
+            "size": file_id,
+            "owner_id": OWNER_ID,
+        })
+
+def read_sequential() -> list:
+    file_ids = redis.connection.zrange(f"owner_id:{OWNER_ID}", 0, -1) # type: ignore
+    return [redis.read_file_by_id_from_cache(file_id) for file_id in file_ids] # type: ignore
+
+def read_batched() -> list:
+    return redis.read_files_by_owner_id_from_cache(OWNER_ID)
+
+def timed(func) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        # Each run has to reach redis, not the in-process tier filled by the last
+        redis.local.clear()
+
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000
+
+def main() -> None:
+    redis.connect()
+
+    print(f"{'files':>8} {'seq trips':>10} {'seq ms':>10} {'batch trips':>12} {'batch ms':>10}")
+    for size in SIZES:
+        populate(size)
+        assert len(read_sequential()) == len(read_batched()) == size
+
+        print(
+            f"{size:>8} {size + 1:>10} {timed(read_sequential):>10.2f} "
+            f"{2:>12} {timed(read_batched):>10.2f}"
+        )
+
+    for file_id in range(max(SIZES)):
+        redis.delete_file_from_cache(OWNER_ID + file_id)
+
+    redis.disconnect()
+
+if __name__ == "__main__":
+    main()
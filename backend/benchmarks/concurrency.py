@@ -0,0 +1,135 @@
+"""
+Compare request throughput of the sync file routes (thread pool) against the
+async file routes (event loop) under increasing concurrency.
+
+Both modes read the same SQLite file database and the configured redis. Run
+from the backend directory against a disposable redis instance:
+
+    python -m benchmarks.concurrency
+"""
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+import app.database.base as model_base
+from app.api.dependencies import (
+    get_async_database_session,
+    get_current_principal,
+    get_current_principal_async,
+    get_database_session,
+)
+from app.api.routes import async_file, file
+from app.cache.core import async_redis_db as async_redis, redis_db as redis
+from app.models.file import File
+from app.models.user import User
+
+OWNER_ID = 10_000_000
+FILES = 200
+REQUESTS = 1_000
+CONCURRENCY = [1, 16, 64, 256]
+
+# Both modes get the same pool, large enough that it is never the bottleneck
+POOL = {"pool_size": max(CONCURRENCY), "max_overflow": 0}
+
+def build_app(router, path: str, is_async: bool) -> tuple[FastAPI, Any]:
+    app = FastAPI()
+    app.include_router(router, prefix="/files")
+    owner = User(id=OWNER_ID, email="bench@example.com")
+
+    if is_async:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool, **POOL
+        )
+        sessions = async_sessionmaker(engine)
+
+        async def override_session():
+            async with sessions() as session:
+                yield session
+
+        app.dependency_overrides[get_async_database_session] = override_session
+        app.dependency_overrides[get_current_principal_async] = lambda: owner
+    else:
+        engine = create_engine(
+            f"sqlite:///{path}",
+            connect_args={"check_same_thread": False},
+            poolclass=QueuePool,
+            **POOL,
+        )
+
+        def override_session():
+            with Session(engine) as session:
+                yield session
+
+        app.dependency_overrides[get_database_session] = override_session
+        app.dependency_overrides[get_current_principal] = lambda: owner
+
+    return app, engine
+
+async def run(app: FastAPI, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app) # type: ignore
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def request(i: int) -> None:
+            async with semaphore:
+                if i % 2:
+                    r = await client.get("/files/", params={"limit": 25})
+                else:
+                    r = await client.get(f"/files/{OWNER_ID + i % FILES}")
+                assert r.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request(i) for i in range(REQUESTS)))
+
+    return REQUESTS / (time.perf_counter() - start)
+
+async def main() -> None:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    model_base.Base.metadata.create_all(bind=engine)
+
+    with Session(engine) as session:
+        session.execute(insert(User), [{
+            "id": OWNER_ID,
+            "email": "bench@example.com",
+            "hashed_password": "",
+            "file_count": FILES,
+            "storage_used": sum(range(FILES)),
+        }])
+        session.execute(insert(File), [
+            {"id": OWNER_ID + i, "name": f"file_{i}.txt", "access_key": f"key_{i}", "size": i, "owner_id": OWNER_ID}
+            for i in range(FILES)
+        ])
+        session.commit()
+
+    redis.connect()
+    await async_redis.connect()
+
+    modes = {
+        "sync": build_app(file.router, path, is_async=False),
+        "async": build_app(async_file.router, path, is_async=True),
+    }
+
+    print(f"{'concurrency':>12} {'sync req/s':>12} {'async req/s':>12}")
+    for concurrency in CONCURRENCY:
+        results = {name: await run(app, concurrency) for name, (app, _) in modes.items()}
+        print(f"{concurrency:>12} {results['sync']:>12.0f} {results['async']:>12.0f}")
+
+    for i in range(FILES):
+        redis.delete_file_from_cache(OWNER_ID + i)
+
+    await modes["async"][1].dispose()
+    await async_redis.disconnect()
+    redis.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
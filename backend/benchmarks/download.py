@@ -0,0 +1,83 @@
+"""
+Measure throughput and peak memory of streaming a large file from local
+storage through ObjectResponse, against reading the whole object into one
+Response body as a browser-side Blob download effectively does. Python
+allocations are traced with tracemalloc, so the peak reflects buffered data
+rather than the interpreter's baseline.
+
+Run from the backend directory, optionally with the size in MiB:
+
+    python -m benchmarks.download 1024
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.storage.local import local_storage
+from app.storage.streaming import ObjectResponse
+
+MIB = 1024 * 1024
+
+async def serve(response: Response) -> int:
+    """
+    Run the response as an ASGI app, discarding the body, and return the
+    number of bytes sent.
+    """
+    sent = 0
+    done = asyncio.Event()
+
+    async def receive() -> dict:
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await response({"type": "http", "method": "GET"}, receive, send)
+
+    return sent
+
+def measure(name: str, make_response) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    sent = asyncio.run(serve(make_response()))
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:>10} {sent / MIB:>8.0f} {sent / MIB / elapsed:>10.0f} {peak / MIB:>10.1f}")
+
+def main() -> None:
+    size = int(sys.argv[1]) * MIB if len(sys.argv) > 1 else 512 * MIB
+
+    with tempfile.TemporaryDirectory() as root, patch.object(settings, "STORAGE_LOCAL_PATH", root):
+        with tempfile.TemporaryFile() as f:
+            for _ in range(size // MIB):
+                f.write(os.urandom(MIB))
+            f.seek(0)
+            local_storage.put("object", f)
+
+        def buffered() -> Response:
+            with open(local_storage.path("object"), "rb") as f:
+                return Response(f.read())
+
+        print(f"{'response':>10} {'MiB':>8} {'MiB/s':>10} {'peak MiB':>10}")
+
+        measure("buffered", buffered)
+        measure("streamed", lambda: ObjectResponse(local_storage, "object", 0, size - 1))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure the per-call overhead the metrics add: a timed cache method against
+the bare method, and a request through MetricsMiddleware against the bare
+ASGI app.
+
+Run from the backend directory:
+
+    python -m benchmarks.metrics
+"""
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from app.core.metrics import MetricsMiddleware, instrument_methods
+
+CALLS = 200_000
+REQUESTS = 20_000
+
+class Cache():
+    def read(self, key: str) -> str:
+        return key
+
+class TimedCache(Cache):
+    def read(self, key: str) -> str:
+        return key
+
+def measure_calls(cache: Cache) -> float:
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        cache.read("key")
+    return (time.perf_counter() - start) / CALLS
+
+async def measure_requests(app) -> float:
+    scope = {
+        "type": "http", "method": "GET", "path": "/files/1", "root_path": "",
+        "query_string": b"", "headers": [], "app": inner,
+    }
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b""}
+
+    async def send(message: dict) -> None:
+        pass
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / REQUESTS
+
+inner = FastAPI()
+
+@inner.get("/files/{file_id}")
+async def read_file(file_id: int) -> dict:
+    return {"id": file_id}
+
+def main() -> None:
+    instrument_methods(TimedCache, "benchmark")
+
+    bare, timed = measure_calls(Cache()), measure_calls(TimedCache())
+    print(f"cache call     bare {bare * 1e6:6.2f} us   timed {timed * 1e6:6.2f} us   overhead {(timed - bare) * 1e6:5.2f} us")
+
+    bare = asyncio.run(measure_requests(inner.router))
+    instrumented = asyncio.run(measure_requests(MetricsMiddleware(inner.router)))
+    print(f"request        bare {bare * 1e6:6.2f} us   timed {instrumented * 1e6:6.2f} us   overhead {(instrumented - bare) * 1e6:5.2f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measure write and read throughput of the local storage engine: atomic puts
+of whole objects, and chunked reads through the memory mapped iter_range
+against plain buffered reads of the same file. Needs no object store, so it
+can run anywhere the tests do.
+
+Run from the backend directory, optionally with the object count and size
+in MiB:
+
+    python -m benchmarks.storage 32 16
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Iterator
+from unittest.mock import patch
+
+from app.core.config import settings
+from app.storage.local import local_storage
+
+MIB = 1024 * 1024
+
+def buffered_read(key: str, start: int, end: int) -> Iterator[bytes]:
+    with open(local_storage.path(key), "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+
+        while remaining > 0:
+            chunk = f.read(min(settings.STORAGE_STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+
+            remaining -= len(chunk)
+            yield chunk
+
+def measure(name: str, total: int, run: Callable[[], None]) -> None:
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>10} {total / MIB:>8.0f} {total / MIB / elapsed:>10.0f}")
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    size = int(sys.argv[2]) * MIB if len(sys.argv) > 2 else 16 * MIB
+
+    body = os.urandom(size)
+    keys = [f"1/2024-06-01/{i:032x}.bin" for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as root, patch.object(settings, "STORAGE_LOCAL_PATH", root):
+        def put() -> None:
+            for key in keys:
+                local_storage.put(key, body)
+
+        def read(iter_range: Callable[[str, int, int], Iterator[bytes]]) -> Callable[[], None]:
+            def run() -> None:
+                for key in keys:
+                    for _ in iter_range(key, 0, size - 1):
+                        pass
+            return run
+
+        print(f"{'operation':>10} {'MiB':>8} {'MiB/s':>10}")
+
+        measure("put", count * size, put)
+        measure("read", count * size, read(buffered_read))
+        measure("mmap", count * size, read(local_storage.iter_range))
+
+if __name__ == "__main__":
+    main()
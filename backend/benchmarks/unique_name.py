@@ -0,0 +1,70 @@
+"""
+Compare the old Python-side suffix probe against the set-based
+generate_unique_name for an owner with many copies of the same file name.
+
+Run from the backend directory:
+
+    python -m benchmarks.unique_name
+"""
+import time
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+import app.database.base as model_base
+from app.crud.file import file_crud
+from app.models.file import File
+
+OWNER_ID = 1
+COPIES = 10_000
+
+def legacy_generate_unique_name(session: Session, name: str, owner_id: int) -> str:
+    base, extension = name.rsplit('.', 1)
+
+    existing_names = session.scalars(
+        select(File.name).filter(File.name.like(f"{base}%")).where(File.owner_id == owner_id)
+    ).all()
+
+    if name not in existing_names:
+        return name
+
+    i = 1
+    while True:
+        new_name = f"{base}_{i}.{extension}"
+        if new_name not in existing_names:
+            return new_name
+        i += 1
+
+def timed(func) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = func()
+
+    return (time.perf_counter() - start) * 1000, result
+
+def main() -> None:
+    engine = create_engine("sqlite://")
+    model_base.Base.metadata.create_all(bind=engine)
+
+    with Session(engine) as session:
+        names = ["image.png"] + [f"image_{i}.png" for i in range(1, COPIES)]
+        session.execute(insert(File), [
+            {"name": name, "access_key": f"key_{i}", "size": 0, "owner_id": OWNER_ID}
+            for i, name in enumerate(names)
+        ])
+        session.commit()
+
+        legacy_ms, legacy_name = timed(
+            lambda: legacy_generate_unique_name(session, "image.png", OWNER_ID)
+        )
+        current_ms, current_name = timed(
+            lambda: file_crud.generate_unique_name(session=session, name="image.png", owner_id=OWNER_ID)
+        )
+
+    assert legacy_name == current_name == f"image_{COPIES}.png"
+
+    print(f"{COPIES} copies of image.png")
+    print(f"legacy probe: {legacy_ms:>10.2f} ms")
+    print(f"set based:    {current_ms:>10.2f} ms")
+
+if __name__ == "__main__":
+    main()
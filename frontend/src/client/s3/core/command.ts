@@ -4,8 +4,6 @@ import {
   PutObjectCommandInput,
   GetObjectCommand,
   GetObjectCommandInput,
-  DeleteObjectCommand,
-  DeleteObjectCommandInput,
 } from "@aws-sdk/client-s3";
 
 export const putCommand = async (client: S3Client, input: PutObjectCommandInput): Promise<void> => {
@@ -36,12 +34,3 @@ export const getCommand = async (client: S3Client, input: GetObjectCommandInput)
     throw new Error(`${(error as Error).message}`)
   }
 }
-
-export const deleteCommand = async (client: S3Client, input: DeleteObjectCommandInput): Promise<void> => {
-  try {
-    const command = new DeleteObjectCommand(input);
-    await client.send(command);
-  } catch (error) {
-    throw new Error(`${(error as Error).message}`)
-  }
-}
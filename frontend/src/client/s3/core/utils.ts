@@ -22,10 +22,10 @@ export const downloadBlobAction = (blob: Blob, downloadName: string): void => {
   }
 };
 
-export const keyGenerator = (filename: string): string => {
+export const keyGenerator = (filename: string, ownerId: number): string => {
   const uniqueId = uuidv4();
   const extension = filename.split('.').pop();
   const date = new Date().toISOString().split('T')[0];
 
-  return `${date}/${uniqueId}.${extension}`
+  return `${ownerId}/${date}/${uniqueId}.${extension}`
 }
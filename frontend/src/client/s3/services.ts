@@ -1,6 +1,6 @@
 import { s3 } from "./core/S3Client";
 
-import { putCommand, getCommand, deleteCommand } from "./core/command"
+import { putCommand, getCommand } from "./core/command"
 import { downloadBlobAction, keyGenerator } from "./core/utils"
 
 export const storageUploadFile = (file: File, bucketName: string, key: string): Promise<void> => {
@@ -19,17 +19,10 @@ export const storageDownloadFile = (bucketName: string, key: string): Promise<Bl
   });
 };
 
-export const storageDeleteFile = (bucketName: string, key: string): Promise<void> => {
-  return deleteCommand(s3, {
-    Bucket: bucketName,
-    Key: key,
-  });
-}
-
 export const storageOpenDownloadedBlob = (blob: Blob, downloadName: string) => {
   downloadBlobAction(blob, downloadName);
 }
 
-export const storageGenerateKey = (filename: string): string => {
-  return keyGenerator(filename);
+export const storageGenerateKey = (filename: string, ownerId: number): string => {
+  return keyGenerator(filename, ownerId);
 }
@@ -16,12 +16,14 @@ import { useMutation, useQueryClient } from "@tanstack/react-query";
 import config from "../../config"
 import { type ApiError, type FileCreate, filesCreateFile } from '../../client/axios';
 import { storageUploadFile, storageGenerateKey } from '../../client/s3';
+import useAuth from '../../hooks/useAuth';
 
 const Navbar = () => {
   const bucketName = config.REACT_APP_FILE_BUCKET_NAME;
   const queryClient = useQueryClient()
   const toast = useToast()
   const toastIdRef = useRef<ToastId | undefined>(undefined);
+  const { user } = useAuth()
   const mutation = useMutation({
     mutationFn: (files: File[]) => {
       toastIdRef.current = toast({
@@ -34,7 +36,7 @@ const Navbar = () => {
       })
 
       const handleFileUpload = async (file: File) => {
-        const key = storageGenerateKey(file.name);
+        const key = storageGenerateKey(file.name, user!.id);
         
         await storageUploadFile(file, bucketName, key);
 
@@ -9,11 +9,9 @@ import {
 } from "@chakra-ui/react"
 import { useMutation, useQueryClient } from "@tanstack/react-query"
 import React from "react"
-import config from "../../config"
 
 import useCustomToast from "../../hooks/useCustomToast"
 import { FilePublic, filesDeleteFile } from "../../client/axios"
-import { storageDeleteFile } from "../../client/s3"
 
 interface DeleteFileProps {
   file: FilePublic
@@ -22,13 +20,11 @@ interface DeleteFileProps {
 }
 
 const Delete = ({ file, isOpen, onClose }: DeleteFileProps) => {
-  const bucketName = config.REACT_APP_FILE_BUCKET_NAME;
   const queryClient = useQueryClient()
   const showToast = useCustomToast()
   const cancelRef = React.useRef<HTMLButtonElement | null>(null)
 
   const deleteFile = async (file: FilePublic) => {
-    await storageDeleteFile(bucketName, file.access_key);
     await filesDeleteFile({ fileId: file.id })
   }
 